@@ -0,0 +1,319 @@
+"""
+Detecção de picos na entrada de tickets por serviço (NOMESERVICO) e contrato
+(NUMEROCONTRATO), incremental.
+
+O detector guarda uma marca d'água (a maior DTABERTURA já vista) e, para cada
+série, uma linha de base por dia da semana (média e variância com EWMA). A cada
+atualização são lidos os tickets abertos do dia da marca (dia aberto) em
+diante; os já contados nesse dia são ignorados pelo id (COL_ID), então entram
+os com a mesma hora da marca e os gravados com atraso no dia aberto. Eles
+entram nas contagens do dia, e cada dia que se fecha é comparado com a linha de base
+(z-score) antes de atualizá-la. O dia corrente também gera alerta (parcial)
+assim que a contagem já passa do limite, pois ela só cresce.
+
+O estado fica gravado em disco (um arquivo para todos os processos: sob uma
+trava de arquivo, vale o estado com a marca mais recente). Na primeira vez, o
+histórico é lido do banco mês a mês. Os alertas saem na página de timelines e
+no feed JSON (ARQ_FEED).
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import conexao
+import dados
+import metricas
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ DETECÇÃO DE PICOS NA ENTRADA
+# ========================================================
+DIMENSOES = {'NOMESERVICO': "Serviço", 'NUMEROCONTRATO': "Contrato"}
+ALFA_EWMA = 0.1              # peso de cada dia novo na linha de base
+LIMIAR_Z = 3.0
+MINIMO_TICKETS = 5           # dias com menos tickets que isso nunca são pico
+OBSERVACOES_MINIMAS = 4      # semanas de histórico por dia da semana antes de alertar
+ALERTAS_MANTIDOS = 1000
+INTERVALO_BANCO_SEGUNDOS = 300   # modo agregado: de quanto em quanto tempo buscar os tickets novos
+_PASTA = os.path.dirname(os.path.abspath(__file__))
+ARQ_ESTADO = os.environ.get("CITSM_ESTADO_ANOMALIAS") or os.path.join(_PASTA, "anomalias_estado.pkl")
+ARQ_FEED = os.environ.get("CITSM_FEED_ANOMALIAS") or os.path.join(_PASTA, "anomalias.json")
+# ========================================================
+
+
+class DetectorFluxo:
+    """Linhas de base por série e dia da semana, atualizadas dia a dia (O(tickets novos + séries))."""
+
+    def __init__(self):
+        self.marca = None           # maior DTABERTURA consumida
+        self.versao = None          # último snapshot consumido
+        self.dia_aberto = None      # dia da marca: ainda pode receber tickets
+        self.series = {}            # (dimensão, valor) -> linha nas matrizes
+        self.nomes = []             # linha -> (dimensão, valor)
+        self.media = np.zeros((0, 7))
+        self.variancia = np.zeros((0, 7))
+        self.observacoes = np.zeros((0, 7), dtype=np.int64)
+        self.pendentes = {}         # dia -> {linha: tickets} dos dias ainda não fechados
+        self.alertas = OrderedDict()  # (dimensão, valor, dia) -> alerta
+        self.vistos = set()         # ids (COL_ID) já contados no dia aberto
+
+    def __setstate__(self, estado):
+        # Estado gravado antes de `vistos`: None = ids do dia aberto desconhecidos (ver consumir)
+        estado.setdefault("vistos", None)
+        self.__dict__.update(estado)
+
+    def _linha(self, serie):
+        if serie not in self.series:
+            self.series[serie] = len(self.nomes)
+            self.nomes.append(serie)
+            self.media = np.vstack([self.media, np.zeros((1, 7))])
+            self.variancia = np.vstack([self.variancia, np.zeros((1, 7))])
+            self.observacoes = np.vstack([self.observacoes, np.zeros((1, 7), dtype=np.int64)])
+        return self.series[serie]
+
+    def consumir(self, novos):
+        """
+        Tickets abertos do dia aberto em diante (colunas COL_ID + DTABERTURA +
+        DIMENSOES). Quem atualiza relê o dia aberto inteiro; os já contados nele
+        são ignorados pelo id. Assim entram os tickets com a mesma hora da marca
+        e os gravados com atraso no dia aberto (nos dias já fechados, não).
+        """
+        novos = novos[novos['DTABERTURA'].notna()].drop_duplicates(dados.COL_ID)
+        if self.vistos is None and self.marca is not None:
+            novos = novos[novos['DTABERTURA'] > self.marca]
+        elif self.dia_aberto is not None:
+            novos = novos[(novos['DTABERTURA'] >= self.dia_aberto) & ~novos[dados.COL_ID].isin(self.vistos)]
+        if novos.empty:
+            return 0
+
+        dias = novos['DTABERTURA'].dt.normalize()
+        for dimensao in DIMENSOES:
+            if dimensao not in novos.columns:
+                continue
+            for (valor, dia), n in novos.groupby([novos[dimensao], dias]).size().items():
+                linha = self._linha((dimensao, valor))
+                pendente = self.pendentes.setdefault(dia, {})
+                pendente[linha] = pendente.get(linha, 0) + int(n)
+
+        self.marca = novos['DTABERTURA'].max() if self.marca is None else max(self.marca, novos['DTABERTURA'].max())
+        primeiro = min(self.pendentes) if self.dia_aberto is None else self.dia_aberto
+        self.dia_aberto = self.marca.normalize()
+        ids_dia = set(novos.loc[(dias == self.dia_aberto).to_numpy(), dados.COL_ID])
+        if primeiro != self.dia_aberto:
+            self.vistos = ids_dia
+        elif self.vistos is not None:
+            self.vistos |= ids_dia
+        # Fecha todos os dias antes do dia da marca (inclusive os sem nenhum ticket)
+        for dia in pd.date_range(primeiro, self.dia_aberto - pd.Timedelta(days=1), freq="D"):
+            self._fechar(dia)
+        self._verificar_parcial()
+        return len(novos)
+
+    def _contagens(self, dia):
+        x = np.zeros(len(self.series))
+        for linha, n in self.pendentes.get(dia, {}).items():
+            x[linha] = n
+        return x
+
+    def _z(self, x, semana):
+        media = self.media[:, semana]
+        desvio = np.sqrt(np.maximum(self.variancia[:, semana], np.maximum(media, 1.0)))  # piso de Poisson
+        z = (x - media) / desvio
+        pico = (self.observacoes[:, semana] >= OBSERVACOES_MINIMAS) & (x >= MINIMO_TICKETS) & (z > LIMIAR_Z)
+        return z, pico
+
+    def _fechar(self, dia):
+        x = self._contagens(dia)
+        self.pendentes.pop(dia, None)
+        semana = dia.dayofweek
+        z, pico = self._z(x, semana)
+        for linha in np.flatnonzero(pico):
+            self._alertar(linha, dia, x[linha], z[linha], parcial=False)
+
+        # Série ainda sem histórico neste dia da semana começa pela própria contagem
+        novas = self.observacoes[:, semana] == 0
+        delta = x - self.media[:, semana]
+        self.media[:, semana] = np.where(novas, x, self.media[:, semana] + ALFA_EWMA * delta)
+        self.variancia[:, semana] = np.where(novas, x, (1 - ALFA_EWMA) * (self.variancia[:, semana] + ALFA_EWMA * delta ** 2))
+        self.observacoes[:, semana] += 1
+
+    def _verificar_parcial(self):
+        x = self._contagens(self.dia_aberto)
+        z, pico = self._z(x, self.dia_aberto.dayofweek)
+        for linha in np.flatnonzero(pico):
+            self._alertar(linha, self.dia_aberto, x[linha], z[linha], parcial=True)
+
+    def _alertar(self, linha, dia, tickets, z, parcial):
+        dimensao, valor = self.nomes[linha]
+        chave = (dimensao, valor, dia)
+        novo = chave not in self.alertas
+        self.alertas[chave] = {
+            "dimensao": dimensao, "valor": valor, "dia": dia.strftime("%Y-%m-%d"),
+            "tickets": int(tickets), "esperado": round(float(self.media[linha, dia.dayofweek]), 1),
+            "z": round(float(z), 2), "parcial": parcial,
+            "detectado_em": self.alertas.get(chave, {}).get("detectado_em") or pd.Timestamp.now().isoformat(timespec="seconds"),
+        }
+        if novo:
+            metricas.contar("anomalias.alerta")
+        while len(self.alertas) > ALERTAS_MANTIDOS:
+            self.alertas.popitem(last=False)
+
+
+_detector = None
+_ultima_busca_banco = 0.0
+_trava = threading.Lock()
+
+
+@contextmanager
+def _trava_arquivo():
+    """Trava entre processos (flock) sobre o arquivo de estado; sem fcntl (Windows), só a do processo."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(f"{ARQ_ESTADO}.trava", "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _ler_estado():
+    try:
+        with open(ARQ_ESTADO, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def _obter_detector():
+    global _detector
+    if _detector is None:
+        _detector = _ler_estado() or DetectorFluxo()
+    return _detector
+
+
+def _mais_novo(a, b):
+    """True se o estado `a` já viu tickets além dos de `b`."""
+    return a.marca is not None and (b.marca is None or a.marca > b.marca)
+
+
+def _salvar(detector):
+    """
+    Grava estado e feed (chamada com _trava). Se outro processo já gravou um
+    estado mais adiantado, este processo passa a usá-lo em vez de sobrescrevê-lo.
+    """
+    global _detector
+    with _trava_arquivo():
+        gravado = _ler_estado()
+        if gravado is not None and _mais_novo(gravado, detector):
+            _detector = gravado
+            return
+        temporario = f"{ARQ_ESTADO}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            pickle.dump(detector, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, ARQ_ESTADO)
+
+        temporario = f"{ARQ_FEED}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(_feed(detector.marca, list(detector.alertas.values())))
+        os.replace(temporario, ARQ_FEED)
+
+
+def _consumir(novos, versao=None):
+    detector = _obter_detector()
+    with metricas.medir("anomalias.atualizar") as m:
+        m.linhas = detector.consumir(novos)
+    detector.versao = versao or detector.versao
+    return m.linhas
+
+
+def atualizar(snap):
+    """Consome os tickets do snapshot do dia aberto em diante (uma vez por versão do snapshot)."""
+    with _trava:
+        detector = _obter_detector()
+        if detector.versao == snap.versao:
+            return 0
+        df = snap.df
+        if detector.dia_aberto is not None:
+            df = df[(df['DTABERTURA'] >= detector.dia_aberto).to_numpy()]
+        linhas = _consumir(df[[dados.COL_ID, 'DTABERTURA', *[c for c in DIMENSOES if c in df.columns]]], snap.versao)
+        if linhas:
+            _salvar(detector)
+        return linhas
+
+
+def atualizar_do_banco():
+    """
+    Modo agregado (sem snapshot): busca no banco só os tickets abertos do dia
+    aberto em diante, em faixas mensais de DTABERTURA (as mesmas da extração
+    particionada), para a primeira carga não trazer o histórico de uma vez.
+    """
+    global _ultima_busca_banco
+    with _trava:
+        if time.time() - _ultima_busca_banco < INTERVALO_BANCO_SEGUNDOS:
+            return 0
+        _ultima_busca_banco = time.time()
+        detector = _obter_detector()
+        sql = (f"SELECT {dados.COL_ID}, DTABERTURA, {', '.join(DIMENSOES)} FROM ODS_ITSM "
+               f"WHERE DTABERTURA >= :ini AND DTABERTURA < :fim")
+        linhas = 0
+        try:
+            with conexao.conexao_pool() as conn:
+                faixas = dados.faixas_mensais(conn)
+                for ini, fim in faixas:
+                    if detector.dia_aberto is not None and fim <= detector.dia_aberto:
+                        continue
+                    binds = {"ini": conexao.valor_data(ini), "fim": conexao.valor_data(fim)}
+                    if detector.dia_aberto is not None:
+                        binds["ini"] = conexao.valor_data(max(ini, detector.dia_aberto))
+                    linhas += _consumir(dados.normalizar(pd.read_sql(sql, conn, params=binds)))
+        except Exception:
+            log.exception("Anomalias: falha ao buscar os tickets novos")
+        if linhas:
+            _salvar(detector)
+        return linhas
+
+
+def alertas(dimensao=None, valor=None, dias=None):
+    """Alertas mais recentes primeiro; `dias` = só os dos últimos N dias antes da marca."""
+    with _trava:
+        detector = _obter_detector()
+        lista = list(detector.alertas.values())
+        marca = detector.marca
+    df = pd.DataFrame(lista, columns=["dimensao", "valor", "dia", "tickets", "esperado", "z", "parcial", "detectado_em"])
+    if dimensao is not None:
+        df = df[df["dimensao"] == dimensao]
+    if valor is not None:
+        df = df[df["valor"] == valor]
+    if dias is not None and marca is not None:
+        df = df[pd.to_datetime(df["dia"]) > marca.normalize() - pd.Timedelta(days=dias)]
+    return df.sort_values(["dia", "z"], ascending=False, ignore_index=True)
+
+
+def _feed(marca, lista):
+    return json.dumps({
+        "gerado_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "marca": marca.isoformat() if marca is not None else None,
+        "alertas": list(reversed(lista)),
+    }, ensure_ascii=False, indent=2)
+
+
+def feed_json():
+    """Feed dos alertas (o mesmo gravado em ARQ_FEED a cada atualização)."""
+    with _trava:
+        detector = _obter_detector()
+        lista = list(detector.alertas.values())
+        marca = detector.marca
+    return _feed(marca, lista)
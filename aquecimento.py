@@ -0,0 +1,159 @@
+import importlib
+import logging
+import os
+import threading
+import time
+
+import metricas
+import perfil_hardware
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ O QUE É PRÉ-CARREGADO APÓS O SERVIDOR SUBIR
+# ========================================================
+MODULOS_PESADOS = [
+    "torch",
+    "sentence_transformers",
+    "sklearn.feature_extraction.text",
+    "bertopic",
+]
+MODELO_TOPICOS = "paraphrase-multilingual-MiniLM-L12-v2"   # Análise IA
+MODELO_BUSCA = "intfloat/multilingual-e5-large"              # Busca Semântica
+MODELOS_AQUECIDOS = [MODELO_TOPICOS, MODELO_BUSCA]
+
+ARQ_STOPWORDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "stopwords_pt.txt")
+# ========================================================
+
+_tempos_importacao = {}   # módulo -> segundos
+_modelos = {}             # (nome, device) -> ModeloAjustado
+_trava = threading.Lock()
+_trava_modelos = threading.Lock()
+_thread = None
+
+
+def importar(nome):
+    """
+    Importa um módulo pesado só quando for usado (ou pelo aquecimento) e registra
+    quanto tempo levou. Importações repetidas saem do sys.modules sem custo.
+    """
+    if nome in _tempos_importacao:
+        return importlib.import_module(nome)
+
+    with metricas.medir(f"import.{nome}"):
+        t0 = time.perf_counter()
+        modulo = importlib.import_module(nome)
+    with _trava:
+        _tempos_importacao.setdefault(nome, time.perf_counter() - t0)
+    return modulo
+
+
+def importado(nome):
+    """True se o módulo já foi importado (não bloqueia)."""
+    return nome in _tempos_importacao
+
+
+def dispositivo():
+    torch = importar("torch")
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+class ModeloAjustado:
+    """
+    SentenceTransformer com o perfil de hardware aplicado: `encode` usa o lote
+    calibrado (se não for passado) e respeita o limite de encodes simultâneos.
+    O resto dos atributos vem do modelo original.
+    """
+
+    def __init__(self, nome, model):
+        self.nome = nome
+        self.modelo = model
+
+    def encode(self, textos, **kwargs):
+        kwargs.setdefault("batch_size", perfil_hardware.lote(self.nome))
+        with perfil_hardware.codificando():
+            return self.modelo.encode(textos, **kwargs)
+
+    def __getattr__(self, atributo):
+        return getattr(self.modelo, atributo)
+
+
+def modelo(nome, device=None):
+    """SentenceTransformer compartilhado pelo processo (carregado uma única vez por nome/device)."""
+    device = device or dispositivo()
+    chave = (nome, device)
+    if chave not in _modelos:
+        with _trava_modelos:
+            if chave not in _modelos:
+                st_mod = importar("sentence_transformers")
+                torch = importar("torch")
+                # Perfil gravado pelo calibrar_hardware.py (lido uma vez por processo)
+                perfil_hardware.iniciar(torch)
+                with metricas.medir(f"modelo.{nome}"):
+                    model = st_mod.SentenceTransformer(nome, device=device)
+                perfil_hardware.ajustar_modelo(model, perfil_hardware.sondar(torch), nome)
+                _modelos[chave] = ModeloAjustado(nome, model)
+    return _modelos[chave]
+
+
+def modelo_pronto(nome, device=None):
+    """True se o modelo já está em memória (não bloqueia)."""
+    if not importado("torch"):
+        return False
+    return (nome, device or dispositivo()) in _modelos
+
+
+def stopwords_portugues():
+    """
+    Lista de stopwords em português empacotada no projeto (mesma do NLTK),
+    para não depender de `nltk.download` no primeiro acesso.
+    """
+    try:
+        with open(ARQ_STOPWORDS, encoding="utf-8") as f:
+            return [linha.strip() for linha in f if linha.strip()]
+    except OSError:
+        nltk = importar("nltk")
+        try:
+            nltk.data.find('corpora/stopwords')
+        except LookupError:
+            nltk.download('stopwords')
+        from nltk.corpus import stopwords
+        return stopwords.words('portuguese')
+
+
+def _aquecer():
+    for nome in MODULOS_PESADOS:
+        try:
+            importar(nome)
+        except ImportError:
+            log.exception("Aquecimento: falha ao importar %s", nome)
+    if not importado("torch"):
+        return
+
+    # Perfil já medido neste hardware (calibrar_hardware.py) vale antes mesmo de os modelos carregarem
+    perfil_hardware.iniciar(importar("torch"))
+
+    for nome in MODELOS_AQUECIDOS:
+        try:
+            modelo(nome)
+        except Exception:
+            log.exception("Aquecimento: falha ao carregar o modelo %s", nome)
+
+
+def iniciar():
+    """
+    Dispara (uma única vez por processo) o pré-carregamento em segundo plano
+    dos imports de ML e dos modelos. Pode ser chamado em toda página.
+    """
+    global _thread
+    if _thread is not None:
+        return
+    with _trava:
+        if _thread is None:
+            _thread = threading.Thread(target=_aquecer, name="aquecimento", daemon=True)
+            _thread.start()
+
+
+def tempos_importacao():
+    with _trava:
+        return dict(_tempos_importacao)
@@ -0,0 +1,264 @@
+"""
+Armazém de artefatos pesados (resultados de IA, vetores, figuras) compartilhado
+pelas sessões do processo. Cada artefato é guardado uma vez, pela chave do
+conteúdo que o gerou (serviço, coluna, snapshot, modelo...), e as sessões
+guardam só a chave. Acima do orçamento de memória, os menos usados recentemente
+vão para o disco e voltam à memória quando pedidos de novo.
+"""
+import atexit
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import compartilhado
+import metricas
+
+# ========================================================
+# ⚙️ ARTEFATOS (orçamento de memória do processo)
+# ========================================================
+ORCAMENTO_MEMORIA_MB = float(os.environ.get("CITSM_ORCAMENTO_ARTEFATOS_MB") or 1024)
+VAR_DIR_ARTEFATOS = "CITSM_DIR_ARTEFATOS"   # diretório pai (padrão: temp do sistema)
+# ========================================================
+
+_memoria = OrderedDict()   # chave -> valor (do menos para o mais usado recentemente)
+_info = {}                 # chave -> {"descricao", "bytes", "acessos", "ultimo_acesso", "no_disco"}
+_em_calculo = {}           # chave -> Lock (um cálculo por chave, as outras sessões esperam)
+_gravando = {}             # chave -> valor saindo da memória, ainda sendo gravado no disco (fora da trava)
+_trava = threading.RLock()
+_dir_processo = None
+
+
+def _diretorio():
+    """Diretório deste processo dentro do configurado (só ele é apagado ao sair), criado no 1º despejo."""
+    global _dir_processo
+    with _trava:
+        if _dir_processo is None:
+            pai = os.environ.get(VAR_DIR_ARTEFATOS)
+            if pai:
+                os.makedirs(pai, exist_ok=True)
+            _dir_processo = tempfile.mkdtemp(prefix="citsm_artefatos_", dir=pai)
+            atexit.register(shutil.rmtree, _dir_processo, True)
+        return _dir_processo
+
+
+def chave(*partes):
+    """Chave estável do artefato a partir do que o define (hash do conteúdo)."""
+    return compartilhado.chave_matriz("art", *partes)
+
+
+def _tamanho(valor):
+    """Bytes aproximados em memória (sem serializar o que dá para medir direto)."""
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True, index=True)
+        return int(uso.sum() if isinstance(uso, pd.Series) else uso)
+    if isinstance(valor, dict):
+        return sum(_tamanho(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(_tamanho(v) for v in valor)
+    try:
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(valor)
+
+
+def _caminho(ch):
+    return os.path.join(_diretorio(), f"{ch}.pkl")
+
+
+def _uso_memoria():
+    return sum(_info[ch]["bytes"] for ch in _memoria)
+
+
+def _despejar(preservar):
+    """
+    Tira da memória os menos usados até caber no orçamento (o recém-usado fica).
+    Chamada com a trava; devolve os que precisam ser gravados, o que quem chamou
+    faz depois de soltá-la (_gravar).
+    """
+    orcamento = ORCAMENTO_MEMORIA_MB * 1024**2
+    despejados = []
+    while _uso_memoria() > orcamento and len(_memoria) > 1:
+        ch = next(iter(_memoria))
+        if ch == preservar:
+            _memoria.move_to_end(ch)
+            ch = next(iter(_memoria))
+        valor = _memoria.pop(ch)
+        if _info[ch]["no_disco"]:
+            continue  # já foi gravado num despejo anterior (artefatos não mudam)
+        _gravando[ch] = valor
+        despejados.append((ch, valor, _info[ch]))
+    return despejados
+
+
+def _gravar(despejados):
+    """Grava os despejados sem a trava; só marca no_disco se o artefato não foi trocado, descartado ou pedido de volta."""
+    for ch, valor, info in despejados:
+        temporario = f"{_caminho(ch)}.{threading.get_ident()}.tmp"
+        with metricas.medir("artefatos.despejo"), open(temporario, "wb") as f:
+            pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with _trava:
+            if _info.get(ch) is info and _gravando.get(ch) is valor:
+                os.replace(temporario, _caminho(ch))
+                info["no_disco"] = True
+                del _gravando[ch]
+                continue
+        os.remove(temporario)
+
+
+def guardar(ch, valor, descricao=""):
+    """
+    Guarda o artefato e devolve a chave. Substituindo um anterior com a mesma
+    chave (ex.: reconstrução, ver dependencias.py), os acessos dele são mantidos.
+    """
+    guardar_varios({ch: (valor, descricao)})
+    return ch
+
+
+def guardar_varios(itens):
+    """
+    Guarda vários artefatos ({chave: (valor, descrição)}) numa troca só: quem
+    lê vê todos os anteriores ou todos os novos (ex.: análise e duplicados).
+    """
+    despejados = []
+    with _trava:
+        for ch, (valor, descricao) in itens.items():
+            anterior = _info.get(ch, {})
+            if anterior.get("no_disco"):
+                os.remove(_caminho(ch))
+            _gravando.pop(ch, None)
+            _memoria[ch] = valor
+            _memoria.move_to_end(ch)
+            _info[ch] = {"descricao": descricao, "bytes": _tamanho(valor), "acessos": anterior.get("acessos", 0),
+                         "ultimo_acesso": anterior.get("ultimo_acesso", time.time()), "no_disco": False}
+        for ch in itens:
+            despejados += _despejar(ch)
+    _gravar(despejados)
+
+
+def _registrar_acesso(ch):
+    _info[ch]["acessos"] += 1
+    _info[ch]["ultimo_acesso"] = time.time()
+
+
+def obter(ch):
+    """O artefato da chave (do disco, se foi despejado) ou None se não existir."""
+    with _trava:
+        if ch in _memoria:
+            metricas.contar("artefatos.memoria.acerto")
+            _memoria.move_to_end(ch)
+            _registrar_acesso(ch)
+            return _memoria[ch]
+        if ch in _gravando:
+            # Pedido de volta enquanto era gravado: volta para a memória (a gravação é abandonada)
+            metricas.contar("artefatos.memoria.acerto")
+            valor = _memoria[ch] = _gravando.pop(ch)
+            _registrar_acesso(ch)
+            despejados = _despejar(ch)
+        elif ch not in _info or not _info[ch]["no_disco"]:
+            return None
+        else:
+            metricas.contar("artefatos.memoria.falta")
+            info, despejados = _info[ch], None
+    if despejados is not None:
+        _gravar(despejados)
+        return valor
+
+    # Leitura do disco sem a trava: as outras sessões continuam lendo o que está em memória
+    try:
+        with metricas.medir("artefatos.leitura_disco"), open(_caminho(ch), "rb") as f:
+            valor = pickle.load(f)
+    except FileNotFoundError:
+        return obter(ch) if _info.get(ch) is not info else None  # substituído/descartado enquanto lia
+
+    with _trava:
+        if _info.get(ch) is not info:
+            return obter(ch)  # substituído/descartado enquanto lia: vale o estado atual
+        despejados = []
+        if ch not in _memoria:
+            _memoria[ch] = valor
+            despejados = _despejar(ch)
+        else:
+            valor = _memoria[ch]  # outra sessão trouxe do disco antes
+        _memoria.move_to_end(ch)
+        _registrar_acesso(ch)
+    _gravar(despejados)
+    return valor
+
+
+def obter_ou_calcular(ch, construtor, descricao=""):
+    """
+    Como `obter`; se não existir, calcula uma única vez mesmo com várias sessões
+    pedindo juntas. Um construtor que devolve None não guarda nada.
+    """
+    valor = obter(ch)
+    if valor is not None:
+        return valor
+    with _trava:
+        trava_chave = _em_calculo.setdefault(ch, threading.Lock())
+    try:
+        with trava_chave:
+            valor = obter(ch)
+            if valor is None:
+                valor = construtor()
+                if valor is not None:
+                    guardar(ch, valor, descricao)
+    finally:
+        # Mesmo se o construtor falhar, a chave não fica "em cálculo" para sempre
+        with _trava:
+            _em_calculo.pop(ch, None)
+    return valor
+
+
+def aguardar_calculo(ch):
+    """Espera o cálculo em andamento da chave (se houver) terminar."""
+    with _trava:
+        trava_chave = _em_calculo.get(ch)
+    if trava_chave is not None:
+        with trava_chave:
+            pass
+
+
+def ultimo_acesso(ch):
+    """Instante (time.time) do último uso do artefato, ou None se ele não existe."""
+    with _trava:
+        return _info[ch]["ultimo_acesso"] if ch in _info else None
+
+
+def descartar(ch):
+    with _trava:
+        _memoria.pop(ch, None)
+        _gravando.pop(ch, None)
+        if _info.pop(ch, {}).get("no_disco"):
+            os.remove(_caminho(ch))
+
+
+def uso():
+    """Um DataFrame por artefato: descrição, onde está, tamanho e acessos (para a página de admin)."""
+    agora = time.time()
+    with _trava:
+        linhas = [{
+            "descricao": i["descricao"],
+            "local": "disco" if ch not in _memoria else "memória",
+            "tamanho_mb": i["bytes"] / 1024**2,
+            "acessos": i["acessos"],
+            "ocioso_s": agora - i["ultimo_acesso"],
+            "chave": ch,
+        } for ch, i in _info.items()]
+    colunas = ["descricao", "local", "tamanho_mb", "acessos", "ocioso_s", "chave"]
+    return pd.DataFrame(linhas, columns=colunas).sort_values("tamanho_mb", ascending=False, ignore_index=True)
+
+
+def uso_memoria_mb():
+    with _trava:
+        return _uso_memoria() / 1024**2
+
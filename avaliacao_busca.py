@@ -0,0 +1,146 @@
+"""
+Avaliação da Busca Semântica: um estágio (e5-large no corpus inteiro) x dois
+estágios (MiniLM ou BM25 + reavaliação pelo e5-large sob orçamento, ver busca.py).
+
+Mede a qualidade sobre uma amostra rotulada (recall@10, MRR@10 e sobreposição
+do top 10 com a busca de um estágio), a latência por consulta (p50/p95) e o
+tempo de preparo do corpus de cada pipeline. Os vetores de textos reavaliados
+começam vazios em cada pipeline e vão sendo reaproveitados entre as consultas,
+como no servidor; consultas e resultados nunca vêm do cache.
+
+Amostra rotulada: CSV com as colunas `consulta,ticket` (TICKET_SUBTICKET relevante;
+uma consulta pode ter várias linhas). Sem --rotulos, monta uma automática: o
+SUMMARY de tickets sorteados como consulta e o próprio ticket como resposta.
+
+Uso:
+    CITSM_BANCO_LOCAL=bench_dados/ods_10000.sqlite python avaliacao_busca.py --consultas 200
+    python avaliacao_busca.py --rotulos rotulos_busca.csv --coluna DESCRICAO --orcamento 0.5
+    python avaliacao_busca.py --coluna RESUMO_TICKET DESCRICAO
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import aquecimento
+import busca
+import dados
+
+K = 10
+NOME_GRANDE = "e5-large"
+
+
+def montar_corpus(conjunto, colunas):
+    """Mesmo corpus da página (ver busca.corpus_do_snapshot), com o SUMMARY para as consultas automáticas."""
+    snap = dados.obter_snapshot(conjunto)
+    corpus = busca.corpus_do_snapshot(snap, colunas)
+    df = corpus.df
+    if "SUMMARY" in snap.colunas and "SUMMARY" not in df.columns:
+        df = df.assign(SUMMARY=snap.com_textos(["SUMMARY"])["SUMMARY"].to_numpy())
+    # Só conta como resposta quem tem texto em alguma das colunas
+    validos = np.logical_or.reduce([corpus.validos[c] for c in colunas])
+    return corpus, df, validos
+
+
+def rotulos_automaticos(df, quantidade, semente):
+    amostra = df.dropna(subset=['SUMMARY']).sample(min(quantidade, len(df)), random_state=semente)
+    return pd.DataFrame({"consulta": amostra['SUMMARY'].astype(str).to_numpy(), "ticket": amostra[dados.COL_ID].to_numpy()})
+
+
+def pipelines(corpus, colunas, candidatos, orcamento):
+    """nome -> (preparo do corpus, busca de uma consulta -> posições)."""
+    device = aquecimento.dispositivo()
+    grande = aquecimento.modelo(aquecimento.MODELO_BUSCA, device)
+    leve = aquecimento.modelo(aquecimento.MODELO_TOPICOS, device)
+    estado = {}
+
+    def preparar_unico():
+        estado["e5"] = busca.vetores_corpus(corpus, grande, NOME_GRANDE).result()
+
+    def preparar_minilm():
+        vetores = busca.vetores_corpus(corpus, leve, aquecimento.MODELO_TOPICOS).result()
+        estado["minilm"] = busca.estagio_vetorial(leve, aquecimento.MODELO_TOPICOS, corpus, vetores)
+
+    def preparar_bm25():
+        estado["bm25"] = busca.estagio_bm25(corpus)
+        for col in colunas:
+            busca.indice_bm25(corpus, col)
+
+    def dois_estagios(nome):
+        return lambda q: busca.buscar_dois_estagios(estado[nome], nome, grande, NOME_GRANDE, q, corpus, colunas,
+                                                    k=K, candidatos=candidatos, orcamento=orcamento)[0]
+
+    return {
+        "e5_unico": (preparar_unico, lambda q: busca.buscar(grande, NOME_GRANDE, q, corpus, estado["e5"], colunas, k=K)[0]),
+        "minilm+e5": (preparar_minilm, dois_estagios("minilm")),
+        "bm25+e5": (preparar_bm25, dois_estagios("bm25")),
+    }
+
+
+def avaliar(rotulos, df, pipes):
+    tickets = df[dados.COL_ID].to_numpy()
+    relevantes = rotulos.groupby("consulta")["ticket"].agg(set)
+    resultados, tops_referencia = [], {}
+
+    for nome, (preparar, buscar) in pipes.items():
+        busca.limpar_caches()
+        t0 = time.perf_counter()
+        preparar()
+        preparo = time.perf_counter() - t0
+
+        latencias, recalls, rrs, sobreposicoes = [], [], [], []
+        for consulta, esperados in relevantes.items():
+            busca.limpar_caches(corpus=False)
+            t0 = time.perf_counter()
+            top = tickets[np.asarray(buscar(consulta))].tolist()
+            latencias.append(time.perf_counter() - t0)
+
+            acertos = [i for i, t in enumerate(top) if t in esperados]
+            recalls.append(len(set(top) & esperados) / len(esperados))
+            rrs.append(1 / (acertos[0] + 1) if acertos else 0.0)
+            if nome == "e5_unico":
+                tops_referencia[consulta] = set(top)
+            elif consulta in tops_referencia:
+                sobreposicoes.append(len(set(top) & tops_referencia[consulta]) / K)
+
+        resultados.append({
+            "pipeline": nome,
+            "preparo_corpus_s": round(preparo, 2),
+            f"recall@{K}": round(float(np.mean(recalls)), 4),
+            f"mrr@{K}": round(float(np.mean(rrs)), 4),
+            f"sobreposicao@{K}_e5": round(float(np.mean(sobreposicoes)), 4) if sobreposicoes else 1.0,
+            "latencia_p50_ms": round(float(np.percentile(latencias, 50)) * 1000, 1),
+            "latencia_p95_ms": round(float(np.percentile(latencias, 95)) * 1000, 1),
+        })
+        print(resultados[-1], flush=True)
+    return pd.DataFrame(resultados)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Qualidade e latência da Busca Semântica (1 x 2 estágios).")
+    parser.add_argument("--conjunto", default="amostra_3000", choices=list(dados.CONJUNTOS))
+    parser.add_argument("--coluna", default=["DESCRICAO"], nargs="+",
+                        help="Coluna(s) pesquisada(s); várias = fusão dos campos, como 'Todas' na página")
+    parser.add_argument("--rotulos", default=None, help="CSV consulta,ticket (sem ele, amostra automática)")
+    parser.add_argument("--consultas", type=int, default=100, help="Tamanho da amostra automática")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--candidatos", type=int, default=busca.CANDIDATOS)
+    parser.add_argument("--orcamento", type=float, default=busca.ORCAMENTO_REAVALIACAO_SEGUNDOS,
+                        help="Segundos por consulta para a reavaliação pelo e5-large")
+    parser.add_argument("--saida", default=None, help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    corpus, df, validos = montar_corpus(args.conjunto, args.coluna)
+    rotulos = pd.read_csv(args.rotulos) if args.rotulos else rotulos_automaticos(df[validos], args.consultas, args.semente)
+    print(f"Corpus: {int(validos.sum())} tickets com texto em {', '.join(args.coluna)} | consultas: {rotulos['consulta'].nunique()}")
+
+    pipes = pipelines(corpus, args.coluna, args.candidatos, args.orcamento)
+    tabela = avaliar(rotulos, df, pipes)
+    print()
+    print(tabela.to_string(index=False))
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(tabela.to_dict(orient="records"), f, indent=2, ensure_ascii=False)
@@ -0,0 +1,149 @@
+"""
+Gera uma base SQLite com o formato da ODS_ITSM para testes de desempenho sem o DW.
+
+Uso:
+    python base_sintetica.py --linhas 100000 --saida bench_dados/ods_100k.sqlite
+    CITSM_BANCO_LOCAL=bench_dados/ods_100k.sqlite streamlit run main.py
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_LOTE = 50000
+INICIO_HISTORICO = pd.Timestamp("2022-01-01")
+DIAS_HISTORICO = 3 * 365
+
+# --- VOCABULÁRIO ---
+CONTRATOS = {
+    # contrato -> serviços atendidos
+    1102023.0: ["Sustentação de Sistemas", "Desenvolvimento de Sistemas", "Banco de Dados", "Business Intelligence"],
+    2152022.0: ["Service Desk", "Suporte Presencial", "Gestão de Acessos", "Telefonia"],
+    3072024.0: ["Infraestrutura de Redes", "Datacenter", "Backup", "Segurança da Informação"],
+    4012021.0: ["Impressão", "Manutenção de Equipamentos"],
+}
+STATUS = ["Fechado", "Resolvido", "Cancelado", "Em Atendimento", "Aguardando Usuário", "Aberto", "Em Homologação"]
+PESOS_STATUS = [0.52, 0.18, 0.05, 0.10, 0.07, 0.05, 0.03]
+STATUS_ABERTOS = {"Em Atendimento", "Aguardando Usuário", "Aberto", "Em Homologação"}
+
+NOMES = ["Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Hugo", "Isabela", "João",
+         "Karina", "Lucas", "Mariana", "Nelson", "Olívia", "Paulo", "Quésia", "Rafael", "Sandra", "Tiago",
+         "Úrsula", "Vinícius", "Wanderléia", "Yasmin", "Zeca"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues",
+              "Almeida", "Nascimento", "Araújo", "Melo", "Barbosa", "Cardoso", "Rocha", "Dias", "Teixeira"]
+SECRETARIAS = ["SEMEF", "SEMSA", "SEMED", "SEMULSP", "SEMINF", "IMPLURB", "SEMAD", "CASA CIVIL", "PGM", "SEMMAS"]
+
+ACOES = ["Erro ao acessar", "Solicito acesso ao", "Lentidão no", "Falha na integração do", "Ajuste de relatório no",
+         "Instalação do", "Atualização cadastral no", "Problema de impressão no", "Reset de senha do", "Indisponibilidade do"]
+OBJETOS = ["sistema de protocolo", "portal do servidor", "módulo de IPTU", "SIGED", "e-mail institucional",
+           "sistema de folha de pagamento", "ponto eletrônico", "VPN", "servidor de arquivos", "sistema de licitações",
+           "painel de BI", "banco de dados de tributos", "aplicativo de agendamento", "certificado digital"]
+DETALHES = ["desde ontem à tarde", "após a última atualização", "para o setor de arrecadação",
+            "ao gerar o relatório mensal", "em todas as máquinas do setor", "somente pelo navegador Chrome",
+            "com mensagem de tempo esgotado", "impedindo o atendimento ao contribuinte",
+            "conforme chamado anterior", "para o novo servidor lotado na secretaria"]
+FECHOS = ["Atenciosamente.", "Favor verificar com urgência.", "Segue anexo o print do erro.",
+          "Grato pela atenção.", "Contato pelo ramal 4021.", ""]
+
+
+def _zipf_indices(rng, n, tamanho, a=1.3):
+    """Índices com distribuição de cauda longa (poucos valores muito frequentes)."""
+    pesos = 1.0 / np.arange(1, tamanho + 1) ** a
+    return rng.choice(tamanho, size=n, p=pesos / pesos.sum())
+
+
+def _demandantes(rng, quantidade=2000):
+    nomes = rng.choice(NOMES, quantidade)
+    sobrenomes = rng.choice(SOBRENOMES, quantidade)
+    secretarias = rng.choice(SECRETARIAS, quantidade)
+    return np.array([f"{n} {s} - {sec}" for n, s, sec in zip(nomes, sobrenomes, secretarias)], dtype=object)
+
+
+def gerar_lote(rng, inicio_ticket, n, demandantes):
+    """Gera `n` tickets sintéticos com a mesma estrutura da ODS_ITSM."""
+    contratos = list(CONTRATOS)
+    pares = [(c, s) for c in contratos for s in CONTRATOS[c]]
+    idx_par = _zipf_indices(rng, n, len(pares), a=1.1)
+    contrato = np.array([pares[i][0] for i in idx_par])
+    servico = np.array([pares[i][1] for i in idx_par], dtype=object)
+
+    status = rng.choice(STATUS, size=n, p=PESOS_STATUS)
+    demandante = demandantes[_zipf_indices(rng, n, len(demandantes))]
+
+    # Volume crescente ao longo do tempo e concentrado em dias úteis/horário comercial
+    dias = (DIAS_HISTORICO * np.sqrt(rng.random(n))).astype(int)
+    abertura = INICIO_HISTORICO + pd.to_timedelta(dias, unit="D") + pd.to_timedelta(rng.normal(13, 3, n).clip(7, 19), unit="h")
+    fim_semana = abertura.dayofweek >= 5
+    abertura = abertura.where(~fim_semana, abertura - pd.to_timedelta(abertura.dayofweek - 4, unit="D"))
+
+    duracao = pd.to_timedelta(rng.lognormal(mean=3.0, sigma=1.4, size=n), unit="h")
+    aberto = np.isin(status, list(STATUS_ABERTOS))
+    fim = pd.Series(abertura + duracao).where(~aberto)
+    modificacao = pd.Series(abertura + duracao * rng.random(n)).where(aberto, fim)
+
+    acao = rng.choice(ACOES, n)
+    objeto = rng.choice(OBJETOS, n)
+    detalhe = rng.choice(DETALHES, n)
+    fecho = rng.choice(FECHOS, n)
+    resumo = pd.Series(acao, dtype=object) + " " + objeto
+    descricao = ("Prezados, " + resumo.str.lower() + " " + detalhe + ". " + rng.choice(DETALHES, n) + ". " + fecho)
+
+    tickets = np.arange(inicio_ticket, inicio_ticket + n)
+    return pd.DataFrame({
+        "TICKET_PRINCIPAL": tickets,
+        "TICKET_SUBTICKET": [f"{t}-{s}" for t, s in zip(tickets, rng.integers(1, 4, n))],
+        "NUMEROCONTRATO": contrato,
+        "NOMESERVICO": servico,
+        "STATUS": status,
+        "DEMANDANTE": demandante,
+        "DTABERTURA": pd.Series(abertura).dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "DTULTIMAMODIFICACAO": modificacao.dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "DTFIM": fim.dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "SUMMARY": resumo + " (" + servico + ")",
+        "RESUMO_TICKET": resumo + " " + detalhe,
+        "DESCRICAO": descricao,
+    })
+
+
+def gerar_base(caminho, linhas, semente=42):
+    """Cria (ou recria) o arquivo SQLite com `linhas` tickets em lotes de memória limitada."""
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+
+    rng = np.random.default_rng(semente)
+    demandantes = _demandantes(rng)
+    conn = sqlite3.connect(caminho)
+    try:
+        for inicio in range(0, linhas, TAMANHO_LOTE):
+            lote = gerar_lote(rng, 100000 + inicio, min(TAMANHO_LOTE, linhas - inicio), demandantes)
+            lote.to_sql("ODS_ITSM", conn, if_exists="append", index=False)
+        conn.execute("CREATE INDEX IF NOT EXISTS IX_ODS_DTABERTURA ON ODS_ITSM (DTABERTURA)")
+        conn.commit()
+    finally:
+        conn.close()
+    return caminho
+
+
+def garantir_base(diretorio, linhas):
+    """Caminho da base com `linhas` tickets, gerando-a apenas se ainda não existir."""
+    caminho = os.path.join(diretorio, f"ods_{linhas}.sqlite")
+    if not os.path.exists(caminho):
+        gerar_base(caminho, linhas)
+    return caminho
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera base sintética no formato da ODS_ITSM.")
+    parser.add_argument("--linhas", type=int, default=100000)
+    parser.add_argument("--saida", default=None, help="Arquivo .sqlite (padrão: bench_dados/ods_<linhas>.sqlite)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    saida = args.saida or os.path.join("bench_dados", f"ods_{args.linhas}.sqlite")
+    t0 = time.time()
+    gerar_base(saida, args.linhas, args.semente)
+    print(f"✅ {args.linhas} tickets gerados em {saida} ({time.time() - t0:.1f}s)")
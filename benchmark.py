@@ -0,0 +1,221 @@
+"""
+Benchmark headless do CITSM sobre a base sintética (sem o DW de produção).
+
+Mede tempo e pico de memória da carga, das agregações puras de dashboards.py /
+timelines.py / tabela.py, dos motores de consulta (pandas x duckdb x polars, lado
+a lado) e de cada página executada pelo AppTest do Streamlit.
+Obs.: o pico de memória vem do tracemalloc e não enxerga a memória nativa do
+DuckDB/Polars (só a do Python/numpy).
+Compara com os limites de benchmark_limites.json e termina com código 1 se
+algum caso regredir.
+
+Uso:
+    python benchmark.py --tamanhos 10000 100000 1000000
+    python benchmark.py --tamanhos 10000 --ia          # inclui as páginas de IA (baixa modelos)
+    python benchmark.py --motores pandas indices duckdb polars
+    python benchmark.py --paralelismo 1 4 8 --latencia 0.00005   # extração serial x paralela
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import conexao
+import base_sintetica
+
+DIR_DADOS = "bench_dados"
+ARQ_LIMITES = "benchmark_limites.json"
+
+PAGINAS = {
+    "pagina.dashboard": "pages/Dashboard_CITSM.py",
+    "pagina.timelines": "pages/Timelines_CITSM.py",
+}
+PAGINAS_IA = {
+    "pagina.busca_semantica": "pages/Busca_semantica.py",
+    "pagina.analise_ia": "pages/Analise_IA.py",
+}
+
+
+def medir(func, repeticoes):
+    """Executa `func` algumas vezes; retorna (menor tempo em s, maior pico de memória em MB)."""
+    tempos, picos = [], []
+    for _ in range(repeticoes):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - t0)
+        picos.append(tracemalloc.get_traced_memory()[1] / 1024**2)
+        tracemalloc.stop()
+    return min(tempos), max(picos)
+
+
+def casos_funcoes(df):
+    """Casos sobre as funções puras, usando o serviço mais volumoso (pior caso da tela)."""
+    import dashboards
+    import tabela
+    import timelines
+
+    servico = df['NOMESERVICO'].value_counts().index[0]
+    df_servico = df[df['NOMESERVICO'] == servico]
+    demandante = df_servico['DEMANDANTE'].value_counts().index[0]
+    df_abertos = df_servico[df_servico['DTFIM'].isna()]
+    ordenacoes = tabela.calcular_ordenacoes(df, ['DTABERTURA', 'STATUS', 'DEMANDANTE'])
+    posicoes = df_servico.index.to_numpy()
+    agora = datetime.now()
+
+    return {
+        "filtro.servico": lambda: df[df['NOMESERVICO'] == servico],
+        "dashboards.contar_demandantes": lambda: dashboards.contar_demandantes(df_servico),
+        "dashboards.contar_status": lambda: dashboards.contar_status(df_servico, demandante),
+        "timelines.calcular_fluxo_semanal": lambda: timelines.calcular_fluxo(df_servico, 'W-MON'),
+        "timelines.calcular_fluxo_mensal": lambda: timelines.calcular_fluxo(df_servico, 'MS'),
+        "timelines.calcular_backlog": lambda: timelines.calcular_backlog(df_abertos, agora),
+        "tabela.calcular_ordenacoes": lambda: tabela.calcular_ordenacoes(df, ['DTABERTURA', 'STATUS', 'DEMANDANTE']),
+        "tabela.ordenar_posicoes": lambda: tabela.ordenar_posicoes(ordenacoes['DTABERTURA'], posicoes, len(df), crescente=False),
+    }
+
+
+def casos_motores(df, motores):
+    """Mesmo roteiro da tela de Dashboard/Timelines executado em cada motor de consulta."""
+    import motor_consulta
+    from motor_consulta import Filtros
+
+    contrato, servico = df.groupby(['NUMEROCONTRATO', 'NOMESERVICO']).size().idxmax()
+    inicio, fim = df['DTABERTURA'].min().date(), df['DTABERTURA'].max().date()
+    agora = datetime.now()
+
+    casos = {}
+    for nome in motores:
+        classe = motor_consulta.MOTORES[nome]
+        try:
+            motor = classe(df)
+        except ImportError as e:
+            print(f"   (motor {nome} ignorado: {e})")
+            continue
+
+        def cascata(motor=motor):
+            filtros = Filtros(inicio=inicio, fim=fim)
+            motor.opcoes('NUMEROCONTRATO', filtros)
+            filtros = filtros.com(contrato=contrato)
+            motor.opcoes('NOMESERVICO', filtros)
+            filtros = filtros.com(servico=servico)
+            motor.total(filtros)
+            return motor.posicoes(filtros)
+
+        filtros_servico = Filtros(inicio=inicio, fim=fim, contrato=contrato, servico=servico)
+        casos.update({
+            f"motor.{nome}.construcao": lambda c=classe: c(df),
+            f"motor.{nome}.cascata": cascata,
+            f"motor.{nome}.contagens": lambda m=motor, f=filtros_servico: (m.contar('DEMANDANTE', f, 10), m.contar('STATUS', f)),
+            f"motor.{nome}.fluxo_semanal": lambda m=motor, f=filtros_servico: m.fluxo(f, 'W-MON'),
+            f"motor.{nome}.backlog": lambda m=motor, f=filtros_servico: m.mais_antigos_abertos(f, agora, 15),
+        })
+    return casos
+
+
+def casos_textos(snap):
+    """Leitura do armazém de textos: uma página da tabela e a coluna inteira (lote de IA)."""
+    import numpy as np
+
+    if snap.armazem_textos is None:
+        return {}
+    pagina = np.sort(np.random.default_rng(0).choice(len(snap.df), min(100, len(snap.df)), replace=False))
+    return {
+        "textos.pagina_tabela": lambda: snap.ler_textos('SUMMARY', pagina),
+        "textos.coluna_inteira": lambda: snap.ler_textos('DESCRICAO', np.arange(len(snap.df))),
+    }
+
+
+def rodar_pagina(caminho):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(caminho, default_timeout=600).run()
+    if at.exception:
+        raise RuntimeError(f"{caminho}: {at.exception[0].value}")
+
+
+def rodar(tamanhos, repeticoes, incluir_ia, motores=("pandas", "indices"), paralelismos=None):
+    import dados
+
+    paralelismos = paralelismos or [dados.PARALELISMO]
+
+    resultados = []
+    for linhas in tamanhos:
+        caminho = base_sintetica.garantir_base(DIR_DADOS, linhas)
+        os.environ[conexao.VAR_BANCO_LOCAL] = caminho
+
+        def carga():
+            dados.descartar_carregadores()
+            dados.obter_snapshot("completo")
+
+        # A carga deixa o snapshot pronto para os demais casos
+        for paralelismo in paralelismos:
+            dados.PARALELISMO = paralelismo
+            nome = "dados.carga_completa" if len(paralelismos) == 1 else f"dados.carga_completa_p{paralelismo}"
+            segundos, pico = medir(carga, 1)
+            resultados.append({"caso": nome, "linhas": linhas, "segundos": segundos, "pico_mb": pico})
+            print(f"{linhas:>9} | {nome:<38} | {segundos:8.3f}s | {pico:9.1f} MB", flush=True)
+
+        snap = dados.obter_snapshot("completo")
+        df = snap.df
+        casos = casos_funcoes(df)
+        casos.update(casos_textos(snap))
+        casos.update(casos_motores(df, motores))
+
+        paginas = dict(PAGINAS, **(PAGINAS_IA if incluir_ia else {}))
+        for nome, pagina in paginas.items():
+            casos[nome] = lambda p=pagina: rodar_pagina(p)
+
+        for nome, func in casos.items():
+            segundos, pico = medir(func, repeticoes)
+            resultados.append({"caso": nome, "linhas": linhas, "segundos": segundos, "pico_mb": pico})
+            print(f"{linhas:>9} | {nome:<38} | {segundos:8.3f}s | {pico:9.1f} MB", flush=True)
+    return resultados
+
+
+def verificar_limites(resultados, arquivo):
+    """Lista de mensagens para cada caso acima do limite configurado."""
+    if not os.path.exists(arquivo):
+        return []
+    with open(arquivo) as f:
+        limites = json.load(f)
+
+    falhas = []
+    for r in resultados:
+        limite = limites.get(r["caso"], {}).get(str(r["linhas"]))
+        if not limite:
+            continue
+        for metrica in ("segundos", "pico_mb"):
+            if metrica in limite and r[metrica] > limite[metrica]:
+                falhas.append(f"{r['caso']} @ {r['linhas']}: {metrica} {r[metrica]:.3f} > {limite[metrica]}")
+    return falhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark headless do CITSM.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--ia", action="store_true", help="Inclui as páginas de IA (requer os modelos)")
+    parser.add_argument("--motores", nargs="+", default=["pandas", "indices"], choices=["indices", "pandas", "duckdb", "polars"],
+                        help="Motores de consulta comparados lado a lado")
+    parser.add_argument("--paralelismo", type=int, nargs="+", default=None,
+                        help="Conexões simultâneas na extração (um caso de carga para cada valor)")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="Atraso artificial por linha lida da base local, em segundos (simula a rede do DW)")
+    parser.add_argument("--limites", default=ARQ_LIMITES)
+    parser.add_argument("--saida", default=None, help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    os.environ[conexao.VAR_LATENCIA_LOCAL] = str(args.latencia)
+    resultados = rodar(args.tamanhos, args.repeticoes, args.ia, args.motores, args.paralelismo)
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+    falhas = verificar_limites(resultados, args.limites)
+    for falha in falhas:
+        print("❌ REGRESSÃO:", falha)
+    sys.exit(1 if falhas else 0)
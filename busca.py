@@ -0,0 +1,348 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import aquecimento
+import compartilhado
+import dados
+import limpeza
+import metricas
+
+# ========================================================
+# ⚙️ BUSCA SEMÂNTICA (caches compartilhados pelas sessões do processo)
+# ========================================================
+CONSULTAS_EM_CACHE = 1024    # vetores de consultas já codificadas
+RESULTADOS_EM_CACHE = 256    # top-k de (consulta, corpus)
+TOP_K = 50
+TAMANHO_MINIMO_TEXTO = 10    # textos mais curtos não entram na busca
+
+# Dois estágios: o 1º (MiniLM ou BM25) escolhe CANDIDATOS no corpus inteiro e o
+# e5-large reavalia só esses, em lotes, até estourar o orçamento de tempo
+CANDIDATOS = 200
+LOTE_REAVALIACAO = 32
+ORCAMENTO_REAVALIACAO_SEGUNDOS = float(os.environ.get("CITSM_ORCAMENTO_BUSCA") or 1.5)
+VETORES_EM_CACHE = 20000     # vetores do e5-large de textos já reavaliados
+# ========================================================
+
+
+class CacheLRU:
+    """Dicionário limitado (LRU) e thread-safe; acertos e faltas vão para metricas.contar."""
+
+    def __init__(self, nome, capacidade):
+        self.nome = nome
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construtor, guardar_se=None):
+        """Valor da chave; na falta, `construtor()`, guardado só se `guardar_se(valor)` (quando informado)."""
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                metricas.contar(f"{self.nome}.acerto")
+                return self._itens[chave]
+        metricas.contar(f"{self.nome}.falta")
+
+        valor = construtor()
+        if guardar_se is not None and not guardar_se(valor):
+            return valor
+        with self._trava:
+            self._itens[chave] = valor
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+        return valor
+
+    def obter_varios(self, chaves, construtor_lote):
+        """Como `obter` para uma lista; as faltas são construídas juntas (`construtor_lote(chaves_faltantes)`)."""
+        with self._trava:
+            valores = [self._itens.get(c) for c in chaves]
+            for c, v in zip(chaves, valores):
+                if v is not None:
+                    self._itens.move_to_end(c)
+        faltas = [i for i, v in enumerate(valores) if v is None]
+        metricas.contar(f"{self.nome}.acerto", len(chaves) - len(faltas))
+        metricas.contar(f"{self.nome}.falta", len(faltas))
+
+        if faltas:
+            novos = construtor_lote([chaves[i] for i in faltas])
+            with self._trava:
+                for i, valor in zip(faltas, novos):
+                    valores[i] = self._itens[chaves[i]] = valor
+                while len(self._itens) > self.capacidade:
+                    self._itens.popitem(last=False)
+        return valores
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+_consultas = CacheLRU("busca.cache_consultas", CONSULTAS_EM_CACHE)
+_resultados = CacheLRU("busca.cache_resultados", RESULTADOS_EM_CACHE)
+_vetores = CacheLRU("busca.cache_vetores", VETORES_EM_CACHE)
+_indices_bm25 = CacheLRU("busca.cache_bm25", 8)
+
+# Vetores do corpus: um job por vez em segundo plano (o modelo já paraleliza por dentro)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="busca-vetores")
+_futuros = {}  # (modelo, corpus) -> Future da matriz
+_trava_futuros = threading.Lock()
+
+
+def limpar_caches(corpus=True):
+    """Esvazia os caches de consultas e resultados (e, com `corpus`, também vetores de textos e índices BM25)."""
+    for cache in (_consultas, _resultados) + ((_vetores, _indices_bm25) if corpus else ()):
+        cache.limpar()
+
+
+def normalizar_consulta(consulta):
+    """Mesma consulta com outra caixa ou espaçamento cai na mesma entrada do cache."""
+    return " ".join(consulta.lower().split())
+
+
+def vetor_consulta(model, model_name, consulta):
+    """Vetor normalizado da consulta (já normalizada); o modelo só roda na primeira vez."""
+    def codificar():
+        with metricas.medir("busca.model_encode_query"):
+            vetor = model.encode(consulta, normalize_embeddings=True)
+        vetor.setflags(write=False)
+        return vetor
+    return _consultas.obter((model_name, consulta), codificar)
+
+
+def _top(scores, k):
+    """Posições dos k maiores scores, do maior para o menor (sem ordenar o resto); -inf fica de fora."""
+    if k < len(scores):
+        parte = np.argpartition(-scores, k - 1)[:k]
+        top = parte[np.argsort(-scores[parte], kind="stable")]
+    else:
+        top = np.argsort(-scores, kind="stable")
+    return top[np.isfinite(scores[top])]
+
+
+def _congelar(*arrays):
+    for a in arrays:
+        a.setflags(write=False)
+    return arrays
+
+
+# --- CORPUS ---
+@dataclass
+class CorpusBusca:
+    """
+    Linhas do snapshot com todas as colunas de busca lado a lado: o texto
+    original (df), o normalizado para o modelo (textos) e quais linhas têm
+    texto útil em cada coluna (validos).
+    """
+    chave: tuple
+    df: pd.DataFrame
+    colunas: list
+    textos: dict
+    validos: dict
+
+    @property
+    def n(self):
+        return len(self.df)
+
+
+def _montar_corpus(snap, colunas):
+    df = snap.com_textos(colunas).reset_index(drop=True)
+    textos, validos = {}, {}
+    for col in colunas:
+        brutos = df[col]
+        validos[col] = (brutos.notna() & (brutos.astype(str).str.len() > TAMANHO_MINIMO_TEXTO)).to_numpy()
+        normalizados = limpeza.limpar_serie(brutos.astype(str), df[dados.COL_ID], perfil="busca").to_numpy()
+        textos[col] = np.where(validos[col], normalizados, "").tolist()
+    return CorpusBusca((snap.versao, tuple(colunas)), df, list(colunas), textos, validos)
+
+
+def corpus_do_snapshot(snap, colunas):
+    """Corpus das colunas pedidas, montado uma vez por snapshot e compartilhado pelas sessões."""
+    colunas = list(colunas)
+    return snap.derivado(f"corpus_busca_{'_'.join(colunas)}", lambda _: _montar_corpus(snap, colunas))
+
+
+def vetores_corpus(corpus, model, model_name):
+    """
+    Future com a matriz (colunas, linhas, dimensão) do corpus: os textos de
+    todas as colunas vão juntos, em lotes, para o modelo em segundo plano, e
+    trocar de coluna na tela não recodifica nada. Linhas sem texto ficam zeradas.
+    Com o modo compartilhado a matriz é publicada para os outros processos.
+    """
+    def codificar():
+        pares = [(i, j) for i, col in enumerate(corpus.colunas) for j in np.flatnonzero(corpus.validos[col])]
+        with metricas.medir("busca.model_encode_corpus", linhas=len(pares)):
+            vetores = model.encode([corpus.textos[corpus.colunas[i]][j] for i, j in pares],
+                                   normalize_embeddings=True, show_progress_bar=False)
+        matriz = np.zeros((len(corpus.colunas), corpus.n, vetores.shape[1]), dtype=np.float32)
+        if pares:
+            i, j = np.array(pares).T
+            matriz[i, j] = vetores
+        return matriz
+
+    def publicar():
+        chave = compartilhado.chave_matriz("emb", model_name, *corpus.colunas,
+                                           *(t for col in corpus.colunas for t in corpus.textos[col]))
+        return compartilhado.matriz(chave, codificar)
+
+    chave = (model_name, corpus.chave)
+    with _trava_futuros:
+        futuro = _futuros.get(chave)
+        if futuro is None or (futuro.done() and futuro.exception() is not None):
+            futuro = _futuros[chave] = _executor.submit(publicar)
+            # Só as matrizes recentes ficam referenciadas aqui (o resto vive em compartilhado)
+            while len(_futuros) > compartilhado.MATRIZES_EM_MEMORIA:
+                _futuros.pop(next(iter(_futuros)))
+        return futuro
+
+
+def _fundir(corpus, colunas, pontuar):
+    """
+    Fusão dos campos (CombMAX): o score da linha é o maior entre as colunas
+    em que ela tem texto; -inf se não tiver nenhuma. Retorna (scores, campo).
+    """
+    matriz = np.empty((len(colunas), corpus.n), dtype=np.float32)
+    for i, col in enumerate(colunas):
+        matriz[i] = np.where(corpus.validos[col], pontuar(col), -np.inf)
+    campos = matriz.argmax(axis=0)
+    return matriz[campos, np.arange(corpus.n)], campos
+
+
+def buscar(model, model_name, consulta, corpus, vetores, colunas, k=TOP_K):
+    """
+    (posições, scores, campos) dos k mais parecidos com a consulta, do maior
+    para o menor, em uma ou mais colunas do corpus (`campos` = índice em
+    `colunas` do campo que deu o score). O mesmo par consulta/corpus não é
+    recalculado, nem a consulta recodificada.
+    """
+    consulta = normalizar_consulta(consulta)
+    colunas = tuple(colunas)
+
+    def calcular():
+        vetor = vetor_consulta(model, model_name, consulta)
+        with metricas.medir("busca.similaridade", linhas=corpus.n * len(colunas)):
+            scores, campos = _fundir(corpus, colunas, lambda col: vetores[corpus.colunas.index(col)] @ vetor)
+            top = _top(scores, k)
+        return _congelar(top, scores[top], campos[top])
+
+    return _resultados.obter((consulta, model_name, corpus.chave, colunas, k), calcular)
+
+
+# --- DOIS ESTÁGIOS ---
+class IndiceBM25:
+    """BM25 sobre a matriz esparsa documento x termo (pesos já calculados: a consulta só soma colunas)."""
+
+    def __init__(self, textos, k1=1.5, b=0.75):
+        CountVectorizer = aquecimento.importar("sklearn.feature_extraction.text").CountVectorizer
+        self._vetorizador = CountVectorizer(strip_accents="unicode")
+        tf = self._vetorizador.fit_transform(textos).tocsr().astype(np.float32)
+        n = tf.shape[0]
+        docs_por_termo = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log1p((n - docs_por_termo + 0.5) / (docs_por_termo + 0.5)).astype(np.float32)
+        tamanhos = np.asarray(tf.sum(axis=1)).ravel()
+        normalizado = tamanhos / (tamanhos.mean() or 1)
+        doc = np.repeat(np.arange(n), np.diff(tf.indptr))
+        tf.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + k1 * (1 - b + b * normalizado[doc]))
+        self._pesos = tf.tocsc()
+
+    def scores(self, consulta):
+        termos = self._vetorizador.transform([consulta]).indices
+        return np.asarray(self._pesos[:, termos].sum(axis=1)).ravel()
+
+
+def estagio_vetorial(model, model_name, corpus, vetores):
+    """1º estágio por vetores já calculados do corpus (ex.: MiniLM): score = produto escalar."""
+    def pontuar(consulta, colunas):
+        vetor = vetor_consulta(model, model_name, consulta)
+        return _fundir(corpus, colunas, lambda col: vetores[corpus.colunas.index(col)] @ vetor)
+    return pontuar
+
+
+def indice_bm25(corpus, coluna):
+    """Índice BM25 de uma coluna do corpus, montado uma vez e compartilhado pelas sessões."""
+    def montar():
+        with metricas.medir("busca.bm25_indice", linhas=corpus.n):
+            return IndiceBM25(corpus.textos[coluna])
+    return _indices_bm25.obter((corpus.chave, coluna), montar)
+
+
+def estagio_bm25(corpus):
+    """1º estágio por palavras (BM25 de cada coluna, fundidas como os vetores)."""
+    return lambda consulta, colunas: _fundir(corpus, colunas, lambda col: indice_bm25(corpus, col).scores(consulta))
+
+
+def vetores_textos(model, model_name, textos):
+    """Vetores normalizados do modelo para uma lista de textos; só os que faltam no cache são codificados."""
+    def codificar(chaves):
+        return list(model.encode([texto for _, texto in chaves], normalize_embeddings=True, show_progress_bar=False))
+    return np.stack(_vetores.obter_varios([(model_name, t) for t in textos], codificar))
+
+
+def _reavaliar(model, model_name, vetor, corpus, colunas, linhas):
+    """Maior score do modelo grande entre os campos com texto de cada linha (e qual campo)."""
+    donos, campos, textos = [], [], []
+    for n, linha in enumerate(linhas.tolist()):
+        for i, col in enumerate(colunas):
+            if corpus.validos[col][linha]:
+                donos.append(n)
+                campos.append(i)
+                textos.append(corpus.textos[col][linha])
+    scores = vetores_textos(model, model_name, textos) @ vetor
+    melhor = np.full(len(linhas), -np.inf, dtype=np.float32)
+    melhor_campo = np.zeros(len(linhas), dtype=np.int64)
+    for dono, campo, score in zip(donos, campos, scores.tolist()):
+        if score > melhor[dono]:
+            melhor[dono], melhor_campo[dono] = score, campo
+    return melhor, melhor_campo
+
+
+def buscar_dois_estagios(primeiro_estagio, nome_estagio, model, model_name, consulta, corpus, colunas,
+                         k=TOP_K, candidatos=CANDIDATOS, orcamento=ORCAMENTO_REAVALIACAO_SEGUNDOS):
+    """
+    (posições, scores, campos, reavaliados) em dois estágios. `primeiro_estagio(consulta, colunas)`
+    devolve um score barato para cada linha do corpus (vetores do MiniLM, BM25...);
+    os `candidatos` melhores são reavaliados pelo modelo grande, em lotes, enquanto
+    couberem em `orcamento` segundos (o primeiro lote sempre roda). Candidatos
+    não reavaliados vêm depois, na ordem e com o score do 1º estágio
+    (`reavaliados` False). Um resultado cortado pelo orçamento não vai para o
+    cache: a próxima vez tenta de novo (os vetores já calculados ficam no cache).
+    """
+    consulta = normalizar_consulta(consulta)
+    colunas = tuple(colunas)
+
+    def calcular():
+        inicio = time.perf_counter()
+        with metricas.medir(f"busca.estagio1.{nome_estagio}", linhas=corpus.n * len(colunas)):
+            scores1, campos1 = primeiro_estagio(consulta, colunas)
+            cand = _top(scores1, candidatos)
+
+        vetor = vetor_consulta(model, model_name, consulta)
+        scores2, campos2 = [], []
+        with metricas.medir("busca.reavaliacao") as m:
+            for i in range(0, len(cand), LOTE_REAVALIACAO):
+                if scores2 and time.perf_counter() - inicio > orcamento:
+                    break
+                s, c = _reavaliar(model, model_name, vetor, corpus, colunas, cand[i:i + LOTE_REAVALIACAO])
+                scores2.append(s)
+                campos2.append(c)
+            m.linhas = n = sum(len(s) for s in scores2)
+        metricas.contar("busca.reavaliacao.candidatos", len(cand))
+        metricas.contar("busca.reavaliacao.reavaliados", n)
+
+        scores2 = np.concatenate(scores2) if scores2 else np.empty(0, dtype=np.float32)
+        campos2 = np.concatenate(campos2) if campos2 else np.empty(0, dtype=np.int64)
+        ordem = np.argsort(-scores2, kind="stable")
+        restantes = cand[n:]
+        top = np.concatenate([cand[:n][ordem], restantes])[:k]
+        top_scores = np.concatenate([scores2[ordem], scores1[restantes].astype(np.float32)])[:k]
+        top_campos = np.concatenate([campos2[ordem], campos1[restantes]])[:k]
+        reavaliados = np.arange(len(cand))[:k] < n
+        return _congelar(top, top_scores, top_campos, reavaliados)
+
+    return _resultados.obter((consulta, nome_estagio, model_name, corpus.chave, colunas, k, candidatos), calcular,
+                             guardar_se=lambda r: r[3].all())
@@ -0,0 +1,132 @@
+"""
+Calibração do perfil de hardware (fora do servidor).
+
+Mede a vazão do `encode` de cada modelo para algumas combinações de threads e
+tamanho de lote e grava o melhor resultado em perfil_hardware.ARQ_PERFIL, que o
+app lê (ver perfil_hardware.py). Sem perfil válido, o próprio app o dispara em
+segundo plano com prioridade baixa; para uma medição limpa, rodar com o app
+parado ou fora do horário de uso: a medição ocupa todas as CPUs/GPU.
+
+Uso:
+    python calibrar_hardware.py
+    python calibrar_hardware.py --max-seq 384        # sequência máxima gravada no perfil
+    python calibrar_hardware.py --modelos paraphrase-multilingual-MiniLM-L12-v2
+"""
+import argparse
+import json
+import os
+import time
+
+import torch
+
+import aquecimento
+import base_sintetica as b
+import metricas
+import perfil_hardware
+
+# ========================================================
+# ⚙️ CALIBRAÇÃO
+# ========================================================
+LOTES_CANDIDATOS = [16, 32, 64, 128]
+TEXTOS_CALIBRACAO = 96
+ORCAMENTO_CALIBRACAO_SEGUNDOS = 120   # por modelo; o que não couber fica com o melhor já medido
+# ========================================================
+
+
+def _textos_calibracao(quantidade):
+    """Textos no formato dos tickets (curtos como o resumo, longos como a descrição)."""
+    textos = []
+    for i in range(quantidade):
+        frase = f"{b.ACOES[i % len(b.ACOES)]} {b.OBJETOS[i % len(b.OBJETOS)]} {b.DETALHES[i % len(b.DETALHES)]}."
+        textos.append(" ".join([f"Prezados, {frase.lower()}"] * (1 + i % 6) + [b.FECHOS[i % len(b.FECHOS)]]))
+    return textos
+
+
+def _vazao(model, textos, lote):
+    t0 = time.perf_counter()
+    model.encode(textos, batch_size=lote, show_progress_bar=False)
+    return len(textos) / (time.perf_counter() - t0)
+
+
+def calibrar(modelos, hw):
+    """
+    Mede a vazão (textos/s) de cada modelo em `modelos` (nome -> modelo já
+    ajustado por perfil_hardware.ajustar_modelo) e monta o perfil. Na CPU, as
+    threads são escolhidas com o primeiro modelo; o lote, modelo a modelo.
+    """
+    textos = _textos_calibracao(TEXTOS_CALIBRACAO)
+    cpu = hw["dispositivo"] == "cpu"
+    perfil = {
+        "criado_em": time.time(), "hardware": hw,
+        "precisao": "float32" if cpu else "float16",
+        "threads": hw["cpus"], "modelos": {},
+    }
+
+    with metricas.medir("perfil_hardware.calibrar"):
+        if cpu and modelos:
+            model = next(iter(modelos.values()))
+            model.encode(textos[:perfil_hardware.LOTE_PADRAO], batch_size=perfil_hardware.LOTE_PADRAO,
+                         show_progress_bar=False)  # aquece
+            vazoes = {}
+            for threads in sorted({1, max(1, hw["cpus"] // 2), hw["cpus"]}):
+                torch.set_num_threads(threads)
+                vazoes[threads] = _vazao(model, textos, perfil_hardware.LOTE_PADRAO)
+            # Empate técnico (5%) fica com menos threads: sobra CPU para o Streamlit e outros encodes
+            melhor = max(vazoes.values())
+            perfil["threads"] = min(t for t, v in vazoes.items() if v >= 0.95 * melhor)
+            torch.set_num_threads(perfil["threads"])
+
+        for nome, model in modelos.items():
+            inicio = time.perf_counter()
+            vazoes = {}
+            for lote in LOTES_CANDIDATOS:
+                vazoes[lote] = _vazao(model, textos, lote)
+                # Lotes maiores só compensam enquanto a vazão sobe
+                if vazoes[lote] < 0.95 * max(vazoes.values()) or time.perf_counter() - inicio > ORCAMENTO_CALIBRACAO_SEGUNDOS:
+                    break
+            lote = max(vazoes, key=vazoes.get)
+            perfil["modelos"][nome] = {"lote": lote, "max_seq": getattr(model, "max_seq_length", None),
+                                       "textos_por_segundo": round(vazoes[lote], 1)}
+
+    if cpu:
+        perfil["encodes_simultaneos"] = max(1, hw["cpus"] // perfil["threads"])
+    else:
+        perfil["encodes_simultaneos"] = max(1, int(hw["vram_gb"] // perfil_hardware.VRAM_POR_ENCODE_GB))
+    return perfil
+
+
+def salvar(perfil):
+    """Grava o perfil de uma vez (troca atômica): o app nunca lê um arquivo pela metade."""
+    temporario = f"{perfil_hardware.ARQ_PERFIL}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(perfil, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, perfil_hardware.ARQ_PERFIL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede e grava o perfil de hardware usado pelo CITSM.")
+    parser.add_argument("--modelos", nargs="+", default=aquecimento.MODELOS_AQUECIDOS)
+    parser.add_argument("--max-seq", type=int, default=None,
+                        help=f"sequência máxima dos modelos (padrão: {perfil_hardware.MAX_SEQ_CPU} na CPU, a do modelo na GPU)")
+    args = parser.parse_args(argv)
+
+    hw = perfil_hardware.sondar(torch)
+    st_mod = aquecimento.importar("sentence_transformers")
+    modelos = {}
+    for nome in args.modelos:
+        # Modelo "cru" (sem o perfil antigo aplicado), ajustado com os padrões
+        model = perfil_hardware.ajustar_modelo(st_mod.SentenceTransformer(nome, device=hw["dispositivo"]), hw)
+        if args.max_seq:
+            model.max_seq_length = args.max_seq
+        modelos[nome] = model
+
+    perfil = calibrar(modelos, hw)
+    salvar(perfil)
+    print(f"Perfil gravado em {perfil_hardware.ARQ_PERFIL}")
+    print(f"Threads: {perfil['threads']} | Precisão: {perfil['precisao']} | Encodes simultâneos: {perfil['encodes_simultaneos']}")
+    for nome, m in perfil["modelos"].items():
+        print(f"  {nome}: lote {m['lote']}, max_seq {m['max_seq']}, {m['textos_por_segundo']} textos/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import textos
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ SNAPSHOT EM MEMÓRIA COMPARTILHADA (vários processos do Streamlit)
+# ========================================================
+# Ex.: CITSM_DIR_COMPARTILHADO=/dev/shm/citsm — vazio = cada processo com sua cópia
+VAR_DIR_COMPARTILHADO = "CITSM_DIR_COMPARTILHADO"
+VERSOES_MANTIDAS = 2            # versões de cada conjunto preservadas (a atual + a anterior)
+MATRIZES_EM_MEMORIA = 8         # matrizes (embeddings) mantidas abertas por processo
+VALIDADE_MATRIZES_SEGUNDOS = 2 * 3600
+
+ARQ_TABELA = "tabela.arrow"
+ARQ_META = "meta.json"
+DIR_TEXTOS = "textos"
+LINK_ATUAL = "ATUAL"
+# ========================================================
+
+_matrizes = OrderedDict()   # chave -> np.ndarray (mmap no modo compartilhado)
+_em_calculo = {}            # chave -> Lock (uma construção por chave; as outras matrizes não esperam)
+_trava_matrizes = threading.Lock()
+
+
+def ativo():
+    return bool(os.environ.get(VAR_DIR_COMPARTILHADO))
+
+
+def _raiz(*partes):
+    caminho = os.path.join(os.environ[VAR_DIR_COMPARTILHADO], *partes)
+    os.makedirs(caminho, exist_ok=True)
+    return caminho
+
+
+@contextmanager
+def _trava_publicacao(raiz):
+    """Trava entre processos (flock): só um publica por vez."""
+    import fcntl  # só existe em POSIX; o modo compartilhado é para Linux (/dev/shm)
+
+    with open(os.path.join(raiz, ".trava"), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# --- GRAVAÇÃO (processo que extraiu) ---
+def _gravar_tabela(df, caminho):
+    """Arrow IPC em um único lote; datas viram int64 (NaT = mínimo) para anexar sem cópia."""
+    colunas, tipos = {}, {}
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            colunas[col] = pa.array(serie.to_numpy(dtype="datetime64[ns]").view("i8"))
+            tipos[col] = "datetime"
+            continue
+        try:
+            colunas[col] = pa.array(serie, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            colunas[col] = pa.array(serie.astype(str))
+        tipos[col] = "arrow"
+
+    tabela = pa.table(colunas)
+    with pa.OSFile(caminho, "wb") as f, pa.ipc.new_file(f, tabela.schema) as escritor:
+        escritor.write_table(tabela, max_chunksize=max(len(df), 1))
+    return tipos
+
+
+def _publicar(raiz, extrair):
+    """Extrai em um diretório temporário e o promove a versão atual (troca atômica do link)."""
+    temporario = tempfile.mkdtemp(prefix=".publicando_", dir=raiz)
+    try:
+        snap = extrair(os.path.join(temporario, DIR_TEXTOS))
+        meta = {
+            "versao": snap.versao,
+            "carregado_em": snap.carregado_em,
+            "linhas": len(snap.df),
+            "tipos": _gravar_tabela(snap.df, os.path.join(temporario, ARQ_TABELA)),
+            "textos": snap.armazem_textos.colunas if snap.armazem_textos else [],
+        }
+        with open(os.path.join(temporario, ARQ_META), "w") as f:
+            json.dump(meta, f)
+        final = os.path.join(raiz, f"v{snap.versao}")
+        os.rename(temporario, final)
+    except BaseException:
+        shutil.rmtree(temporario, ignore_errors=True)
+        raise
+
+    link_temp = os.path.join(raiz, f".{LINK_ATUAL}.{os.getpid()}")
+    os.symlink(os.path.basename(final), link_temp)
+    os.replace(link_temp, os.path.join(raiz, LINK_ATUAL))
+    _limpar_versoes(raiz)
+    return final
+
+
+def _limpar_versoes(raiz):
+    """
+    Remove versões antigas e restos de publicações interrompidas (chamada com a trava).
+    Processos que ainda usam uma versão removida não são afetados: os mapas
+    continuam válidos até serem soltos.
+    """
+    versoes = sorted(n for n in os.listdir(raiz) if n.startswith("v"))
+    for nome in versoes[:-VERSOES_MANTIDAS]:
+        shutil.rmtree(os.path.join(raiz, nome), ignore_errors=True)
+    for nome in os.listdir(raiz):
+        if nome.startswith(".publicando_"):
+            shutil.rmtree(os.path.join(raiz, nome), ignore_errors=True)
+
+
+# --- LEITURA (todos os processos) ---
+def _versao_atual(raiz):
+    link = os.path.join(raiz, LINK_ATUAL)
+    if not os.path.islink(link):
+        return None, None
+    diretorio = os.path.join(raiz, os.readlink(link))
+    with open(os.path.join(diretorio, ARQ_META)) as f:
+        return diretorio, json.load(f)
+
+
+def _anexar(diretorio):
+    """DataFrame sobre o arquivo mapeado: datas/números viram arrays numpy sem cópia e textos ficam em Arrow."""
+    with open(os.path.join(diretorio, ARQ_META)) as f:
+        meta = json.load(f)
+    tabela = pa.ipc.open_file(pa.memory_map(os.path.join(diretorio, ARQ_TABELA))).read_all()
+
+    colunas = {}
+    for col, tipo in meta["tipos"].items():
+        coluna = tabela.column(col)
+        arr = coluna.chunk(0) if coluna.num_chunks == 1 else coluna.combine_chunks()
+        if tipo == "datetime":
+            colunas[col] = arr.to_numpy(zero_copy_only=True).view("datetime64[ns]")
+        elif (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)) and arr.null_count == 0:
+            colunas[col] = arr.to_numpy(zero_copy_only=True)
+        else:
+            colunas[col] = pd.arrays.ArrowExtensionArray(pa.chunked_array([arr]))
+    df = pd.DataFrame(colunas, copy=False)
+
+    armazem = None
+    if meta["textos"]:
+        armazem = textos.ArmazemTextos(os.path.join(diretorio, DIR_TEXTOS), meta["textos"], meta["linhas"], descartavel=False)
+    return df, meta["versao"], meta["carregado_em"], armazem
+
+
+def obter_ou_publicar(nome, idade_maxima, extrair):
+    """
+    Retorna (df, versao, carregado_em, armazem_textos) do conjunto `nome`.
+    Se a versão publicada tiver menos de `idade_maxima` segundos, só anexa;
+    senão este processo chama `extrair(diretorio_textos)` (um Snapshot) e publica.
+    Com a trava, quem chega enquanto outro extrai espera e anexa o resultado.
+    """
+    raiz = _raiz(nome)
+    with _trava_publicacao(raiz):
+        diretorio, meta = _versao_atual(raiz)
+        if meta is None or time.time() - meta["carregado_em"] >= idade_maxima:
+            diretorio = _publicar(raiz, extrair)
+            log.info("'%s' publicado em %s", nome, diretorio)
+        return _anexar(diretorio)
+
+
+# --- MATRIZES (embeddings) ---
+def chave_matriz(prefixo, *partes):
+    """Chave estável para uma matriz derivada de textos/modelo (hash do conteúdo)."""
+    h = hashlib.sha1()
+    for parte in partes:
+        h.update(str(parte).encode("utf-8"))
+        h.update(b"\0")
+    return f"{prefixo}_{h.hexdigest()}"
+
+
+def matriz(chave, construtor):
+    """
+    Matriz numpy calculada uma vez e reaproveitada: em memória no processo e,
+    no modo compartilhado, publicada como .npy e anexada (mmap) pelos demais.
+    A construção só trava a própria chave; a trava entre processos fica só na
+    troca do arquivo.
+    """
+    with _trava_matrizes:
+        if chave in _matrizes:
+            _matrizes.move_to_end(chave)
+            return _matrizes[chave]
+        trava_chave = _em_calculo.setdefault(chave, threading.Lock())
+
+    try:
+        with trava_chave:
+            with _trava_matrizes:
+                if chave in _matrizes:
+                    return _matrizes[chave]
+            valor = _construir_matriz(chave, construtor)
+            with _trava_matrizes:
+                _matrizes[chave] = valor
+                while len(_matrizes) > MATRIZES_EM_MEMORIA:
+                    _matrizes.popitem(last=False)
+            return valor
+    finally:
+        with _trava_matrizes:
+            _em_calculo.pop(chave, None)
+
+
+def _construir_matriz(chave, construtor):
+    if not ativo():
+        return np.asarray(construtor())
+
+    raiz = _raiz("matrizes")
+    caminho = os.path.join(raiz, f"{chave}.npy")
+    if not os.path.exists(caminho):
+        # Outro processo pode estar calculando a mesma: quem terminar primeiro publica
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporario, "wb") as f:
+                np.save(f, np.asarray(construtor()))
+            with _trava_publicacao(raiz):
+                if not os.path.exists(caminho):
+                    os.replace(temporario, caminho)
+                _limpar_matrizes(raiz)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+    return np.load(caminho, mmap_mode="r")
+
+
+def _limpar_matrizes(raiz):
+    limite = time.time() - VALIDADE_MATRIZES_SEGUNDOS
+    for nome in os.listdir(raiz):
+        caminho = os.path.join(raiz, nome)
+        if nome.endswith(".npy") and os.path.getmtime(caminho) < limite:
+            os.remove(caminho)
@@ -1,9 +1,70 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
 import oracledb
 
+# Banco local (SQLite) no lugar do DW, ex.: base sintética do benchmark (ver base_sintetica.py)
+VAR_BANCO_LOCAL = "CITSM_BANCO_LOCAL"
+# Atraso artificial por linha lida do banco local (segundos), para simular a rede até o DW
+VAR_LATENCIA_LOCAL = "CITSM_LATENCIA_LOCAL"
+
+usuario = "DWITSM"
+senha = "a2QL#h59#Qw8#f9Y"
+dsn = "db-bi-dw-prd.manaus.am.gov.br/bidwpr"
+
+TAMANHO_POOL = 8  # conexões simultâneas no pool do Oracle (extração paralela)
+
+_pool = None
+_trava_pool = threading.Lock()
+
+
+class _CursorLocal(sqlite3.Cursor):
+    """Cursor do SQLite que "paga" a latência configurada a cada linha buscada."""
+
+    def _atrasar(self, linhas):
+        if self.connection.latencia and linhas:
+            time.sleep(len(linhas) * self.connection.latencia)
+        return linhas
+
+    def fetchone(self):
+        linha = super().fetchone()
+        if linha is not None:
+            self._atrasar([linha])
+        return linha
+
+    def fetchmany(self, size=None):
+        return self._atrasar(super().fetchmany(self.arraysize if size is None else size))
+
+    def fetchall(self):
+        return self._atrasar(super().fetchall())
+
+
+class _ConexaoLocal(sqlite3.Connection):
+    latencia = 0.0
+
+    def cursor(self, factory=_CursorLocal):
+        return super().cursor(factory)
+
+
+def dialeto():
+    return "sqlite" if os.environ.get(VAR_BANCO_LOCAL) else "oracle"
+
+def valor_data(ts):
+    """Data para bind variable: texto ISO no SQLite (datas guardadas como texto), datetime no Oracle."""
+    return str(ts) if dialeto() == "sqlite" else ts.to_pydatetime()
+
+def limitar(sql, linhas):
+    return sql + (f" LIMIT {int(linhas)}" if dialeto() == "sqlite" else f" FETCH FIRST {int(linhas)} ROWS ONLY")
+
 def conexao():
-    usuario = "DWITSM"
-    senha = "a2QL#h59#Qw8#f9Y"
-    dsn = "db-bi-dw-prd.manaus.am.gov.br/bidwpr"
+    banco_local = os.environ.get(VAR_BANCO_LOCAL)
+    if banco_local:
+        conn = sqlite3.connect(banco_local, check_same_thread=False, factory=_ConexaoLocal)
+        conn.latencia = float(os.environ.get(VAR_LATENCIA_LOCAL) or 0)
+        return conn
 
     try:
         connection = oracledb.connect(user=usuario, password=senha, dsn=dsn)
@@ -13,4 +74,29 @@ def conexao():
     except Exception as e:
         print("❌ Ops, erro na conexão:")
         print(e)
-    return connection
\ No newline at end of file
+    return connection
+
+def _pool_oracle():
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            _pool = oracledb.create_pool(user=usuario, password=senha, dsn=dsn, min=1, max=TAMANHO_POOL, increment=1)
+        return _pool
+
+@contextmanager
+def conexao_pool():
+    """Conexão emprestada do pool do Oracle (ou nova, no banco local), devolvida ao sair do `with`."""
+    if dialeto() == "sqlite":
+        conn = conexao()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    pool = _pool_oracle()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
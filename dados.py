@@ -0,0 +1,428 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import compartilhado
+import conexao
+import metricas
+import textos
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ CONFIGURAÇÃO DA CARGA
+# ========================================================
+TTL_SEGUNDOS = 3600          # Idade máxima de um snapshot antes de ser considerado velho
+ANTECEDENCIA_SEGUNDOS = 300  # O atualizador em segundo plano recarrega 5 min antes de vencer
+
+# Conjuntos de dados: nome -> limite de linhas (None = tabela inteira)
+CONJUNTOS = {
+    "completo": None,
+    "amostra_5000": 5000,
+    "amostra_3000": 3000,
+}
+
+COLS_DATA = ['DTABERTURA', 'DTULTIMAMODIFICACAO', 'DTFIM']
+COLS_CATEGORIA = ['DEMANDANTE', 'STATUS', 'NOMESERVICO', 'NUMEROCONTRATO']
+# Textos longos: vão para o armazém em disco (textos.py), não para o DataFrame
+COLS_TEXTO = ['DESCRICAO', 'SUMMARY', 'RESUMO_TICKET']
+COL_ID = 'TICKET_SUBTICKET'   # identifica a linha (um subticket por linha)
+TAMANHO_LOTE = 50000          # linhas por lote na extração
+# Extração da tabela inteira em faixas mensais de DTABERTURA, buscadas em paralelo (1 = serial)
+PARALELISMO = int(os.environ.get("CITSM_PARALELISMO") or 4)
+TAMANHO_FETCH = 5000          # linhas por ida ao banco (cursor.arraysize)
+
+# Consultas agregadas (GROUP BY) feitas direto no banco — ver motor_consulta.MotorBanco
+TTL_AGREGADOS_SEGUNDOS = 300
+AGREGADOS_EM_CACHE = 512      # resultados mantidos por processo (LRU)
+# ========================================================
+
+
+def montar_consulta(limite=None):
+    sql = "SELECT * FROM ODS_ITSM"
+    return conexao.limitar(sql, limite) if limite else sql
+
+
+def faixas_mensais(conn):
+    """Limites [início, fim) de cada mês entre MIN e MAX(DTABERTURA)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MIN(DTABERTURA), MAX(DTABERTURA) FROM ODS_ITSM")
+        minimo, maximo = cur.fetchone()
+    finally:
+        cur.close()
+    if minimo is None:
+        return []
+    meses = pd.date_range(pd.Timestamp(minimo).to_period("M").to_timestamp(), pd.Timestamp(maximo), freq="MS")
+    return list(zip(meses, list(meses[1:]) + [meses[-1] + pd.offsets.MonthBegin()]))
+
+
+def consultas_particionadas(conn):
+    """(sql, binds) de cada faixa; a última pega os tickets sem DTABERTURA."""
+    sql = "SELECT * FROM ODS_ITSM WHERE DTABERTURA >= :ini AND DTABERTURA < :fim"
+    consultas = [(sql, {"ini": conexao.valor_data(ini), "fim": conexao.valor_data(fim)}) for ini, fim in faixas_mensais(conn)]
+    consultas.append(("SELECT * FROM ODS_ITSM WHERE DTABERTURA IS NULL", {}))
+    return consultas
+
+
+def ler_faixa(sql, binds):
+    """Uma faixa em uma conexão do pool, montada em blocos de TAMANHO_FETCH linhas já com as datas tipadas."""
+    with conexao.conexao_pool() as conn:
+        cur = conn.cursor()
+        cur.arraysize = TAMANHO_FETCH
+        try:
+            cur.execute(sql, binds)
+            colunas = [d[0] for d in cur.description]
+            blocos = []
+            while linhas := cur.fetchmany():
+                blocos.append(pd.DataFrame.from_records(linhas, columns=colunas))
+        finally:
+            cur.close()
+
+    df = pd.concat(blocos, ignore_index=True) if blocos else pd.DataFrame(columns=colunas)
+    for col in COLS_DATA:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def normalizar(df):
+    """
+    Tratamento comum a todas as páginas: datas convertidas e strings limpas.
+    Feito uma única vez por carga; o snapshot resultante é compartilhado (não modificar).
+    """
+    for col in COLS_DATA:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    for col in COLS_CATEGORIA:
+        if col in df.columns:
+            # Converte para string e remove espaços (.0 se for número)
+            df[col] = df[col].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
+
+    # Índice posicional: tabelas e índices derivados usam as posições das linhas
+    return df.reset_index(drop=True)
+
+
+def valores_nas_posicoes(serie, posicoes):
+    """
+    Array numpy com os valores da série só nas posições pedidas. Colunas em Arrow
+    (snapshot anexado da memória compartilhada) não são convertidas inteiras.
+    """
+    return np.asarray(serie.array.take(np.asarray(posicoes, dtype=np.intp)))
+
+
+@dataclass
+class Snapshot:
+    """Uma carga da tabela ODS_ITSM, imutável e compartilhada entre as sessões."""
+    nome: str
+    df: pd.DataFrame
+    versao: str
+    carregado_em: float
+    armazem_textos: textos.ArmazemTextos | None = None
+    _derivados: dict = field(default_factory=dict, repr=False)
+    _trava: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def idade(self):
+        return time.time() - self.carregado_em
+
+    def derivado(self, chave, construtor):
+        """
+        Calcula (uma vez por snapshot) uma estrutura derivada do DataFrame,
+        ex.: ordenações da tabela. Descartada junto com o snapshot.
+        """
+        if chave not in self._derivados:
+            with self._trava:
+                if chave not in self._derivados:
+                    self._derivados[chave] = construtor(self.df)
+        return self._derivados[chave]
+
+    @property
+    def colunas(self):
+        """Colunas do DataFrame + colunas de texto guardadas no armazém."""
+        return list(self.df.columns) + (self.armazem_textos.colunas if self.armazem_textos else [])
+
+    def ler_textos(self, coluna, posicoes):
+        """Valores de uma coluna (de texto ou não) nas posições pedidas."""
+        if coluna in self.df.columns:
+            return valores_nas_posicoes(self.df[coluna], posicoes)
+        return self.armazem_textos.ler(coluna, posicoes)
+
+    def com_textos(self, colunas, posicoes=None):
+        """Cópia das linhas (todas ou só `posicoes`) com as colunas de texto pedidas preenchidas."""
+        posicoes = np.arange(len(self.df)) if posicoes is None else np.asarray(posicoes)
+        df = self.df.iloc[posicoes].copy()
+        for col in colunas:
+            if col not in df.columns:
+                df[col] = self.ler_textos(col, posicoes)
+        return df
+
+    def posicoes_por_ticket(self, tickets):
+        """Posições das linhas a partir dos ids (COL_ID); ids desconhecidos são ignorados."""
+        indice = self.derivado("indice_ticket", lambda d: pd.Index(d[COL_ID]))
+        posicoes = indice.get_indexer(tickets)
+        return posicoes[posicoes >= 0]
+
+
+class CarregadorSnapshot:
+    """
+    Carga "single-flight" de um conjunto de dados:
+    - só uma extração por vez, as demais sessões aguardam a mesma (primeira carga)
+      ou continuam recebendo o snapshot anterior (stale-while-revalidate);
+    - um atualizador em segundo plano recarrega antes do vencimento do TTL.
+    """
+
+    def __init__(self, nome, sql, ttl=TTL_SEGUNDOS, antecedencia=ANTECEDENCIA_SEGUNDOS, particionar=False):
+        self.nome = nome
+        self.sql = sql
+        self.particionar = particionar
+        self.ttl = ttl
+        self.antecedencia = antecedencia
+        self.ultimo_erro = None
+
+        self._snapshot = None
+        self._trava = threading.Lock()
+        self._em_andamento = None  # threading.Event da carga em curso (ou None)
+        self._atualizador = None
+
+    def obter(self):
+        snap = self._snapshot
+        if snap is None:
+            # Primeira carga: não há o que servir, todos esperam a MESMA extração
+            self._atualizar_unico()
+            snap = self._snapshot
+        elif snap.idade() >= self.ttl:
+            # Vencido: serve o anterior e atualiza em segundo plano
+            self._disparar_atualizacao()
+
+        self._iniciar_atualizador()
+        return snap
+
+    def atual(self):
+        """Snapshot já carregado, sem esperar; se ainda não há, dispara a primeira carga em segundo plano."""
+        snap = self._snapshot
+        if snap is None or snap.idade() >= self.ttl:
+            self._disparar_atualizacao()
+        if snap is not None:
+            self._iniciar_atualizador()
+        return snap
+
+    def _atualizar_unico(self):
+        with self._trava:
+            evento = self._em_andamento
+            lider = evento is None
+            if lider:
+                evento = self._em_andamento = threading.Event()
+
+        if not lider:
+            evento.wait()
+            return
+
+        novo = None
+        try:
+            anterior, self._snapshot = self._snapshot, self._extrair()
+            novo = self._snapshot
+            self.ultimo_erro = None
+            if anterior is not None and anterior.armazem_textos is not None:
+                anterior.armazem_textos.remover()
+        except Exception as e:
+            # Mantém o snapshot anterior (se houver) e registra o erro
+            log.exception("Falha ao carregar '%s'", self.nome)
+            self.ultimo_erro = e
+        finally:
+            with self._trava:
+                self._em_andamento = None
+            evento.set()
+
+        if novo is not None:
+            for funcao in list(_ao_publicar):
+                try:
+                    funcao(novo)
+                except Exception:
+                    log.exception("Falha ao avisar do snapshot novo de '%s'", self.nome)
+
+    def _disparar_atualizacao(self):
+        if self._em_andamento is None:
+            threading.Thread(target=self._atualizar_unico, name=f"carga-{self.nome}", daemon=True).start()
+
+    def _extrair(self):
+        if compartilhado.ativo():
+            # Vários processos: um só extrai e publica em memória compartilhada, os demais anexam
+            df, versao, carregado_em, armazem = compartilhado.obter_ou_publicar(
+                self.nome, self.ttl - self.antecedencia, self._extrair_local)
+            return Snapshot(self.nome, df, versao, carregado_em, armazem)
+        return self._extrair_local()
+
+    def _extrair_local(self, diretorio_textos=None):
+        inicio = time.time()
+        versao = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        diretorio = diretorio_textos or os.path.join(textos.diretorio_processo(), f"{self.nome}_{versao}")
+        escritor, partes = None, []
+        # Em lotes: os textos longos de cada lote vão para o disco e saem da memória
+        with metricas.medir("dados.extracao") as m:
+            for parte in self._lotes():
+                cols_texto = [c for c in COLS_TEXTO if c in parte.columns]
+                if escritor is None:
+                    escritor = textos.EscritorTextos(diretorio, cols_texto)
+                escritor.adicionar(parte)
+                partes.append(parte.drop(columns=cols_texto))
+            df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+            m.linhas = len(df)
+        armazem = escritor.fechar() if escritor is not None else None
+
+        with metricas.medir("dados.normalizacao", linhas=len(df)):
+            df = normalizar(df)
+
+        agora = time.time()
+        log.info("'%s' carregado: %d linhas em %.1fs", self.nome, len(df), agora - inicio)
+        if armazem is not None:
+            log.info("'%s' textos: %.1f MB -> %.1f MB em disco", self.nome,
+                     escritor.bytes_texto / 1024**2, armazem.tamanho_disco() / 1024**2)
+        return Snapshot(self.nome, df, versao, agora, armazem)
+
+    def _lotes(self):
+        """DataFrames da extração, na ordem: faixas mensais em paralelo ou um cursor serial."""
+        if self.particionar and PARALELISMO > 1:
+            with conexao.conexao_pool() as conn:
+                consultas = consultas_particionadas(conn)
+            # map devolve na ordem das faixas; no máximo PARALELISMO consultas abertas ao mesmo tempo
+            with ThreadPoolExecutor(max_workers=PARALELISMO, thread_name_prefix=f"extracao-{self.nome}") as executor:
+                for parte in executor.map(lambda consulta: ler_faixa(*consulta), consultas):
+                    if len(parte):  # faixas vazias atrapalhariam a inferência de tipos no concat
+                        yield parte
+            return
+
+        conn = conexao.conexao()
+        try:
+            yield from pd.read_sql(self.sql, conn, chunksize=TAMANHO_LOTE)
+        finally:
+            conn.close()
+
+    def _iniciar_atualizador(self):
+        if self._atualizador is not None:
+            return
+        with self._trava:
+            if self._atualizador is None:
+                self._atualizador = threading.Thread(target=self._laco_atualizacao, name=f"atualizador-{self.nome}", daemon=True)
+                self._atualizador.start()
+
+    def _laco_atualizacao(self):
+        while True:
+            snap = self._snapshot
+            if snap is not None:
+                espera = self.ttl - self.antecedencia - snap.idade()
+                if espera > 0:
+                    time.sleep(espera)
+                    continue
+            self._atualizar_unico()
+            if self._snapshot is snap:
+                # A carga falhou: evita martelar o banco
+                time.sleep(self.antecedencia)
+
+
+_carregadores = {}
+_trava_registro = threading.Lock()
+_ao_publicar = []   # funções avisadas a cada snapshot novo (ver dependencias.py)
+
+
+def ao_publicar(funcao):
+    """Registra `funcao(snap)`, chamada na thread da carga a cada snapshot novo de qualquer conjunto."""
+    if funcao not in _ao_publicar:
+        _ao_publicar.append(funcao)
+
+
+def obter_carregador(nome):
+    """Um carregador por conjunto de dados, compartilhado por todas as sessões do processo."""
+    with _trava_registro:
+        if nome not in _carregadores:
+            limite = CONJUNTOS[nome]
+            _carregadores[nome] = CarregadorSnapshot(nome, montar_consulta(limite), particionar=limite is None)
+        return _carregadores[nome]
+
+
+def descartar_carregadores():
+    """Esquece todos os snapshots do processo (ex.: benchmark trocando de base)."""
+    with _trava_registro:
+        _carregadores.clear()
+    with _trava_agregados:
+        _agregados.clear()
+
+
+def obter_snapshot(nome="completo"):
+    """
+    Retorna o snapshot atual do conjunto (nunca espera por uma atualização,
+    exceto na primeira carga do processo). Em caso de erro retorna None.
+    """
+    carregador = obter_carregador(nome)
+    snap = carregador.obter()
+    if snap is None and carregador.ultimo_erro is not None:
+        st.error(f"Erro SQL: {carregador.ultimo_erro}")
+    return snap
+
+
+def snapshot_carregado(nome="completo"):
+    """Snapshot do conjunto se já estiver em memória (None enquanto a primeira carga roda em segundo plano)."""
+    return obter_carregador(nome).atual()
+
+
+# --- CONSULTAS AGREGADAS ---
+_agregados = OrderedDict()   # (sql, binds) -> (instante, DataFrame)
+_agregados_em_andamento = {}  # (sql, binds) -> threading.Event
+_trava_agregados = threading.Lock()
+
+
+def consultar_agregado(sql, binds=None):
+    """
+    Resultado (pequeno) de uma consulta agregada no banco, com cache de
+    TTL_AGREGADOS_SEGUNDOS compartilhado pelas sessões do processo.
+    Como no snapshot, consultas iguais simultâneas vão ao banco uma vez só.
+    Não modificar o DataFrame retornado.
+    """
+    binds = binds or {}
+    chave = (sql, tuple(sorted(binds.items())))
+    while True:
+        with _trava_agregados:
+            item = _agregados.get(chave)
+            if item is not None and time.time() - item[0] < TTL_AGREGADOS_SEGUNDOS:
+                _agregados.move_to_end(chave)
+                return item[1]
+            evento = _agregados_em_andamento.get(chave)
+            lider = evento is None
+            if lider:
+                evento = _agregados_em_andamento[chave] = threading.Event()
+        if lider:
+            break
+        evento.wait()  # se o líder falhar, a próxima volta tenta de novo
+
+    try:
+        with metricas.medir("dados.agregado_banco") as m:
+            with conexao.conexao_pool() as conn:
+                df = normalizar(pd.read_sql(sql, conn, params=binds))
+            m.linhas = len(df)
+        with _trava_agregados:
+            _agregados[chave] = (time.time(), df)
+            while len(_agregados) > AGREGADOS_EM_CACHE:
+                _agregados.popitem(last=False)
+        return df
+    finally:
+        with _trava_agregados:
+            _agregados_em_andamento.pop(chave, None)
+        evento.set()
+
+
+def carregar_dados(nome="completo"):
+    """
+    Atalho para as páginas: o DataFrame do snapshot atual (vazio se a carga falhou).
+    Sem os textos longos; para eles use Snapshot.com_textos / ler_textos.
+    """
+    snap = obter_snapshot(nome)
+    return snap.df if snap is not None else pd.DataFrame()
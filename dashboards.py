@@ -1,11 +1,78 @@
 import streamlit as st
 import plotly.express as px
 
-def renderizar_paineis_interativos(df_servico):
+import exportacao
+import graficos
+import metricas
+import resolucao
+from motor_consulta import Filtros, MotorPandas
+
+# --- AGREGAÇÕES (puras, sem Streamlit: usadas também pelo benchmark) ---
+def contar_demandantes(df_servico, limite=10):
+    return MotorPandas(df_servico).contar('DEMANDANTE', Filtros(), limite)
+
+def contar_status(df_servico, demandante=None):
+    return MotorPandas(df_servico).contar('STATUS', Filtros(demandante=demandante or None))
+
+# --- FIGURAS (construídas uma vez por conteúdo do agregado, ver graficos.py) ---
+def _fig_demandantes(df_dem):
+    fig = px.bar(df_dem, x='count', y='DEMANDANTE', orientation='h', text='count')
+    fig.update_layout(yaxis={'categoryorder':'total ascending'})
+    return fig
+
+def _fig_status_pizza(df_stat):
+    fig = px.pie(df_stat, values='count', names='STATUS', hole=0.6, color='STATUS')
+    fig.update_traces(textinfo='percent')
+    fig.update_layout(showlegend=False, margin=dict(t=0,b=0,l=0,r=0), height=320)
+    return fig
+
+def _fig_status_legenda(df_stat):
+    # Cria base fixa para barras iguais
+    df_stat = df_stat.assign(base=1)
+    # Altura dinâmica: min 100px ou cresce conforme itens
+    altura = max(len(df_stat) * 35, 100)
+
+    fig = px.bar(df_stat, x='base', y='STATUS', text='count', orientation='h', color='STATUS')
+
+    # Estilo visual de legenda
+    fig.update_traces(
+        textposition='inside', insidetextanchor='middle',
+        width=0.8, marker_line_width=0, textfont_size=12
+    )
+
+    # Layout para colar o texto na barra
+    fig.update_layout(
+        showlegend=False,
+        xaxis=dict(visible=False, fixedrange=True, range=[0, 2.5]), # Range alto encurta a barra
+        yaxis=dict(
+            title=None, fixedrange=True, side='right', # Texto na direita
+            automargin=True, anchor="free", position=0.45 # Cola o texto na barra
+        ),
+        margin=dict(t=10, b=0, l=0, r=0),
+        height=altura,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        bargap=0.1
+    )
+    return fig
+
+def _fig_resolucao(df_status):
+    df_plot = df_status.melt(id_vars=['STATUS', 'tickets'], var_name='percentil', value_name='horas')
+    df_plot['percentil'] = df_plot['percentil'].str.removesuffix('_h')
+    fig = px.bar(df_plot, x='horas', y='STATUS', color='percentil', barmode='group',
+                 orientation='h', hover_data=['tickets'])
+    fig.update_layout(height=max(len(df_status) * 60, 200), margin=dict(t=10, b=0, l=0, r=0))
+    return fig
+
+def renderizar_paineis_interativos(df_servico=None, motor=None, filtros=None):
     """
     Exibe os gráficos de Demandante (Esq) e Status com Legenda (Dir).
+    Aceita o DataFrame já filtrado ou um motor de consulta + filtros (ver motor_consulta.py).
     Retorna: (demandante_clicado, status_clicado)
     """
+    if motor is None:
+        motor, filtros = MotorPandas(df_servico), Filtros()
+
     st.divider()
     st.markdown(f"### 🎯 Visão Interativa")
     st.caption("Clique nas barras para filtrar a tabela no final.")
@@ -19,28 +86,25 @@ def renderizar_paineis_interativos(df_servico):
     with col1:
         st.subheader("1. Quem solicita?")
         # Conta e limpa nomes
-        df_dem = df_servico['DEMANDANTE'].value_counts().head(10).reset_index()
-        df_dem.columns = ['DEMANDANTE', 'count']
+        with metricas.medir(f"dashboards.agregado_demandantes.{motor.nome}") as m:
+            df_dem = motor.contar('DEMANDANTE', filtros, limite=10)
+            m.linhas = int(df_dem['count'].sum())
 
         if not df_dem.empty:
-            fig = px.bar(df_dem, x='count', y='DEMANDANTE', orientation='h', text='count')
-            fig.update_layout(yaxis={'categoryorder':'total ascending'})
-
             # Captura clique
-            evt = st.plotly_chart(fig, use_container_width=True, on_select="rerun", selection_mode="points", key="v_dem")
+            evt = graficos.exibir("demandantes", _fig_demandantes, df_dem, on_select="rerun", selection_mode="points", key="v_dem")
             if len(evt['selection']['points']) > 0:
                 demandante_clicado = evt['selection']['points'][0]['y']
         else:
             st.info("Sem dados de demandantes.")
 
-    # Filtra dados para o gráfico da direita (Cascade Filter)
-    df_filtered = df_servico[df_servico['DEMANDANTE'] == demandante_clicado] if demandante_clicado else df_servico
-
     # --- LADO DIREITO: PIZZA + LEGENDA LATERAL ---
     with col2:
         st.subheader("2. Situação")
-        df_stat = df_filtered['STATUS'].value_counts().reset_index()
-        df_stat.columns = ['STATUS', 'count']
+        # Filtra pelo demandante clicado (Cascade Filter) e conta os status
+        with metricas.medir(f"dashboards.agregado_status.{motor.nome}") as m:
+            df_stat = motor.contar('STATUS', filtros.com(demandante=demandante_clicado))
+            m.linhas = int(df_stat['count'].sum())
 
         if not df_stat.empty:
             # Layout: Pizza (70%) | Legenda (30%)
@@ -48,44 +112,13 @@ def renderizar_paineis_interativos(df_servico):
 
             # A) PIZZA (Visual)
             with c_pizza:
-                fig_pie = px.pie(df_stat, values='count', names='STATUS', hole=0.6, color='STATUS')
-                fig_pie.update_traces(textinfo='percent')
-                fig_pie.update_layout(showlegend=False, margin=dict(t=0,b=0,l=0,r=0), height=320)
-                st.plotly_chart(fig_pie, use_container_width=True)
+                graficos.exibir("status_pizza", _fig_status_pizza, df_stat)
 
             # B) LEGENDA DINÂMICA (Botões)
             with c_legenda:
-                # Cria base fixa para barras iguais
-                df_stat['base'] = 1
-                # Altura dinâmica: min 100px ou cresce conforme itens
-                altura = max(len(df_stat) * 35, 100)
-
-                fig_leg = px.bar(df_stat, x='base', y='STATUS', text='count', orientation='h', color='STATUS')
-
-                # Estilo visual de legenda
-                fig_leg.update_traces(
-                    textposition='inside', insidetextanchor='middle',
-                    width=0.8, marker_line_width=0, textfont_size=12
-                )
-
-                # Layout para colar o texto na barra
-                fig_leg.update_layout(
-                    showlegend=False,
-                    xaxis=dict(visible=False, fixedrange=True, range=[0, 2.5]), # Range alto encurta a barra
-                    yaxis=dict(
-                        title=None, fixedrange=True, side='right', # Texto na direita
-                        automargin=True, anchor="free", position=0.45 # Cola o texto na barra
-                    ),
-                    margin=dict(t=10, b=0, l=0, r=0),
-                    height=altura,
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    bargap=0.1
-                )
-
                 # Captura clique na legenda
-                evt_leg = st.plotly_chart(
-                    fig_leg, use_container_width=True, on_select="rerun",
+                evt_leg = graficos.exibir(
+                    "status_legenda", _fig_status_legenda, df_stat, on_select="rerun",
                     selection_mode="points", config={'displayModeBar':False}, key="v_stat"
                 )
 
@@ -105,4 +138,53 @@ def renderizar_paineis_interativos(df_servico):
         if cols_info[1].button("❌ Limpar"):
             st.rerun()
 
-    return demandante_clicado, status_clicado
\ No newline at end of file
+    return demandante_clicado, status_clicado
+
+
+# --- TEMPO DE RESOLUÇÃO (percentis dos sketches, ver resolucao.py) ---
+def formatar_horas(horas):
+    if horas != horas:  # NaN: sem tickets fechados
+        return "—"
+    if horas < 1:
+        return f"{horas * 60:.0f} min"
+    if horas < 48:
+        return f"{horas:.1f} h"
+    return f"{horas / 24:.1f} dias"
+
+def renderizar_tempo_resolucao(filtros):
+    """Percentis p50/p90/p99 do tempo de resolução para os filtros, e por status."""
+    st.divider()
+    st.markdown("### ⏱️ Tempo de Resolução")
+    st.caption("Tickets fechados, da abertura ao fim. O período conta por mês de abertura inteiro; "
+               "o filtro de demandante não se aplica aqui.")
+
+    valores, fechados = resolucao.percentis(filtros)
+    if fechados == 0:
+        st.info("Nenhum ticket fechado com estes filtros.")
+        return
+
+    cols = st.columns(4)
+    cols[0].metric("Fechados", f"{fechados:,}".replace(",", "."))
+    for col, q in zip(cols[1:], resolucao.QUANTIS):
+        col.metric(f"p{int(q * 100)}", formatar_horas(valores[q]))
+
+    df_status = resolucao.percentis(filtros, por='STATUS')
+    if len(df_status) > 1:
+        graficos.exibir("resolucao", _fig_resolucao, df_status)
+
+
+# --- EXPORTAÇÃO (ver exportacao.py) ---
+def renderizar_exportacao(blocos, total, nome_arquivo, tipos=None):
+    """
+    Download do filtro atual. `blocos` é uma função sem argumentos que devolve o
+    gerador de DataFrames (ex.: exportacao.blocos_snapshot); o arquivo só é
+    gerado quando o botão é clicado, fora da execução da página. `tipos`: ver
+    exportacao.tipos_snapshot.
+    """
+    c_fmt, c_btn = st.columns([0.3, 0.7], vertical_alignment="bottom")
+    formato = c_fmt.selectbox("Exportar como:", exportacao.formatos_disponiveis(), key="exportacao_formato")
+    extensao, mime, _ = exportacao.FORMATOS[formato]
+    c_btn.download_button(
+        f"⬇️ Exportar {total} chamados", data=lambda: exportacao.gerar(blocos(), formato, tipos),
+        file_name=f"{nome_arquivo}.{extensao}", mime=mime, on_click="ignore", disabled=total == 0
+    )
@@ -0,0 +1,277 @@
+"""
+Grafo de dependências dos artefatos derivados (guardados em artefatos.py).
+
+Cada artefato registrado declara de onde vem: o conjunto de dados e os serviços
+(NOMESERVICO) do snapshot que ele lê, mais os outros artefatos de que depende
+(ex.: grupos de duplicados <- análise IA do serviço). A chave do artefato não
+leva a versão do snapshot, então ele sobrevive às atualizações que não o tocam.
+
+A cada snapshot novo (aviso de dados.ao_publicar) cada serviço ganha uma
+impressão digital do conteúdo das suas linhas. Só os serviços cuja impressão
+mudou invalidam algo: os artefatos que os leem e, em cascata, os que dependem
+desses. Os invalidados usados há pouco (RECONSTRUIR_SE_USADO_HA_HORAS) são
+reconstruídos em segundo plano, na ordem do grafo (graphlib), com o snapshot
+novo, e publicados todos juntos no fim; enquanto isso as páginas continuam
+vendo os valores anteriores. Os demais são descartados e recalculados quando
+alguém pedir. Cada artefato guarda as impressões de onde foi construído: um
+que termina de ser construído depois de um snapshot novo (o aviso chegou no
+meio da construção) é comparado com o snapshot atual e refeito se ficou velho.
+
+O aviso de snapshot novo é registrado pelo app (main.py), não na importação:
+    dados.ao_publicar(dependencias.snapshot_publicado)
+"""
+import graphlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import artefatos
+import metricas
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ INVALIDAÇÃO SELETIVA DOS ARTEFATOS
+# ========================================================
+COLUNA_FONTE = 'NOMESERVICO'          # granularidade da invalidação
+RECONSTRUIR_SE_USADO_HA_HORAS = 24    # invalidados mais antigos que isso só são descartados
+# ========================================================
+
+
+@dataclass
+class No:
+    chave: str
+    construtor: Callable          # construtor(snap) -> valor (None = nada a guardar)
+    conjunto: str                 # nome do conjunto de dados (ver dados.CONJUNTOS)
+    fontes: frozenset | None      # serviços lidos; None = o snapshot inteiro
+    depende_de: tuple             # chaves dos artefatos de que este depende
+    descricao: str = ""
+    reconstruindo: bool = False
+    impressao: dict | None = None  # {serviço: impressão} das fontes no snapshot do valor guardado
+
+
+_nos = {}           # chave -> No
+_impressoes = {}    # conjunto -> {serviço: impressão} do último snapshot visto
+_snapshots = {}     # conjunto -> último snapshot visto (para refazer um artefato que ficou velho)
+_trava = threading.RLock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reconstrucao")
+_local = threading.local()   # na thread da reconstrução: os valores refeitos, ainda não publicados
+
+
+def impressoes(snap):
+    """
+    Impressão digital do conteúdo de cada serviço: soma dos hashes das linhas
+    (colunas do DataFrame; texto editado muda DTULTIMAMODIFICACAO). Não depende
+    da ordem das linhas. Calculada uma vez por snapshot.
+    """
+    def calcular(df):
+        if df.empty or COLUNA_FONTE not in df.columns:
+            return {}
+        with metricas.medir("dependencias.impressoes", linhas=len(df)):
+            hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            soma = pd.Series(hashes, dtype=np.uint64).groupby(df[COLUNA_FONTE].to_numpy()).sum()
+            return dict(zip(soma.index, soma.to_numpy().tolist()))
+    return snap.derivado("impressoes_dependencias", calcular)
+
+
+def _recorte(impressoes_snap, fontes):
+    """Impressões só das fontes do artefato (todas, se `fontes` é None)."""
+    if fontes is None:
+        return dict(impressoes_snap)
+    return {s: impressoes_snap.get(s) for s in fontes}
+
+
+def obter_ou_calcular(ch, construtor, snap, fontes=None, depende_de=(), descricao=""):
+    """
+    Como artefatos.obter_ou_calcular, registrando o artefato no grafo: `fontes`
+    são os serviços que ele lê do `snap` (None = todos) e `depende_de`, as chaves
+    dos artefatos usados pelo construtor. `construtor(snap)` também é usado nas
+    reconstruções, com o snapshot novo.
+    """
+    fontes = None if fontes is None else frozenset(fontes)
+    impressoes_snap = impressoes(snap)
+    no = No(ch, construtor, snap.nome, fontes, tuple(depende_de), descricao)
+    with _trava:
+        anterior = _nos.get(ch)
+        if anterior is not None:
+            # O valor guardado continua sendo o do último construtor que rodou
+            no.reconstruindo, no.impressao = anterior.reconstruindo, anterior.impressao
+        _nos[ch] = no
+        # Referência para comparar com o próximo snapshot do conjunto
+        _impressoes.setdefault(snap.nome, impressoes_snap)
+        _snapshots.setdefault(snap.nome, snap)
+
+    def construir():
+        valor = construtor(snap)
+        # Ainda com a trava da chave: uma reconstrução que espera por ela já vê de onde o valor veio.
+        # No nó atual (outra sessão pode tê-lo registrado de novo; a reconstrução pode tê-lo tirado)
+        with _trava:
+            _nos.setdefault(ch, no).impressao = _recorte(impressoes_snap, fontes)
+        return valor
+
+    valor = artefatos.obter_ou_calcular(ch, construir, descricao)
+    with _trava:
+        if valor is None:
+            _nos.pop(ch, None)
+            return None
+        atual = _nos.setdefault(ch, no)
+        if atual.impressao is None:
+            atual.impressao = _recorte(impressoes_snap, fontes)
+    _conferir(atual)
+    return valor
+
+
+def _conferir(no):
+    """Agenda a reconstrução se o valor guardado veio de um snapshot já substituído."""
+    with _trava:
+        atuais, snap = _impressoes.get(no.conjunto), _snapshots.get(no.conjunto)
+        if atuais is None or snap is None or no.impressao is None:
+            return
+        atual = _recorte(atuais, no.fontes)
+        mudaram = {s for s in atual.keys() | no.impressao.keys() if atual.get(s) != no.impressao.get(s)}
+        if not mudaram:
+            return
+        invalidados = _cascata({no.chave})
+        for ch in invalidados:
+            _nos[ch].reconstruindo = True
+    log.info("'%s' foi construído com um snapshot anterior; refazendo", no.descricao or no.chave)
+    _executor.submit(_reconstruir, invalidados, snap)
+
+
+def obter(ch):
+    """
+    O artefato da chave (ver artefatos.obter). Para os construtores que leem
+    outro artefato: dentro de uma reconstrução, devolve o valor já refeito
+    (ainda não publicado) em vez do anterior.
+    """
+    preparados = getattr(_local, "preparados", None)
+    if preparados and ch in preparados:
+        return preparados[ch][0]
+    return artefatos.obter(ch)
+
+
+def reconstruindo(ch):
+    """True enquanto o artefato espera ou passa pela reconstrução em segundo plano."""
+    no = _nos.get(ch)
+    return no is not None and no.reconstruindo
+
+
+def afetados(conjunto, servicos):
+    """Chaves invalidadas pela mudança nos `servicos` do conjunto: diretas e, em cascata, as dependentes."""
+    with _trava:
+        diretos = {ch for ch, no in _nos.items()
+                   if no.conjunto == conjunto and (no.fontes is None or no.fontes & servicos)}
+    return _cascata(diretos)
+
+
+def _cascata(chaves):
+    """As `chaves` e, recursivamente, os artefatos que dependem delas."""
+    with _trava:
+        dependentes = {}
+        for ch, no in _nos.items():
+            for pai in no.depende_de:
+                dependentes.setdefault(pai, set()).add(ch)
+    resultado, pendentes = set(), list(chaves)
+    while pendentes:
+        ch = pendentes.pop()
+        if ch not in resultado:
+            resultado.add(ch)
+            pendentes.extend(dependentes.get(ch, ()))
+    return resultado
+
+
+def snapshot_publicado(snap):
+    """Compara as impressões do snapshot novo com as do anterior e agenda a reconstrução do que mudou."""
+    with _trava:
+        if not any(no.conjunto == snap.nome for no in _nos.values()):
+            # Ninguém depende deste conjunto: a referência é tirada no primeiro registro
+            _impressoes.pop(snap.nome, None)
+            return set()
+    novas = impressoes(snap)
+    with _trava:
+        antigas = _impressoes.get(snap.nome)
+        _impressoes[snap.nome] = novas
+        _snapshots[snap.nome] = snap
+        if antigas is None:
+            return set()
+        mudaram = {s for s in novas.keys() | antigas.keys() if novas.get(s) != antigas.get(s)}
+        invalidados = afetados(snap.nome, mudaram) if mudaram else set()
+        for ch in invalidados:
+            _nos[ch].reconstruindo = True
+    metricas.contar("dependencias.servicos_alterados", len(mudaram))
+    if invalidados:
+        log.info("'%s': %d serviço(s) alterado(s), %d artefato(s) invalidado(s)",
+                 snap.nome, len(mudaram), len(invalidados))
+        _executor.submit(_reconstruir, invalidados, snap)
+    return invalidados
+
+
+def _reconstruir(invalidados, snap):
+    """
+    Reconstrói (pais antes dos filhos) os usados há pouco e publica todos numa
+    troca só (um filho nunca fica ao lado de um pai de outra versão); descarta
+    os outros e os que dependem deles. Os já construídos com este snapshot
+    ficam como estão.
+    """
+    with _trava:
+        grafo = {ch: [pai for pai in _nos[ch].depende_de if pai in invalidados] for ch in invalidados if ch in _nos}
+    impressoes_snap = impressoes(snap)
+    limite = time.time() - RECONSTRUIR_SE_USADO_HA_HORAS * 3600
+    nos, atualizados = {}, set()
+    preparados = _local.preparados = {}
+    try:
+        for ch in graphlib.TopologicalSorter(grafo).static_order():
+            no = _nos.get(ch)
+            if no is None:
+                continue
+            nos[ch] = no
+            # Ainda não guardado não quer dizer sem uso: pode estar sendo construído (com o snapshot anterior)
+            artefatos.aguardar_calculo(ch)
+            usado = artefatos.ultimo_acesso(ch)
+            pais = grafo.get(ch, ())
+            if (usado is not None and no.impressao == _recorte(impressoes_snap, no.fontes)
+                    and all(pai in atualizados for pai in pais)):
+                atualizados.add(ch)
+                continue
+            if usado is not None and usado >= limite and all(pai in preparados or pai in atualizados for pai in pais):
+                try:
+                    with metricas.medir("dependencias.reconstrucao"):
+                        valor = no.construtor(snap)
+                    if valor is not None:
+                        preparados[ch] = (valor, no.descricao)
+                except Exception:
+                    log.exception("Falha ao reconstruir '%s'", no.descricao or ch)
+        artefatos.guardar_varios(preparados)
+        with _trava:
+            for ch in preparados:
+                nos[ch].impressao = _recorte(impressoes_snap, nos[ch].fontes)
+        metricas.contar("dependencias.reconstruido", len(preparados))
+        for ch in nos.keys() - preparados.keys() - atualizados:
+            artefatos.descartar(ch)
+            metricas.contar("dependencias.descartado")
+            with _trava:
+                _nos.pop(ch, None)
+    finally:
+        _local.preparados = None
+        for no in nos.values():
+            no.reconstruindo = False
+
+
+def grafo():
+    """Um DataFrame por artefato registrado: de onde vem e se está sendo reconstruído (página de admin)."""
+    with _trava:
+        linhas = [{
+            "descricao": no.descricao,
+            "conjunto": no.conjunto,
+            "fontes": "(todas)" if no.fontes is None else ", ".join(sorted(map(str, no.fontes))),
+            "depende_de": len(no.depende_de),
+            "reconstruindo": no.reconstruindo,
+            "chave": ch,
+        } for ch, no in _nos.items()]
+    return pd.DataFrame(linhas, columns=["descricao", "conjunto", "fontes", "depende_de", "reconstruindo", "chave"])
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+import aquecimento
+import metricas
+
+# ========================================================
+# ⚙️ DETECÇÃO DE DUPLICADOS (grupos de tickets quase iguais)
+# ========================================================
+LIMIAR_SIMILARIDADE = 0.90
+CELULAS_POR_BLOCO = 2 ** 24   # pedaço da matriz de similaridade calculado por vez (~64 MB em float32)
+# ========================================================
+
+
+def grafo_similaridade(embeddings, limiar=LIMIAR_SIMILARIDADE):
+    """
+    Grafo esparso (CSR, simétrico) com uma aresta entre cada par de tickets acima
+    do limiar de cosseno. A matriz n x n nunca existe inteira: é calculada em
+    blocos de linhas e só os pares acima do limiar são guardados.
+    """
+    sparse = aquecimento.importar("scipy.sparse")
+    vetores = np.asarray(embeddings, dtype=np.float32)
+    vetores = vetores / np.maximum(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12)
+    n = len(vetores)
+    bloco = max(1, CELULAS_POR_BLOCO // max(n, 1))
+
+    linhas, colunas, pesos = [], [], []
+    for inicio in range(0, n, bloco):
+        # Só o triângulo superior (j > i): cada par entra uma vez e o ticket não se compara consigo
+        sim = vetores[inicio:inicio + bloco] @ vetores[inicio:].T
+        i, j = np.nonzero(np.triu(sim > limiar, k=1))
+        linhas.append(i + inicio)
+        colunas.append(j + inicio)
+        pesos.append(sim[i, j])
+
+    i, j, p = (np.concatenate(x) if x else np.empty(0, dtype=np.int64) for x in (linhas, colunas, pesos))
+    grafo = sparse.coo_matrix((np.concatenate([p, p]), (np.concatenate([i, j]), np.concatenate([j, i]))), shape=(n, n))
+    return grafo.tocsr()
+
+
+def agrupar(embeddings, limiar=LIMIAR_SIMILARIDADE):
+    """
+    Grupos de duplicados: componentes conexos do grafo de similaridade (A~B e
+    B~C põem A, B e C no mesmo grupo). Um DataFrame por grupo com 2+ tickets,
+    do maior para o menor, com as posições dos membros e o representante (o
+    membro mais parecido com os demais: maior soma de similaridades no grupo).
+    """
+    csgraph = aquecimento.importar("scipy.sparse.csgraph")
+    with metricas.medir("duplicados.agrupar", linhas=len(embeddings)):
+        grafo = grafo_similaridade(embeddings, limiar)
+        _, rotulos = csgraph.connected_components(grafo, directed=False)
+        tamanhos = np.bincount(rotulos)
+        forca = np.asarray(grafo.sum(axis=1)).ravel()
+        pares = np.bincount(rotulos[grafo.nonzero()[0]], minlength=len(tamanhos)) // 2
+        similaridade = np.bincount(rotulos, weights=forca, minlength=len(tamanhos)) / np.maximum(2 * pares, 1)
+
+        # Membros de cada grupo: posições ordenadas pelo rótulo e fatiadas pelos tamanhos
+        ordem = np.argsort(rotulos, kind="stable")
+        fim = np.cumsum(tamanhos)
+        grupos = []
+        for rotulo in np.flatnonzero(tamanhos > 1):
+            membros = ordem[fim[rotulo] - tamanhos[rotulo]:fim[rotulo]]
+            grupos.append({
+                "tamanho": int(tamanhos[rotulo]),
+                "representante": int(membros[forca[membros].argmax()]),
+                "membros": membros.tolist(),
+                "pares": int(pares[rotulo]),
+                "similaridade_media": float(similaridade[rotulo]),
+            })
+
+    df = pd.DataFrame(grupos, columns=["tamanho", "representante", "membros", "pares", "similaridade_media"])
+    return df.sort_values(["tamanho", "similaridade_media"], ascending=False, ignore_index=True)
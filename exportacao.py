@@ -0,0 +1,184 @@
+"""
+Exportação do resultado do filtro atual (CSV, Parquet ou XLSX) em blocos.
+
+As linhas saem do snapshot, ou do banco no modo agregado, em blocos de
+LINHAS_POR_BLOCO: cada bloco é lido (textos longos inclusive, do armazém em
+disco), gravado no arquivo e descartado. Assim o processo nunca monta uma cópia
+do conjunto filtrado inteiro, só o arquivo final.
+"""
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import conexao
+import dados
+import metricas
+
+# ========================================================
+# ⚙️ EXPORTAÇÃO
+# ========================================================
+LINHAS_POR_BLOCO = 20000
+LINHAS_POR_ABA_XLSX = 1_048_575   # limite do Excel (sem o cabeçalho); o resto vai para outra aba
+SEPARADOR_CSV = ";"               # o Excel em português abre direto
+# Formato -> (extensão, MIME, biblioteca necessária)
+FORMATOS = {
+    "CSV": ("csv", "text/csv", None),
+    "Parquet": ("parquet", "application/vnd.apache.parquet", "pyarrow"),
+    "Excel (XLSX)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "openpyxl"),
+}
+# ========================================================
+
+
+def formatos_disponiveis():
+    """Formatos cuja biblioteca está instalada (CSV sempre)."""
+    return [f for f, (_, _, modulo) in FORMATOS.items() if modulo is None or importlib.util.find_spec(modulo)]
+
+
+# --- ORIGENS (geradores de DataFrames) ---
+def blocos_snapshot(snap, posicoes, colunas=None, tamanho=LINHAS_POR_BLOCO):
+    """
+    Linhas `posicoes` do snapshot, na ordem recebida (a da tabela), bloco a
+    bloco, com as colunas de texto lidas do armazém.
+    """
+    colunas = colunas or snap.colunas
+    posicoes = np.asarray(posicoes)
+    for i in range(0, len(posicoes), tamanho):
+        pos = posicoes[i:i + tamanho]
+        yield pd.DataFrame({col: snap.ler_textos(col, pos) for col in colunas})
+
+
+def blocos_banco(motor, filtros, colunas=None, tamanho=LINHAS_POR_BLOCO):
+    """Linhas do filtro lidas do banco com um cursor, bloco a bloco (modo agregado, ver MotorBanco)."""
+    sql, binds = motor.consulta_linhas(filtros, colunas)
+    conn = conexao.conexao()
+    try:
+        for parte in pd.read_sql(sql, conn, params=binds, chunksize=tamanho):
+            yield dados.normalizar(parte)
+    finally:
+        conn.close()
+
+
+def tipos_snapshot(snap, colunas=None):
+    """
+    Tipo (dtype) de cada coluna exportada do snapshot; as do armazém são texto
+    (None). Com ele o esquema do Parquet é fixado antes do primeiro bloco.
+    """
+    colunas = colunas or snap.colunas
+    return {col: snap.df[col].dtype if col in snap.df.columns else None for col in colunas}
+
+
+# --- GRAVAÇÃO ---
+def _gravar_csv(blocos, caminho):
+    linhas = 0
+    # utf-8-sig: o BOM faz o Excel reconhecer os acentos
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+        for bloco in blocos:
+            bloco.to_csv(f, sep=SEPARADOR_CSV, index=False, header=linhas == 0)
+            linhas += len(bloco)
+    return linhas
+
+
+def _tipo_arrow(pa, dtype, alargar):
+    """
+    Tipo Arrow de uma coluna a partir do dtype pandas (None = texto). Com
+    `alargar` (sem os tipos do snapshot, só o 1º bloco do banco), inteiros viram
+    float: num bloco seguinte com NULL, o pandas entrega a mesma coluna em float.
+    """
+    if dtype is None:
+        return pa.string()
+    if isinstance(dtype, pd.ArrowDtype):
+        return pa.string() if pa.types.is_null(dtype.pyarrow_dtype) else dtype.pyarrow_dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pa.timestamp("ns")
+    if pd.api.types.is_bool_dtype(dtype):
+        return pa.bool_()
+    if pd.api.types.is_integer_dtype(dtype):
+        return pa.float64() if alargar else pa.int64()
+    if pd.api.types.is_float_dtype(dtype):
+        return pa.float64()
+    return pa.string()   # objeto/categoria: texto (uma coluna toda nula também)
+
+
+def _tabela_arrow(pa, bloco, esquema):
+    """Bloco convertido para o esquema fixo (valores de colunas de texto viram str)."""
+    bloco = bloco.copy(deep=False)
+    for campo in esquema:
+        coluna = bloco[campo.name]
+        if pa.types.is_string(campo.type) and not isinstance(coluna.dtype, pd.ArrowDtype):
+            preenchidos = coluna.notna()
+            bloco[campo.name] = coluna.astype(object).where(~preenchidos, coluna[preenchidos].astype(str))
+    return pa.Table.from_pandas(bloco[esquema.names], schema=esquema, preserve_index=False, safe=False)
+
+
+def _gravar_parquet(blocos, caminho, tipos=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    linhas, escritor, esquema = 0, None, None
+    try:
+        for bloco in blocos:
+            if escritor is None:
+                # Esquema fixo para o arquivo todo: os tipos do snapshot ou os do 1º bloco, alargados
+                esquema = pa.schema([
+                    pa.field(col, _tipo_arrow(pa, tipos.get(col) if tipos else bloco[col].dtype, alargar=not tipos))
+                    for col in bloco.columns
+                ])
+                escritor = pq.ParquetWriter(caminho, esquema, compression="zstd")
+            escritor.write_table(_tabela_arrow(pa, bloco, esquema))
+            linhas += len(bloco)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return linhas
+
+
+def _gravar_xlsx(blocos, caminho):
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    # write_only: as linhas vão direto para o arquivo, sem montar a planilha em memória
+    livro = Workbook(write_only=True)
+    linhas, aba, linhas_aba = 0, None, 0
+    # Caracteres de controle nos textos dos tickets invalidam o XML da planilha
+    limpar = lambda v: ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v
+    for bloco in blocos:
+        bloco = bloco.assign(**{c: bloco[c].map(limpar) for c in bloco.select_dtypes(include="object").columns})
+        for linha in bloco.astype(object).where(bloco.notna(), None).itertuples(index=False, name=None):
+            if aba is None or linhas_aba == LINHAS_POR_ABA_XLSX:
+                aba = livro.create_sheet("Chamados" if aba is None else f"Chamados ({len(livro.worksheets) + 1})")
+                aba.append(list(bloco.columns))
+                linhas_aba = 0
+            aba.append(linha)
+            linhas_aba += 1
+        linhas += len(bloco)
+    if aba is None:
+        livro.create_sheet("Chamados")
+    livro.save(caminho)
+    return linhas
+
+
+_GRAVADORES = {"CSV": _gravar_csv, "Parquet": _gravar_parquet, "Excel (XLSX)": _gravar_xlsx}
+
+
+def gerar(blocos, formato, tipos=None):
+    """
+    Grava os blocos no formato pedido num arquivo temporário e devolve o
+    conteúdo do arquivo (bytes); o temporário é apagado em seguida. `tipos`
+    (ex.: tipos_snapshot) fixa o esquema do Parquet.
+    """
+    extensao = FORMATOS[formato][0]
+    descritor, caminho = tempfile.mkstemp(prefix="citsm_exportacao_", suffix=f".{extensao}")
+    os.close(descritor)
+    try:
+        with metricas.medir(f"exportacao.{extensao}") as m:
+            if formato == "Parquet":
+                m.linhas = _gravar_parquet(blocos, caminho, tipos)
+            else:
+                m.linhas = _GRAVADORES[formato](blocos, caminho)
+        with open(caminho, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(caminho)
@@ -0,0 +1,119 @@
+"""
+Figuras Plotly das páginas: cache por conteúdo e payload enxuto.
+
+Cada figura é construída uma vez por conteúdo do agregado que ela mostra (hash
+dos dados + parâmetros) e reaproveitada pelos reruns e pelas sessões do
+processo. Figura igual gera exatamente o mesmo JSON, e o Streamlit não reenvia
+ao navegador mensagens que ele já tem (cache de mensagens por hash).
+
+Antes de entrar no cache a figura é enxugada: datas viram milissegundos num
+array binário em vez de um texto ISO por ponto, e rótulos que repetem os
+valores saem do JSON (o navegador formata pelo texttemplate). Séries longas são
+reduzidas no servidor e desenhadas em WebGL.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.io
+import streamlit as st
+
+import compartilhado
+import metricas
+
+# ========================================================
+# ⚙️ FIGURAS
+# ========================================================
+FIGURAS_EM_CACHE = 256        # por processo (LRU)
+MAXIMO_PONTOS_SERIE = 1500    # acima disso a série temporal é reduzida no servidor
+PONTOS_WEBGL = 1000           # a partir daqui, linhas em WebGL (scattergl)
+# ========================================================
+
+_figuras = OrderedDict()   # chave -> (figura, bytes do JSON)
+_trava = threading.Lock()
+
+
+def _hash_dados(dados):
+    """Hash do conteúdo (valores, índice, nomes e tipos das colunas)."""
+    if isinstance(dados, pd.Series):
+        dados = dados.to_frame()
+    if isinstance(dados, pd.DataFrame):
+        valores = pd.util.hash_pandas_object(dados, index=True).to_numpy()
+        return f"{hashlib.sha1(valores.tobytes()).hexdigest()}:{list(dados.columns)}:{list(dados.dtypes)}"
+    return repr(dados)
+
+
+def reduzir_serie(df, maximo=MAXIMO_PONTOS_SERIE):
+    """
+    Série temporal (uma coluna por linha do gráfico) com no máximo ~`maximo`
+    pontos: em cada faixa ficam o mínimo e o máximo de cada coluna, então os
+    picos continuam aparecendo.
+    """
+    if len(df) <= maximo:
+        return df
+    faixas = max(1, maximo // (2 * max(df.shape[1], 1)))
+    valores = df.reset_index(drop=True)
+    grupos = valores.groupby(np.arange(len(df)) * faixas // len(df))
+    manter = np.concatenate([grupos.idxmin().to_numpy().ravel(), grupos.idxmax().to_numpy().ravel(), [0, len(df) - 1]])
+    manter = np.unique(manter[pd.notna(manter)].astype(np.int64))
+    return df.iloc[manter]
+
+
+def _milissegundos(valores):
+    return (np.asarray(valores, dtype="datetime64[ns]").astype(np.int64) // 1_000_000).astype(np.float64)
+
+
+def enxugar(fig):
+    """Remove do JSON o que é redundante por ponto (ver docstring do módulo). Altera e devolve `fig`."""
+    eixos_data = set()
+    for trace in fig.data:
+        for atributo in ("x", "base"):
+            valores = getattr(trace, atributo, None)
+            if isinstance(valores, np.ndarray) and valores.dtype.kind == "M":
+                trace[atributo] = _milissegundos(valores)
+                eixos_data.add(getattr(trace, "xaxis", None) or "x")
+        # Rótulo igual ao valor da barra: o navegador monta o texto
+        texto = getattr(trace, "text", None)
+        if texto is not None and getattr(trace, "texttemplate", False) is None:
+            for eixo in ("x", "y"):
+                valores = getattr(trace, eixo, None)
+                if valores is not None and len(valores) == len(texto) and np.array_equal(np.asarray(valores, dtype=object), np.asarray(texto, dtype=object)):
+                    trace.update(text=None, texttemplate=f"%{{{eixo}}}")
+                    break
+    # Números num eixo de data: o tipo precisa ser explícito
+    for eixo in eixos_data:
+        fig.layout[eixo.replace("x", "xaxis", 1)].type = "date"
+    return fig
+
+
+def figura(nome, construtor, dados, **parametros):
+    """
+    (figura, bytes do JSON) de `construtor(dados, **parametros)`, construída e
+    enxugada uma única vez por conteúdo. A figura é compartilhada: não alterar.
+    """
+    ch = compartilhado.chave_matriz("fig", nome, _hash_dados(dados), sorted(parametros.items()))
+    with _trava:
+        if ch in _figuras:
+            _figuras.move_to_end(ch)
+            metricas.contar("graficos.cache.acerto")
+            return _figuras[ch]
+    metricas.contar("graficos.cache.falta")
+
+    with metricas.medir(f"graficos.construir.{nome}", linhas=len(dados)) as m:
+        fig = enxugar(construtor(dados, **parametros))
+        m.bytes = len(plotly.io.to_json(fig, validate=False))
+    with _trava:
+        _figuras[ch] = (fig, m.bytes)
+        while len(_figuras) > FIGURAS_EM_CACHE:
+            _figuras.popitem(last=False)
+    return fig, m.bytes
+
+
+def exibir(nome, construtor, dados, parametros=None, **opcoes):
+    """st.plotly_chart da figura em cache (ver `figura`); `opcoes` vão para o st.plotly_chart."""
+    fig, tamanho = figura(nome, construtor, dados, **(parametros or {}))
+    with metricas.medir(f"graficos.enviar.{nome}") as m:
+        m.bytes = tamanho
+        return st.plotly_chart(fig, use_container_width=True, **opcoes)
@@ -0,0 +1,111 @@
+import atexit
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+import metricas
+
+# ========================================================
+# ⚙️ LIMPEZA DE TEXTO (Análise IA e Busca Semântica)
+# ========================================================
+# Processos para lotes grandes (0 ou 1 = limpa no próprio processo)
+PROCESSOS = int(os.environ.get("CITSM_PROCESSOS_LIMPEZA") or 0)
+LOTE_MINIMO_POOL = 20000      # abaixo disso o custo de enviar os textos não compensa
+TEXTOS_EM_CACHE = 200000      # textos limpos guardados por processo (os mais antigos saem primeiro)
+# ========================================================
+
+# Padrões compilados uma vez; pontuação e espaços ([^\w\s] + \s = \W) viram
+# um único espaço em uma passada só
+_RE_EMAIL = re.compile(r'\S+@\S+')
+_RE_LINK = re.compile(r'http\S+|www\S+')
+_RE_NUMEROS = re.compile(r'\d+')
+_RE_SEPARADOR = re.compile(r'\W+')
+_RE_ESPACOS = re.compile(r'\s+')
+
+_caches = {}  # perfil -> OrderedDict((ticket, hash do texto bruto) -> texto limpo)
+_trava = threading.Lock()
+_pool = None
+
+
+def limpar_texto(texto):
+    """Texto para tópicos: minúsculo, sem e-mails, links, números e pontuação."""
+    if not isinstance(texto, str): return ""
+    texto = texto.lower()
+    # Os padrões de e-mail e link são os mais caros: só rodam se puderem casar
+    if '@' in texto:
+        texto = _RE_EMAIL.sub('', texto)
+    if 'http' in texto or 'www' in texto:
+        texto = _RE_LINK.sub('', texto)
+    texto = _RE_NUMEROS.sub('', texto)
+    return _RE_SEPARADOR.sub(' ', texto).strip()
+
+
+def normalizar_espacos(texto):
+    """Texto para a busca semântica: o modelo vê as palavras originais, só sem quebras e espaços repetidos."""
+    if not isinstance(texto, str): return ""
+    return _RE_ESPACOS.sub(' ', texto).strip()
+
+
+PERFIS = {"topicos": limpar_texto, "busca": normalizar_espacos}
+
+
+def _limpar_lote(perfil, textos):
+    funcao = PERFIS[perfil]
+    return [funcao(t) for t in textos]
+
+
+def _obter_pool():
+    global _pool
+    with _trava:
+        if _pool is None:
+            # spawn: o servidor do Streamlit tem várias threads (fork não é seguro)
+            _pool = ProcessPoolExecutor(PROCESSOS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _limpar(perfil, textos):
+    if PROCESSOS < 2 or len(textos) < LOTE_MINIMO_POOL:
+        return _limpar_lote(perfil, textos)
+    tamanho = -(-len(textos) // PROCESSOS)
+    partes = [textos[i:i + tamanho] for i in range(0, len(textos), tamanho)]
+    return [t for parte in _obter_pool().map(partial(_limpar_lote, perfil), partes) for t in parte]
+
+
+def _hash(texto):
+    return hashlib.blake2b(str(texto).encode("utf-8"), digest_size=8).digest()
+
+
+def limpar_serie(textos, ids=None, perfil="topicos"):
+    """
+    Series limpa (mesmo índice de `textos`). Com `ids` (ex.: TICKET_SUBTICKET)
+    o resultado é guardado por (ticket, hash do texto bruto): um ticket só é
+    limpo de novo se o texto dele mudar.
+    """
+    valores = textos.tolist()
+    with metricas.medir(f"limpeza.{perfil}", linhas=len(valores)) as m:
+        if ids is None:
+            return pd.Series(_limpar(perfil, valores), index=textos.index, dtype=object)
+
+        chaves = list(zip(ids.tolist(), map(_hash, valores)))
+        with _trava:
+            cache = _caches.setdefault(perfil, OrderedDict())
+            limpos = [cache.get(chave) for chave in chaves]
+        pendentes = [n for n, limpo in enumerate(limpos) if limpo is None]
+        m.linhas = len(pendentes)  # só o que foi realmente limpo
+
+        if pendentes:
+            novos = _limpar(perfil, [valores[n] for n in pendentes])
+            with _trava:
+                for n, limpo in zip(pendentes, novos):
+                    limpos[n] = cache[chaves[n]] = limpo
+                while len(cache) > TEXTOS_EM_CACHE:
+                    cache.popitem(last=False)
+        return pd.Series(limpos, index=textos.index, dtype=object)
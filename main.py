@@ -1,5 +1,15 @@
+import os
 import streamlit as st
+import aquecimento
 import conexao
+import dados
+import dependencias
+
+# Pré-carrega em segundo plano as bibliotecas e modelos de IA das páginas de análise
+aquecimento.iniciar()
+
+# Snapshot novo refaz só os artefatos dos serviços que mudaram (ver dependencias.py; registrar de novo não duplica)
+dados.ao_publicar(dependencias.snapshot_publicado)
 
 # Aplicando css na página
 def apply_custom_css(css_file):
@@ -7,12 +17,28 @@ def apply_custom_css(css_file):
         css = f.read()
         st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
-apply_custom_css("style.css")
+def pagina_inicial():
+    apply_custom_css("style.css")
+
+    logoImg = st.image("assets/logo_pmm.png")
+
+    # Título da página
+    st.title("Dashboard CITSM", text_alignment="center")
 
-logoImg = st.image("assets/logo_pmm.png")
+    # Botão Iniciar
+    st.page_link("pages/Dashboard_CITSM.py", label="Acessar Dashboard")
 
-# Título da página
-st.title("Dashboard CITSM", text_alignment="center")
+# --- NAVEGAÇÃO ---
+# A página de admin só entra no menu (e só abre) com ?token=<CITSM_ADMIN_TOKEN> na URL
+paginas = [
+    st.Page(pagina_inicial, title="Início", default=True),
+    st.Page("pages/Dashboard_CITSM.py"),
+    st.Page("pages/Timelines_CITSM.py"),
+    st.Page("pages/Busca_semantica.py"),
+    st.Page("pages/Analise_IA.py"),
+]
+TOKEN_ADMIN = os.environ.get("CITSM_ADMIN_TOKEN")
+if TOKEN_ADMIN and st.query_params.get("token") == TOKEN_ADMIN:
+    paginas.append(st.Page("pages/Admin_Metricas.py"))
 
-# Botão Iniciar
-st.page_link("pages/Dashboard_CITSM.py", label="Acessar Dashboard")
\ No newline at end of file
+st.navigation(paginas).run()
\ No newline at end of file
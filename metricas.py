@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+# Guarda as últimas N medições do processo (as mais antigas são descartadas)
+TAMANHO_BUFFER = 10000
+
+_registros = deque(maxlen=TAMANHO_BUFFER)
+_contadores = {}  # evento -> total (ex.: acertos e faltas dos caches)
+_totais = {}      # etapa -> [execuções, segundos] desde o início do processo (não saem com o buffer)
+_trava = threading.Lock()
+_TAMANHO_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class Medicao:
+    etapa: str
+    inicio: float
+    duracao: float = 0.0
+    linhas: int | None = None
+    memoria_delta: int | None = None  # bytes de RSS ganhos (ou perdidos) durante a etapa
+    bytes: int | None = None          # tamanho do que a etapa produziu/enviou (ex.: JSON de um gráfico)
+
+
+def memoria_rss(pid=None):
+    """RSS atual do processo (ou do `pid` informado) em bytes; None fora do Linux."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * _TAMANHO_PAGINA
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextmanager
+def medir(etapa, linhas=None):
+    """
+    Mede uma etapa: `with medir("dados.extracao") as m: ...; m.linhas = len(df)`.
+    Duração, linhas e variação de memória vão para o buffer circular do processo.
+    """
+    med = Medicao(etapa, time.time(), linhas=linhas)
+    rss_antes = memoria_rss()
+    t0 = time.perf_counter()
+    try:
+        yield med
+    finally:
+        med.duracao = time.perf_counter() - t0
+        rss_depois = memoria_rss()
+        if rss_antes is not None and rss_depois is not None:
+            med.memoria_delta = rss_depois - rss_antes
+        with _trava:
+            _registros.append(med)
+            total = _totais.setdefault(etapa, [0, 0.0])
+            total[0] += 1
+            total[1] += med.duracao
+
+
+def contar(evento, quantidade=1):
+    """Soma `quantidade` ao contador do evento, ex.: contar("busca.cache_resultados.acerto")."""
+    with _trava:
+        _contadores[evento] = _contadores.get(evento, 0) + quantidade
+
+
+def contadores():
+    with _trava:
+        return dict(_contadores)
+
+
+def taxas_acerto():
+    """Acertos, faltas e taxa de acerto de cada cache (contadores `<cache>.acerto` / `<cache>.falta`)."""
+    caches = {}
+    for evento, total in contadores().items():
+        cache, _, tipo = evento.rpartition(".")
+        if tipo in ("acerto", "falta"):
+            caches.setdefault(cache, {"acerto": 0, "falta": 0})[tipo] = total
+    df = pd.DataFrame([{"cache": c, "acertos": v["acerto"], "faltas": v["falta"]} for c, v in sorted(caches.items())],
+                      columns=["cache", "acertos", "faltas"])
+    return df.assign(taxa_acerto=df["acertos"] / (df["acertos"] + df["faltas"]))
+
+
+def registros():
+    with _trava:
+        return list(_registros)
+
+
+def resumo():
+    """Tabela com p50/p95 por etapa (segundos), média de linhas e de memória."""
+    df = pd.DataFrame([asdict(m) for m in registros()])
+    if df.empty:
+        return pd.DataFrame(columns=["etapa", "execucoes", "p50_s", "p95_s", "max_s", "linhas_media", "memoria_media_mb", "kb_medio"])
+
+    agrupado = df.groupby("etapa")
+    return pd.DataFrame({
+        "execucoes": agrupado.size(),
+        "p50_s": agrupado["duracao"].quantile(0.50),
+        "p95_s": agrupado["duracao"].quantile(0.95),
+        "max_s": agrupado["duracao"].max(),
+        "linhas_media": agrupado["linhas"].mean(),
+        "memoria_media_mb": agrupado["memoria_delta"].mean() / 1024**2,
+        "kb_medio": agrupado["bytes"].mean() / 1024,
+    }).reset_index().sort_values("p95_s", ascending=False)
+
+
+def exportar_prometheus():
+    """
+    Formato texto do Prometheus (summary por etapa). Os quantis vêm do buffer;
+    _sum e _count são totais acumulados do processo, então nunca diminuem.
+    """
+    linhas = [
+        "# HELP citsm_etapa_duracao_segundos Duração das etapas do CITSM.",
+        "# TYPE citsm_etapa_duracao_segundos summary",
+    ]
+    por_etapa = {}
+    for m in registros():
+        por_etapa.setdefault(m.etapa, []).append(m.duracao)
+    with _trava:
+        totais = {etapa: tuple(t) for etapa, t in _totais.items()}
+
+    for etapa, (execucoes, segundos) in sorted(totais.items()):
+        rotulo = etapa.replace("\\", "\\\\").replace('"', '\\"')
+        for q in (0.5, 0.95, 0.99):
+            if por_etapa.get(etapa):
+                linhas.append(f'citsm_etapa_duracao_segundos{{etapa="{rotulo}",quantile="{q}"}} {np.quantile(por_etapa[etapa], q):.6f}')
+        linhas.append(f'citsm_etapa_duracao_segundos_sum{{etapa="{rotulo}"}} {segundos:.6f}')
+        linhas.append(f'citsm_etapa_duracao_segundos_count{{etapa="{rotulo}"}} {execucoes}')
+
+    eventos = contadores()
+    if eventos:
+        linhas += [
+            "# HELP citsm_eventos_total Contadores de eventos do CITSM (ex.: acertos de cache).",
+            "# TYPE citsm_eventos_total counter",
+        ]
+        for evento, total in sorted(eventos.items()):
+            rotulo = evento.replace("\\", "\\\\").replace('"', '\\"')
+            linhas.append(f'citsm_eventos_total{{evento="{rotulo}"}} {total}')
+    return "\n".join(linhas) + "\n"
+
+
+def exportar_jsonl():
+    """Uma medição por linha, em JSON."""
+    return "".join(json.dumps(asdict(m), ensure_ascii=False) + "\n" for m in registros())
+
+
+def limpar():
+    """Esvazia o buffer de medições. Contadores e totais do Prometheus continuam (são acumulados)."""
+    with _trava:
+        _registros.clear()
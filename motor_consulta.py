@@ -0,0 +1,624 @@
+import importlib
+import logging
+import os
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+import conexao
+import dados
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ MOTOR DE CONSULTA (filtros em cascata, contagens e séries temporais)
+# ========================================================
+# indices (padrão), pandas, duckdb ou polars — os dois últimos são opcionais
+VAR_MOTOR = "CITSM_MOTOR"
+MOTOR_PADRAO = "indices"
+
+COL_CONTRATO = "NUMEROCONTRATO"
+COLS_DATA_FLUXO = {'DTABERTURA': 'Abertos', 'DTULTIMAMODIFICACAO': 'Modificados', 'DTFIM': 'Fechados'}
+# Colunas levadas para DuckDB/Polars (os textos longos ficam só no pandas)
+COLS_ESTRUTURADAS = ['DTABERTURA', 'DTULTIMAMODIFICACAO', 'DTFIM', COL_CONTRATO, 'NOMESERVICO', 'STATUS', 'DEMANDANTE']
+# Colunas com índice por valor no MotorIndexado
+COLS_INDEXADAS = [COL_CONTRATO, 'NOMESERVICO', 'STATUS', 'DEMANDANTE']
+# "1": enquanto o snapshot completo não está em memória, gráficos saem de GROUP BY no banco
+VAR_MODO_AGREGADO = "CITSM_MODO_AGREGADO"
+IDS_POR_CONSULTA = 20000   # MotorBanco: ids lidos por consulta (paginação por chave)
+# ========================================================
+
+
+@dataclass(frozen=True)
+class Filtros:
+    """Combinação de filtros da tela. `None` = sem filtro naquela dimensão."""
+    inicio: object = None      # date (inclusive), sobre DTABERTURA
+    fim: object = None         # date (inclusive)
+    contrato: str | None = None
+    servico: str | None = None
+    demandante: str | None = None
+    status: tuple | None = None
+    apenas_abertos: bool = False
+
+    def com(self, **alteracoes):
+        return replace(self, **alteracoes)
+
+
+_NAT = np.iinfo(np.int64).min  # representação inteira de NaT
+
+
+def _limites_periodo(filtros):
+    inicio = pd.Timestamp(filtros.inicio) if filtros.inicio else None
+    fim = pd.Timestamp(filtros.fim) + pd.Timedelta(days=1) if filtros.fim else None
+    return inicio, fim
+
+
+def _montar_backlog(linhas, agora):
+    """Linhas já ordenadas (mais antigas primeiro) -> colunas do gráfico de Gantt."""
+    dias = (agora - linhas['DTABERTURA']).dt.days
+    linhas = linhas.assign(DIAS_ABERTO=dias)
+    return linhas.assign(ROTULO=linhas['DEMANDANTE'] + " (" + linhas['DIAS_ABERTO'].astype(str) + "d)")
+
+
+def _completar_fluxo(contagens, regra):
+    """
+    {legenda: Series(contagem por período)} -> DataFrame contínuo (períodos vazios = 0).
+    Como no resample do pandas, o eixo é o da primeira série (Abertos).
+    """
+    primeira = next(iter(contagens.values()), None)
+    if primeira is None or primeira.empty:
+        return pd.DataFrame()
+    periodos = pd.date_range(primeira.index.min(), primeira.index.max(), freq=regra)
+    return pd.DataFrame({k: v.reindex(periodos, fill_value=0) for k, v in contagens.items()})
+
+
+class MotorPandas:
+    """Caminho original: máscaras booleanas sobre o DataFrame inteiro."""
+    nome = "pandas"
+
+    def __init__(self, df):
+        self.df = df
+
+    def _mascara(self, filtros):
+        df = self.df
+        mascara = np.ones(len(df), dtype=bool)
+        inicio, fim = _limites_periodo(filtros)
+        if inicio is not None:
+            mascara &= (df['DTABERTURA'] >= inicio).to_numpy()
+        if fim is not None:
+            mascara &= (df['DTABERTURA'] < fim).to_numpy()
+        for col, valor in ((COL_CONTRATO, filtros.contrato), ('NOMESERVICO', filtros.servico), ('DEMANDANTE', filtros.demandante)):
+            if valor is not None:
+                mascara &= (df[col] == valor).to_numpy()
+        if filtros.status:
+            mascara &= df['STATUS'].isin(filtros.status).to_numpy()
+        if filtros.apenas_abertos:
+            mascara &= df['DTFIM'].isna().to_numpy()
+        return mascara
+
+    def filtrar(self, filtros):
+        return self.df[self._mascara(filtros)]
+
+    def posicoes(self, filtros):
+        return np.flatnonzero(self._mascara(filtros))
+
+    def total(self, filtros):
+        return int(self._mascara(filtros).sum())
+
+    def intervalo_datas(self):
+        return self.df['DTABERTURA'].min().date(), self.df['DTABERTURA'].max().date()
+
+    def opcoes(self, coluna, filtros):
+        return sorted(self.filtrar(filtros)[coluna].dropna().unique())
+
+    def contar(self, coluna, filtros, limite=None):
+        contagem = self.filtrar(filtros)[coluna].value_counts()
+        if limite:
+            contagem = contagem.head(limite)
+        df_cont = contagem.reset_index()
+        df_cont.columns = [coluna, 'count']
+        return df_cont
+
+    def fluxo(self, filtros, regra):
+        df = self.filtrar(filtros)
+        dados_t = pd.DataFrame()
+        for col_db, nome_legenda in COLS_DATA_FLUXO.items():
+            if col_db in df.columns:
+                # Coluna só com NaT (ex.: DTFIM dos pendentes) quebra o resample
+                dados_t[nome_legenda] = df.set_index(col_db).resample(regra).size() if df[col_db].notna().any() else 0
+        return dados_t
+
+    def mais_antigos_abertos(self, filtros, agora, limite=15):
+        abertos = self.filtrar(filtros.com(apenas_abertos=True))
+        return _montar_backlog(abertos.sort_values('DTABERTURA', kind="stable").head(limite), agora)
+
+
+class IndiceValores:
+    """
+    Índice invertido de uma coluna categórica: para cada valor, as posições
+    (ordenadas) das linhas que o contêm, e o código do valor em cada linha
+    (teste de pertinência O(1) por linha).
+    """
+
+    def __init__(self, serie):
+        codigos, chaves = pd.factorize(serie, sort=True)
+        self.codigos = codigos.astype(np.int32)
+        self.chaves = np.asarray(chaves, dtype=object)
+        self.codigo_de = {chave: i for i, chave in enumerate(self.chaves)}
+
+        # Ordenação estável por código: as posições de cada valor saem em ordem crescente
+        ordem = np.argsort(self.codigos, kind="stable")
+        contagens = np.bincount(self.codigos[self.codigos >= 0], minlength=len(self.chaves))
+        nulos = len(ordem) - int(contagens.sum())
+        self.linhas = np.split(ordem[nulos:], np.cumsum(contagens)[:-1]) if len(self.chaves) else []
+
+    def linhas_de(self, valor):
+        codigo = self.codigo_de.get(valor)
+        return self.linhas[codigo] if codigo is not None else np.empty(0, dtype=np.int64)
+
+    def contagens(self, linhas):
+        codigos = self.codigos[linhas]
+        return np.bincount(codigos[codigos >= 0], minlength=len(self.chaves))
+
+
+class MotorIndexado:
+    """
+    Índices montados uma vez por snapshot: posições por valor de contrato,
+    serviço, status e demandante, ordem das linhas por DTABERTURA e a lista
+    de pendentes. Um filtro parte do menor conjunto de linhas candidato e
+    confere os demais critérios só nessas linhas (custo proporcional ao
+    resultado, não à tabela). As opções dos selectbox saem das chaves.
+    """
+    nome = "indices"
+
+    def __init__(self, df):
+        self.df = df
+        self.n = len(df)
+        self.indices = {c: IndiceValores(df[c]) for c in COLS_INDEXADAS if c in df.columns}
+
+        # DTABERTURA como int64 (NaT = menor inteiro possível, fica antes de qualquer data)
+        self._abertura = df['DTABERTURA'].to_numpy(dtype='datetime64[ns]').view('i8')
+        self._ordem_data = np.argsort(self._abertura, kind="stable")
+        self._datas_ordenadas = self._abertura[self._ordem_data]
+        self._aberto = df['DTFIM'].isna().to_numpy()
+        self._abertos = np.flatnonzero(self._aberto)
+
+    def _faixa_data(self, filtros):
+        """(início, fim) em ns e o trecho correspondente da ordem por data."""
+        inicio, fim = _limites_periodo(filtros)
+        ini_ns = inicio.value if inicio is not None else _NAT + 1
+        fim_ns = fim.value if fim is not None else np.iinfo(np.int64).max
+        a, b = np.searchsorted(self._datas_ordenadas, [ini_ns, fim_ns], side="left")
+        return ini_ns, fim_ns, a, b
+
+    def _linhas(self, filtros):
+        """Posições (crescentes) das linhas que atendem aos filtros."""
+        criterios = [(self.indices[c], v) for c, v in ((COL_CONTRATO, filtros.contrato), ('NOMESERVICO', filtros.servico),
+                                                    ('DEMANDANTE', filtros.demandante)) if v is not None]
+        status = None
+        if filtros.status:
+            idx_status = self.indices['STATUS']
+            status = sorted({idx_status.codigo_de[s] for s in filtros.status if s in idx_status.codigo_de})
+
+        # 1. Conjunto candidato: o menor entre as listas de cada critério
+        candidatos = [idx.linhas_de(v) for idx, v in criterios]
+        if status is not None:
+            candidatos.append(np.sort(np.concatenate([self.indices['STATUS'].linhas[c] for c in status]))
+                              if status else np.empty(0, dtype=np.int64))
+        if filtros.apenas_abertos:
+            candidatos.append(self._abertos)
+        tem_periodo = filtros.inicio is not None or filtros.fim is not None
+        if tem_periodo:
+            ini_ns, fim_ns, a, b = self._faixa_data(filtros)
+            if not candidatos or b - a < min(len(c) for c in candidatos):
+                candidatos.append(np.sort(self._ordem_data[a:b]))
+        if not candidatos:
+            return np.arange(self.n)
+        linhas = min(candidatos, key=len)
+
+        # 2. Confere os demais critérios só nas linhas candidatas
+        for idx, valor in criterios:
+            codigo = idx.codigo_de.get(valor, -2)
+            linhas = linhas[idx.codigos[linhas] == codigo]
+        if status is not None:
+            linhas = linhas[np.isin(self.indices['STATUS'].codigos[linhas], status)]
+        if filtros.apenas_abertos:
+            linhas = linhas[self._aberto[linhas]]
+        if tem_periodo:
+            datas = self._abertura[linhas]
+            linhas = linhas[(datas >= ini_ns) & (datas < fim_ns)]
+        return linhas
+
+    def filtrar(self, filtros):
+        return self.df.iloc[self._linhas(filtros)]
+
+    def posicoes(self, filtros):
+        return self._linhas(filtros)
+
+    def total(self, filtros):
+        return len(self._linhas(filtros))
+
+    def intervalo_datas(self):
+        validas = self._datas_ordenadas[self._datas_ordenadas != _NAT]
+        return pd.Timestamp(validas[0]).date(), pd.Timestamp(validas[-1]).date()
+
+    def opcoes(self, coluna, filtros):
+        idx = self.indices[coluna]
+        if filtros == Filtros():
+            return idx.chaves.tolist()
+        return idx.chaves[idx.contagens(self._linhas(filtros)) > 0].tolist()
+
+    def contar(self, coluna, filtros, limite=None):
+        idx = self.indices[coluna]
+        contagens = idx.contagens(self._linhas(filtros))
+        presentes = np.flatnonzero(contagens)
+        # Maior contagem primeiro; empate pela ordem alfabética (chaves já ordenadas)
+        ordem = presentes[np.argsort(-contagens[presentes], kind="stable")]
+        if limite:
+            ordem = ordem[:limite]
+        return pd.DataFrame({coluna: idx.chaves[ordem], 'count': contagens[ordem]})
+
+    def _colunas(self, linhas, colunas):
+        return pd.DataFrame({c: self.df[c].to_numpy()[linhas] for c in colunas if c in self.df.columns})
+
+    def fluxo(self, filtros, regra):
+        # Só as colunas de data das linhas filtradas vão para o resample
+        return MotorPandas(self._colunas(self._linhas(filtros), COLS_DATA_FLUXO)).fluxo(Filtros(), regra)
+
+    def mais_antigos_abertos(self, filtros, agora, limite=15):
+        linhas = self._linhas(filtros.com(apenas_abertos=True))
+        datas = self._abertura[linhas]
+        datas = np.where(datas == _NAT, np.iinfo(np.int64).max, datas)  # NaT por último
+        if len(linhas) > limite:
+            parte = np.argpartition(datas, limite - 1)[:limite]
+            linhas, datas = linhas[parte], datas[parte]
+        ordem = np.lexsort((linhas, datas))
+        return _montar_backlog(self.df.iloc[linhas[ordem]], agora)
+
+
+class _MotorColunar:
+    """Base dos motores que guardam uma cópia colunar das colunas estruturadas."""
+
+    def __init__(self, df):
+        self.df = df
+        self._base = df[[c for c in COLS_ESTRUTURADAS if c in df.columns]].assign(POS=np.arange(len(df)))
+
+    def filtrar(self, filtros):
+        return self.df.iloc[self.posicoes(filtros)]
+
+    def mais_antigos_abertos(self, filtros, agora, limite=15):
+        posicoes = self._posicoes_mais_antigos(filtros.com(apenas_abertos=True), limite)
+        return _montar_backlog(self.df.iloc[posicoes], agora)
+
+
+class MotorDuckDB(_MotorColunar):
+    """Snapshot em uma tabela DuckDB em memória; consultas vetorizadas e multithread."""
+    nome = "duckdb"
+
+    def __init__(self, df, threads=None):
+        super().__init__(df)
+        duckdb = importlib.import_module("duckdb")
+        self._con = duckdb.connect(":memory:")
+        if threads:
+            self._con.execute(f"SET threads = {int(threads)}")
+        self._con.register("base_df", self._base)
+        self._con.execute("CREATE TABLE ods AS SELECT * FROM base_df")
+        self._con.unregister("base_df")
+        self._base = None  # os dados agora vivem no DuckDB
+
+    def _consultar(self, sql, parametros=()):
+        # Um cursor por consulta: cada sessão do Streamlit roda em sua própria thread
+        return self._con.cursor().execute(sql, list(parametros)).df()
+
+    def _where(self, filtros):
+        condicoes, parametros = ["1 = 1"], []
+        inicio, fim = _limites_periodo(filtros)
+        if inicio is not None:
+            condicoes.append("DTABERTURA >= ?")
+            parametros.append(inicio.to_pydatetime())
+        if fim is not None:
+            condicoes.append("DTABERTURA < ?")
+            parametros.append(fim.to_pydatetime())
+        for col, valor in ((COL_CONTRATO, filtros.contrato), ('NOMESERVICO', filtros.servico), ('DEMANDANTE', filtros.demandante)):
+            if valor is not None:
+                condicoes.append(f"{col} = ?")
+                parametros.append(valor)
+        if filtros.status:
+            condicoes.append(f"STATUS IN ({', '.join('?' * len(filtros.status))})")
+            parametros.extend(filtros.status)
+        if filtros.apenas_abertos:
+            condicoes.append("DTFIM IS NULL")
+        return " AND ".join(condicoes), parametros
+
+    def posicoes(self, filtros):
+        where, params = self._where(filtros)
+        return self._consultar(f"SELECT POS FROM ods WHERE {where} ORDER BY POS", params)['POS'].to_numpy()
+
+    def total(self, filtros):
+        where, params = self._where(filtros)
+        return int(self._consultar(f"SELECT count(*) AS n FROM ods WHERE {where}", params)['n'].iloc[0])
+
+    def intervalo_datas(self):
+        r = self._consultar("SELECT min(DTABERTURA) AS ini, max(DTABERTURA) AS fim FROM ods").iloc[0]
+        return pd.Timestamp(r['ini']).date(), pd.Timestamp(r['fim']).date()
+
+    def opcoes(self, coluna, filtros):
+        where, params = self._where(filtros)
+        sql = f"SELECT DISTINCT {coluna} AS v FROM ods WHERE {where} AND {coluna} IS NOT NULL ORDER BY 1"
+        return self._consultar(sql, params)['v'].tolist()
+
+    def contar(self, coluna, filtros, limite=None):
+        where, params = self._where(filtros)
+        sql = (f"SELECT {coluna}, count(*) AS count FROM ods WHERE {where} AND {coluna} IS NOT NULL "
+               f"GROUP BY {coluna} ORDER BY count DESC, {coluna}")
+        if limite:
+            sql += f" LIMIT {int(limite)}"
+        return self._consultar(sql, params)
+
+    def fluxo(self, filtros, regra):
+        where, params = self._where(filtros)
+        contagens = {}
+        for col_db, nome_legenda in COLS_DATA_FLUXO.items():
+            if regra == 'MS':
+                periodo = f"date_trunc('month', {col_db})"
+            else:
+                # 'W-MON' do pandas: semanas de terça a segunda, rotuladas pela segunda-feira
+                periodo = f"date_trunc('week', CAST({col_db} AS DATE) - INTERVAL 1 DAY) + INTERVAL 7 DAY"
+            sql = (f"SELECT CAST({periodo} AS TIMESTAMP) AS periodo, count(*) AS n FROM ods "
+                   f"WHERE {where} AND {col_db} IS NOT NULL GROUP BY 1")
+            r = self._consultar(sql, params)
+            contagens[nome_legenda] = pd.Series(r['n'].to_numpy(), index=pd.DatetimeIndex(r['periodo'])).sort_index()
+        return _completar_fluxo(contagens, regra)
+
+    def _posicoes_mais_antigos(self, filtros, limite):
+        where, params = self._where(filtros)
+        sql = f"SELECT POS FROM ods WHERE {where} ORDER BY DTABERTURA NULLS LAST, POS LIMIT {int(limite)}"
+        return self._consultar(sql, params)['POS'].to_numpy()
+
+
+class MotorPolars(_MotorColunar):
+    """Snapshot em um DataFrame Polars (execução vetorizada e multithread)."""
+    nome = "polars"
+
+    def __init__(self, df):
+        super().__init__(df)
+        self._pl = importlib.import_module("polars")
+        self._tabela = self._pl.from_pandas(self._base)
+        self._base = None
+
+    def _expr(self, filtros):
+        pl = self._pl
+        expr = pl.lit(True)
+        inicio, fim = _limites_periodo(filtros)
+        if inicio is not None:
+            expr &= pl.col('DTABERTURA') >= inicio.to_pydatetime()
+        if fim is not None:
+            expr &= pl.col('DTABERTURA') < fim.to_pydatetime()
+        for col, valor in ((COL_CONTRATO, filtros.contrato), ('NOMESERVICO', filtros.servico), ('DEMANDANTE', filtros.demandante)):
+            if valor is not None:
+                expr &= pl.col(col) == valor
+        if filtros.status:
+            expr &= pl.col('STATUS').is_in(list(filtros.status))
+        if filtros.apenas_abertos:
+            expr &= pl.col('DTFIM').is_null()
+        return expr
+
+    def _filtrada(self, filtros):
+        return self._tabela.filter(self._expr(filtros))
+
+    def posicoes(self, filtros):
+        return self._filtrada(filtros)['POS'].to_numpy()
+
+    def total(self, filtros):
+        return self._filtrada(filtros).height
+
+    def intervalo_datas(self):
+        col = self._tabela['DTABERTURA']
+        return pd.Timestamp(col.min()).date(), pd.Timestamp(col.max()).date()
+
+    def opcoes(self, coluna, filtros):
+        return sorted(self._filtrada(filtros)[coluna].drop_nulls().unique().to_list())
+
+    def contar(self, coluna, filtros, limite=None):
+        pl = self._pl
+        r = (self._filtrada(filtros).filter(pl.col(coluna).is_not_null())
+             .group_by(coluna).agg(pl.len().alias('count'))
+             .sort(['count', coluna], descending=[True, False]))
+        if limite:
+            r = r.head(limite)
+        return r.to_pandas()
+
+    def fluxo(self, filtros, regra):
+        pl = self._pl
+        filtrada = self._filtrada(filtros)
+        contagens = {}
+        for col_db, nome_legenda in COLS_DATA_FLUXO.items():
+            if regra == 'MS':
+                periodo = pl.col(col_db).dt.truncate("1mo")
+            else:
+                # 'W-MON' do pandas: semanas de terça a segunda, rotuladas pela segunda-feira
+                periodo = (pl.col(col_db).dt.date() - pl.duration(days=1)).dt.truncate("1w") + pl.duration(days=7)
+            r = (filtrada.filter(pl.col(col_db).is_not_null())
+                 .group_by(periodo.cast(pl.Datetime).alias('periodo')).agg(pl.len().alias('n'))
+                 .to_pandas())
+            contagens[nome_legenda] = pd.Series(r['n'].to_numpy(), index=pd.DatetimeIndex(r['periodo'])).sort_index()
+        return _completar_fluxo(contagens, regra)
+
+    def _posicoes_mais_antigos(self, filtros, limite):
+        return (self._filtrada(filtros).sort(['DTABERTURA', 'POS'], nulls_last=True)
+                .head(limite)['POS'].to_numpy())
+
+
+class MotorBanco:
+    """
+    Agregações empurradas para o banco: cada contagem/opção/série é um GROUP BY
+    com bind variables sobre ODS_ITSM, e o resultado (pequeno) passa pelo cache
+    de dados.consultar_agregado. Sem snapshot não há posições de linha: aqui
+    `posicoes` devolve os ids dos tickets (COL_ID), lidos por paginação por chave,
+    e `filtrar` as linhas; os dois vão direto ao banco, fora do cache.
+
+    Os filtros comparam a coluna crua com o valor normalizado (ver _valor_filtro),
+    sem função do lado da coluna, para o Oracle poder usar os índices.
+    """
+    nome = "banco"
+
+    def __init__(self, consultar=None, dialeto=None):
+        self._consultar = consultar or dados.consultar_agregado
+        self.dialeto = dialeto or conexao.dialeto()
+
+    def _texto(self, col):
+        """Valor da coluna como em dados.normalizar (texto, sem '.0' final nem espaços). Só no SELECT."""
+        if self.dialeto == "sqlite":
+            return (f"TRIM(CASE WHEN typeof({col}) = 'real' AND {col} = CAST({col} AS INTEGER) "
+                    f"THEN CAST(CAST({col} AS INTEGER) AS TEXT) ELSE CAST({col} AS TEXT) END)")
+        return f"TRIM(REGEXP_REPLACE(TO_CHAR({col}), '\\.0$', ''))"
+
+    @staticmethod
+    def _valor_filtro(valor):
+        """
+        Valor da tela (já normalizado, ver dados.normalizar) para comparar com a
+        coluna crua: NUMEROCONTRATO numérico casa pela conversão do próprio banco
+        ('2152022' = 2152022.0) e os textos do ODS já vêm sem espaços nas pontas.
+        """
+        return str(valor).strip()
+
+    def _periodo(self, col, regra):
+        # 'W-MON' do pandas: semanas de terça a segunda, rotuladas pela segunda-feira
+        if self.dialeto == "sqlite":
+            return f"date({col}, 'start of month')" if regra == 'MS' else f"date({col}, 'weekday 1')"
+        return f"TRUNC({col}, 'MM')" if regra == 'MS' else f"TRUNC({col} - 1, 'IW') + 7"
+
+    def _where(self, filtros):
+        condicoes, binds = ["1 = 1"], {}
+        inicio, fim = _limites_periodo(filtros)
+        if inicio is not None:
+            condicoes.append("DTABERTURA >= :ini")
+            binds["ini"] = conexao.valor_data(inicio)
+        if fim is not None:
+            condicoes.append("DTABERTURA < :fim")
+            binds["fim"] = conexao.valor_data(fim)
+        for col, valor, bind in ((COL_CONTRATO, filtros.contrato, "contrato"), ('NOMESERVICO', filtros.servico, "servico"),
+                                 ('DEMANDANTE', filtros.demandante, "demandante")):
+            if valor is not None:
+                condicoes.append(f"{col} = :{bind}")
+                binds[bind] = self._valor_filtro(valor)
+        if filtros.status:
+            nomes = [f"status{i}" for i in range(len(filtros.status))]
+            condicoes.append(f"STATUS IN ({', '.join(':' + n for n in nomes)})")
+            binds.update(zip(nomes, map(self._valor_filtro, filtros.status)))
+        if filtros.apenas_abertos:
+            condicoes.append("DTFIM IS NULL")
+        return " AND ".join(condicoes), binds
+
+    def consulta_linhas(self, filtros, colunas=None):
+        """SQL e binds das linhas do filtro (todas as colunas por padrão), para leitura em blocos."""
+        where, binds = self._where(filtros)
+        return f"SELECT {', '.join(colunas) if colunas else '*'} FROM ODS_ITSM WHERE {where}", binds
+
+    def _ler(self, sql, binds):
+        # Linhas/ids não são agregados pequenos: vão direto ao banco, sem o cache
+        with conexao.conexao_pool() as conn:
+            return pd.read_sql(sql, conn, params=binds)
+
+    def ids(self, filtros, apos=None, limite=IDS_POR_CONSULTA):
+        """Até `limite` ids (COL_ID) do filtro, em ordem crescente, depois de `apos` (paginação por chave)."""
+        where, binds = self._where(filtros)
+        if apos is not None:
+            where += f" AND {dados.COL_ID} > :apos"
+            binds["apos"] = apos
+        sql = conexao.limitar(f"SELECT {dados.COL_ID} AS ID FROM ODS_ITSM WHERE {where} ORDER BY {dados.COL_ID}", limite)
+        return self._ler(sql, binds)['ID'].to_numpy()
+
+    def posicoes(self, filtros):
+        """Ids de todos os tickets do filtro (no banco não há posição de linha), página a página."""
+        paginas, apos = [], None
+        while len(pagina := self.ids(filtros, apos)):
+            paginas.append(pagina)
+            if len(pagina) < IDS_POR_CONSULTA:
+                break
+            apos = pagina[-1]
+        return np.concatenate(paginas) if paginas else np.empty(0, dtype=object)
+
+    def filtrar(self, filtros):
+        sql, binds = self.consulta_linhas(filtros)
+        return dados.normalizar(self._ler(sql, binds))
+
+    def total(self, filtros):
+        where, binds = self._where(filtros)
+        return int(self._consultar(f"SELECT COUNT(*) AS N FROM ODS_ITSM WHERE {where}", binds)['N'].iloc[0])
+
+    def intervalo_datas(self):
+        r = self._consultar("SELECT MIN(DTABERTURA) AS INI, MAX(DTABERTURA) AS FIM FROM ODS_ITSM").iloc[0]
+        return pd.Timestamp(r['INI']).date(), pd.Timestamp(r['FIM']).date()
+
+    def opcoes(self, coluna, filtros):
+        where, binds = self._where(filtros)
+        sql = f"SELECT DISTINCT {self._texto(coluna)} AS {coluna} FROM ODS_ITSM WHERE {where} AND {coluna} IS NOT NULL"
+        return sorted(self._consultar(sql, binds)[coluna].unique())
+
+    def contar(self, coluna, filtros, limite=None):
+        where, binds = self._where(filtros)
+        expr = self._texto(coluna)
+        sql = (f"SELECT {expr} AS {coluna}, COUNT(*) AS N FROM ODS_ITSM WHERE {where} AND {coluna} IS NOT NULL "
+               f"GROUP BY {expr} ORDER BY N DESC, {coluna}")
+        if limite:
+            sql = conexao.limitar(sql, limite)
+        r = self._consultar(sql, binds)
+        return pd.DataFrame({coluna: r[coluna].to_numpy(), 'count': r['N'].to_numpy()})
+
+    def fluxo(self, filtros, regra):
+        # As três séries em uma ida ao banco
+        where, binds = self._where(filtros)
+        partes = [f"SELECT {i} AS SERIE, {self._periodo(col, regra)} AS PERIODO, COUNT(*) AS N FROM ODS_ITSM "
+                  f"WHERE {where} AND {col} IS NOT NULL GROUP BY {self._periodo(col, regra)}"
+                  for i, col in enumerate(COLS_DATA_FLUXO)]
+        r = self._consultar(" UNION ALL ".join(partes), binds)
+        contagens = {}
+        for i, nome_legenda in enumerate(COLS_DATA_FLUXO.values()):
+            serie = r[r['SERIE'] == i]
+            contagens[nome_legenda] = pd.Series(serie['N'].to_numpy(), index=pd.DatetimeIndex(pd.to_datetime(serie['PERIODO']))).sort_index()
+        return _completar_fluxo(contagens, regra)
+
+    def mais_antigos_abertos(self, filtros, agora, limite=15):
+        where, binds = self._where(filtros.com(apenas_abertos=True))
+        sql = (f"SELECT {', '.join(COLS_ESTRUTURADAS)} FROM ODS_ITSM "
+               f"WHERE {where} AND DTABERTURA IS NOT NULL ORDER BY DTABERTURA")
+        return _montar_backlog(self._consultar(conexao.limitar(sql, limite), binds), agora)
+
+
+MOTORES = {"indices": MotorIndexado, "pandas": MotorPandas, "duckdb": MotorDuckDB, "polars": MotorPolars}
+
+
+def criar_motor(df, nome=None):
+    """Cria o motor pedido (ou o de CITSM_MOTOR); sem a biblioteca opcional, volta ao padrão."""
+    nome = (nome or os.environ.get(VAR_MOTOR) or MOTOR_PADRAO).lower()
+    try:
+        return MOTORES[nome](df)
+    except (KeyError, ImportError) as e:
+        log.warning("Motor '%s' indisponível (%s); usando '%s'", nome, e, MOTOR_PADRAO)
+        return MOTORES[MOTOR_PADRAO](df)
+
+
+def motor_do_snapshot(snap, nome=None):
+    """Motor construído uma única vez por snapshot e compartilhado entre as sessões."""
+    nome = (nome or os.environ.get(VAR_MOTOR) or MOTOR_PADRAO).lower()
+    return snap.derivado(f"motor_{nome}", lambda df: criar_motor(df, nome))
+
+
+def motor_atual(nome_conjunto="completo"):
+    """
+    (motor, snapshot) para as páginas. Com o snapshot em memória, o cálculo é
+    local; no modo agregado (CITSM_MODO_AGREGADO), enquanto a primeira carga
+    roda em segundo plano, os gráficos vêm do MotorBanco e o snapshot é None.
+    Fora do modo agregado espera a carga, como antes; (None, None) se ela falhou.
+    """
+    if os.environ.get(VAR_MODO_AGREGADO):
+        snap = dados.snapshot_carregado(nome_conjunto)
+        if snap is None:
+            return MotorBanco(), None
+    else:
+        snap = dados.obter_snapshot(nome_conjunto)
+        if snap is None:
+            return None, None
+    return motor_do_snapshot(snap), snap
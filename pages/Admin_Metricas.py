@@ -0,0 +1,96 @@
+import os
+import streamlit as st
+import aquecimento
+import artefatos
+import dependencias
+import metricas
+import perfil_hardware
+
+st.set_page_config(page_title="Admin - Métricas", layout="wide")
+
+# --- ACESSO RESTRITO ---
+# Página oculta: fica fora do menu (ver main.py) e só abre com ?token=<CITSM_ADMIN_TOKEN> na URL
+TOKEN_ADMIN = os.environ.get("CITSM_ADMIN_TOKEN")
+if not TOKEN_ADMIN or st.query_params.get("token") != TOKEN_ADMIN:
+    st.info("Página restrita.")
+    st.stop()
+
+st.title("⏱️ Métricas de Desempenho")
+st.caption(f"Últimas {metricas.TAMANHO_BUFFER} medições deste processo (buffer circular).")
+
+df_resumo = metricas.resumo()
+if df_resumo.empty:
+    # Sem medições ainda, mas as seções abaixo (caches, artefatos, exportação) valem igual
+    st.info("Nenhuma medição registrada ainda. Navegue pelas páginas para gerar dados.")
+else:
+    st.dataframe(
+        df_resumo.style.format({
+            "p50_s": "{:.4f}", "p95_s": "{:.4f}", "max_s": "{:.4f}",
+            "linhas_media": "{:,.0f}", "memoria_media_mb": "{:+.1f}", "kb_medio": "{:,.1f}"
+        }),
+        hide_index=True, use_container_width=True
+    )
+
+# --- CACHES ---
+st.subheader("🎯 Taxa de acerto dos caches")
+df_caches = metricas.taxas_acerto()
+if not df_caches.empty:
+    st.dataframe(df_caches.style.format({"taxa_acerto": "{:.1%}"}), hide_index=True, use_container_width=True)
+else:
+    st.caption("Nenhum cache consultado ainda.")
+
+# --- IMPORTAÇÕES PESADAS (aquecimento) ---
+st.subheader("📦 Tempo de importação")
+tempos = aquecimento.tempos_importacao()
+if tempos:
+    st.dataframe(
+        [{"modulo": m, "segundos": round(t, 2)} for m, t in sorted(tempos.items(), key=lambda x: -x[1])],
+        hide_index=True, use_container_width=True
+    )
+else:
+    st.caption("Nenhum módulo pesado importado ainda.")
+
+# --- ARTEFATOS (ver artefatos.py) ---
+st.subheader("🧠 Memória dos artefatos")
+df_artefatos = artefatos.uso()
+st.caption(f"{artefatos.uso_memoria_mb():,.1f} MB em memória de {artefatos.ORCAMENTO_MEMORIA_MB:,.0f} MB "
+           f"(acima disso, os menos usados vão para o disco).")
+if not df_artefatos.empty:
+    st.dataframe(
+        df_artefatos.style.format({"tamanho_mb": "{:,.1f}", "ocioso_s": "{:,.0f}"}),
+        hide_index=True, use_container_width=True
+    )
+else:
+    st.caption("Nenhum artefato guardado ainda.")
+
+# --- DEPENDÊNCIAS (ver dependencias.py) ---
+st.subheader("🕸️ Dependências dos artefatos")
+df_grafo = dependencias.grafo()
+if not df_grafo.empty:
+    st.caption(f"Quando um serviço muda no snapshot, só os artefatos dele (e os que dependem deles) são refeitos; "
+               f"os não usados nas últimas {dependencias.RECONSTRUIR_SE_USADO_HA_HORAS} h são só descartados.")
+    st.dataframe(df_grafo, hide_index=True, use_container_width=True)
+else:
+    st.caption("Nenhum artefato com dependências registrado ainda.")
+
+# --- PERFIL DE HARDWARE (ver perfil_hardware.py) ---
+st.subheader("🧰 Perfil de hardware")
+perfil = perfil_hardware.atual()
+if perfil:
+    st.caption(f"{perfil['hardware']['dispositivo'].upper()} · {perfil['threads']} thread(s) do torch · "
+               f"{perfil['encodes_simultaneos']} encode(s) simultâneo(s) · {perfil['precisao']}"
+               + (" · derivado do hardware (calibração pendente)" if perfil.get("padrao") else ""))
+    st.dataframe(
+        [{"modelo": nome, **m} for nome, m in perfil["modelos"].items()],
+        hide_index=True, use_container_width=True
+    )
+else:
+    st.caption("Nenhum perfil válido para este hardware (rode `python calibrar_hardware.py`); usando os padrões.")
+
+# --- EXPORTAÇÃO ---
+col1, col2, col3 = st.columns(3)
+col1.download_button("⬇️ Prometheus (texto)", metricas.exportar_prometheus(), file_name="citsm_metricas.prom", mime="text/plain")
+col2.download_button("⬇️ JSON Lines", metricas.exportar_jsonl(), file_name="citsm_metricas.jsonl", mime="application/json")
+if col3.button("🗑️ Limpar medições"):
+    metricas.limpar()
+    st.rerun()
@@ -1,45 +1,42 @@
 import streamlit as st
 import pandas as pd
-import conexao
-import torch
-import re
-import nltk
+import aquecimento
+import artefatos
+import dados
+import dependencias
+import duplicados
+import limpeza
+import metricas
+import topicos
 import gc
-from bertopic import BERTopic
-from sklearn.feature_extraction.text import CountVectorizer
-from nltk.corpus import stopwords
-from sentence_transformers import util # Importante estar aqui no topo
-from sentence_transformers import SentenceTransformer
+from functools import partial
+
+# Imports pesados (torch, bertopic, sklearn, sentence_transformers) são feitos sob
+# demanda via aquecimento.importar(); o servidor já os pré-carrega em segundo plano.
+aquecimento.iniciar()
+# Como no main.py (a página pode ser aberta direto pela URL); registrar de novo não duplica
+dados.ao_publicar(dependencias.snapshot_publicado)
 
 # --- 1. CONFIGURAÇÃO INICIAL E ESTADO DA SESSÃO ---
 st.set_page_config(page_title="IA GPU - CITSM Analyzer", layout="wide")
 
-# Inicializa o estado para salvar as coisas entre os cliques
-if "analise_concluida" not in st.session_state:
-    st.session_state.analise_concluida = False
-    st.session_state.info_topicos = None
-    st.session_state.fig_bar = None
-    st.session_state.df_resultados = None
-    st.session_state.embeddings_docs = None # <--- NOVO: Para guardar os vetores
+# A sessão guarda só a CHAVE da análise: o resultado (tickets, vetores, tópicos e
+# figura) fica uma única vez no armazém do processo, compartilhado por quem pedir
+# a mesma análise (ver artefatos.py). Quando o serviço muda num snapshot novo, a
+# análise é refeita em segundo plano com a mesma chave (ver dependencias.py)
+if "analise_ref" not in st.session_state:
+    st.session_state.analise_ref = None
 
 st.title("🚀 Análise de Tópicos (Modo Turbo GPU)")
 
-# Verifica hardware
-device = "cuda" if torch.cuda.is_available() else "cpu"
-if device == "cuda":
-    st.success(f"✅ GPU ATIVADA: {torch.cuda.get_device_name(0)}")
-else:
-    st.warning("⚠️ Rodando em CPU.")
+# Verifica hardware (preenchido depois que a página já foi desenhada)
+aviso_hardware = st.empty()
 
 # --- 2. CACHE DE RECURSOS ---
 @st.cache_resource
 def preparar_stopwords():
-    try:
-        nltk.data.find('corpora/stopwords')
-    except LookupError:
-        nltk.download('stopwords')
-
-    lista = stopwords.words('portuguese')
+    # Lista empacotada em assets/ (não depende de nltk.download)
+    lista = aquecimento.stopwords_portugues()
     lixo_helpdesk = [
         'manaus', 'amazonas', 'am', 'br', 'gov', 'com', 'org', 'http', 'https', 'www',
         'atenciosamente', 'grato', 'obrigado', 'bom', 'dia', 'tarde', 'noite',
@@ -52,8 +49,10 @@ def preparar_stopwords():
     lista.extend(lixo_helpdesk)
     return lista
 
-@st.cache_resource
-def carregar_modelo_base(stop_words):
+def criar_modelo_topicos(stop_words):
+    """BERTopic novo a cada análise: o fit_transform altera o modelo, então não pode ser compartilhado."""
+    CountVectorizer = aquecimento.importar("sklearn.feature_extraction.text").CountVectorizer
+    BERTopic = aquecimento.importar("bertopic").BERTopic
     vectorizer_model = CountVectorizer(stop_words=stop_words, min_df=5)
     return BERTopic(
         language="multilingual",
@@ -65,106 +64,133 @@ def carregar_modelo_base(stop_words):
 
 stop_words_pt = preparar_stopwords()
 
-# --- 3. FUNÇÕES DE APOIO ---
-def limpar_texto(texto):
-    if not isinstance(texto, str): return ""
-    texto = texto.lower()
-    texto = re.sub(r'\S+@\S+', '', texto)
-    texto = re.sub(r'http\S+|www\S+', '', texto)
-    texto = re.sub(r'\d+', '', texto)
-    texto = re.sub(r'[^\w\s]', ' ', texto)
-    texto = re.sub(r'\s+', ' ', texto).strip()
-    return texto
-
-@st.cache_data(ttl=3600)
-def carregar_dados():
-    try:
-        conn = conexao.conexao()
-        return pd.read_sql("SELECT * FROM ODS_ITSM FETCH FIRST 5000 ROWS ONLY", conn)
-    except Exception as e:
-        st.error(f"Erro na conexão: {e}")
-        return pd.DataFrame()
-
-# --- 4. CARGA E BARRA LATERAL ---
-df = carregar_dados()
-if df.empty: st.stop()
+# --- 3. CARGA E BARRA LATERAL ---
+snap = dados.obter_snapshot("amostra_5000")
+if snap is None or snap.df.empty: st.stop()
+df = snap.df
 
 st.sidebar.header("⚙️ Configurações")
 lista_servicos = df['NOMESERVICO'].unique()
 idx_serv = next((i for i, s in enumerate(lista_servicos) if "Sustenta" in str(s)), 0)
 servico_sel = st.sidebar.selectbox("1. Selecione o Serviço:", lista_servicos, index=idx_serv)
 
-df_analise = df[df['NOMESERVICO'] == servico_sel].copy()
-
-cols_disponiveis = df_analise.columns.tolist()
+cols_disponiveis = snap.colunas
 idx_desc = next((i for i, c in enumerate(cols_disponiveis) if any(x in c.upper() for x in ['DESC', 'TEXT', 'RESUMO'])), 0)
 coluna_texto = st.sidebar.selectbox("2. Coluna para IA:", cols_disponiveis, index=idx_desc)
 
-# --- 5. BOTÃO DE EXECUÇÃO ---
-if st.button("🚀 Iniciar Processamento na GPU", type="primary"):
-    with st.spinner("🧹 Limpando dados e preparando GPU..."):
-        df_analise = df_analise.dropna(subset=[coluna_texto])
-        df_analise['TEXTO_LIMPO'] = df_analise[coluna_texto].astype(str).apply(limpar_texto)
+# Não espera pelo torch só para mostrar o hardware: se o aquecimento ainda não terminou, avisa
+if aquecimento.importado("torch"):
+    torch = aquecimento.importar("torch")
+    if aquecimento.dispositivo() == "cuda":
+        aviso_hardware.success(f"✅ GPU ATIVADA: {torch.cuda.get_device_name(0)}")
+    else:
+        aviso_hardware.warning("⚠️ Rodando em CPU.")
+else:
+    aviso_hardware.info("⏳ Bibliotecas de IA carregando em segundo plano...")
+
+# --- 4. BOTÃO DE EXECUÇÃO ---
+# Mesmo conjunto, serviço, coluna e modelo = mesma análise (de qualquer sessão). A versão do
+# snapshot não entra na chave: o grafo de dependências refaz a análise só se o serviço mudar
+chave_analise = artefatos.chave("analise_ia", snap.nome, servico_sel, coluna_texto, aquecimento.MODELO_TOPICOS)
+
+def construir_analise(snap, servico, coluna):
+    """Tópicos de um serviço. Sem Streamlit: também roda nas reconstruções em segundo plano."""
+    torch = aquecimento.importar("torch")
+    device = aquecimento.dispositivo()
+    # Só as posições do serviço: o texto é lido do armazém apenas ao processar
+    posicoes_servico = (snap.df['NOMESERVICO'] == servico).to_numpy().nonzero()[0]
+    df_analise = snap.com_textos([coluna], posicoes_servico)
+    with metricas.medir("analise.limpeza_texto", linhas=len(df_analise)):
+        df_analise = df_analise.dropna(subset=[coluna])
+        # Texto limpo guardado por ticket (ver limpeza.py): só o que mudou é limpo de novo
+        df_analise['TEXTO_LIMPO'] = limpeza.limpar_serie(df_analise[coluna].astype(str), df_analise[dados.COL_ID])
         df_analise = df_analise[df_analise['TEXTO_LIMPO'].str.len() > 10]
 
     if len(df_analise) < 15:
-        st.warning("Dados insuficientes para criar tópicos.")
-    else:
-        try:
-            with st.spinner(f"🧠 A IA está analisando {len(df_analise)} tickets..."):
-                docs = df_analise['TEXTO_LIMPO'].tolist()
-
-                # --- PASSO 1: GERAR EMBEDDINGS MANUALMENTE ---
-                # Isso resolve o erro 'SentenceTransformerBackend object has no attribute encode'
-                # Usamos um modelo multilingue leve e rápido
-                st.text("Gerando vetores matemáticos...")
-                sent_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2", device=device)
-                embeddings = sent_model.encode(docs, show_progress_bar=False)
-
-                # Salva IMEDIATAMENTE no cofre do Streamlit
-                st.session_state.embeddings_docs = embeddings
-
-                # --- PASSO 2: RODAR O BERTopic ---
-                # Passamos os embeddings prontos para ele (embeddings=embeddings)
-                topic_model = carregar_modelo_base(stop_words_pt)
-                topics, _ = topic_model.fit_transform(docs, embeddings=embeddings)
-
-                # Salva resultados visuais
-                st.session_state.info_topicos = topic_model.get_topic_info()
-                st.session_state.fig_bar = topic_model.visualize_barchart(top_n_topics=8, n_words=5)
-
-                # Reassocia os tópicos ao dataframe
-                df_analise['TOPICO_ID'] = topics
-                st.session_state.df_resultados = df_analise
-                st.session_state.analise_concluida = True
-
-                # Limpeza de memória
-                del sent_model
-                del topic_model
-                gc.collect()
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
+        return None
+
+    docs = df_analise['TEXTO_LIMPO'].tolist()
+
+    # --- PASSO 1: GERAR EMBEDDINGS MANUALMENTE ---
+    # Isso resolve o erro 'SentenceTransformerBackend object has no attribute encode'
+    # Usamos um modelo multilingue leve e rápido
+    # Modelo compartilhado pelo processo (pré-carregado pelo aquecimento)
+    sent_model = aquecimento.modelo(aquecimento.MODELO_TOPICOS, device)
+    with metricas.medir("analise.model_encode", linhas=len(docs)):
+        embeddings = sent_model.encode(docs, show_progress_bar=False)
+
+    # --- PASSO 2: RODAR O BERTopic ---
+    # Passamos os embeddings prontos para ele (embeddings=embeddings)
+    topic_model = criar_modelo_topicos(stop_words_pt)
+    with metricas.medir("analise.bertopic_fit_transform", linhas=len(docs)):
+        topics, _ = topic_model.fit_transform(docs, embeddings=embeddings)
+
+    # Reassocia os tópicos ao dataframe e grava a atribuição por ticket para a timeline (ver topicos.py)
+    df_analise['TOPICO_ID'] = topics
+    info_topicos = topic_model.get_topic_info()
+    topicos.registrar(df_analise, servico, coluna, info_topicos)
+    resultado = {
+        "versao": snap.versao,   # os duplicados guardam a versão da análise de onde vieram
+        "servico": servico,
+        "coluna": coluna,
+        "df_resultados": df_analise.reset_index(drop=True),
+        "embeddings_docs": embeddings,
+        "info_topicos": info_topicos,
+        "fig_bar": topic_model.visualize_barchart(top_n_topics=8, n_words=5),
+    }
+
+    # Limpeza de memória (o modelo de vetores fica em memória para as próximas análises)
+    del topic_model
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return resultado
+
+def construir_duplicados(snap, chave_analise, limiar):
+    """
+    Grupos de duplicados a partir dos vetores da análise (refeitos depois dela,
+    ver dependencias.py). As posições dos grupos só valem para a versão da análise guardada junto.
+    """
+    analise = dependencias.obter(chave_analise)
+    if analise is None or analise['embeddings_docs'] is None:
+        return None
+    return {"versao_analise": analise['versao'], "grupos": duplicados.agrupar(analise['embeddings_docs'], limiar=limiar)}
 
-        except Exception as e:
-            st.error(f"Falha no processamento: {e}")
-            # Mostra o erro completo para facilitar debug
-            import traceback
-            st.text(traceback.format_exc())
-
-# --- 6. RENDERIZAÇÃO DOS RESULTADOS ---
-if st.session_state.analise_concluida:
+if st.button("🚀 Iniciar Processamento na GPU", type="primary"):
+    try:
+        with st.spinner(f"🧠 A IA está analisando os tickets de {servico_sel}..."):
+            resultado = dependencias.obter_ou_calcular(
+                chave_analise, partial(construir_analise, servico=servico_sel, coluna=coluna_texto), snap,
+                fontes=[servico_sel], descricao=f"Análise IA · {servico_sel} · {coluna_texto}"
+            )
+        if resultado is not None:
+            st.session_state.analise_ref = chave_analise
+        else:
+            st.warning("Dados insuficientes para criar tópicos.")
+    except Exception as e:
+        st.error(f"Falha no processamento: {e}")
+        # Mostra o erro completo para facilitar debug
+        import traceback
+        st.text(traceback.format_exc())
+
+# --- 5. RENDERIZAÇÃO DOS RESULTADOS ---
+analise = artefatos.obter(st.session_state.analise_ref) if st.session_state.analise_ref else None
+if analise is not None:
+    if dependencias.reconstruindo(st.session_state.analise_ref):
+        st.info("🔄 Os tickets deste serviço mudaram: a análise está sendo refeita em segundo plano. "
+                "Por enquanto, os resultados anteriores.")
     st.divider()
     col1, col2 = st.columns([0.4, 0.6])
 
     with col1:
         st.subheader("📌 Tópicos Identificados")
-        info = st.session_state.info_topicos.drop(columns=['Representative_Docs'], errors='ignore')
+        info = analise['info_topicos'].drop(columns=['Representative_Docs'], errors='ignore')
         info.loc[info['Topic'] == -1, 'Name'] = "-1_outros_ruido"
         st.dataframe(info.head(15), hide_index=True, use_container_width=True)
 
     with col2:
         st.subheader("📊 Relevância de Termos")
-        st.plotly_chart(st.session_state.fig_bar, use_container_width=True, theme="streamlit")
+        st.plotly_chart(analise['fig_bar'], use_container_width=True, theme="streamlit")
 
     # --- SEÇÃO: DETECÇÃO DE DUPLICADOS CORRIGIDA ---
     st.divider()
@@ -172,39 +198,45 @@ if st.session_state.analise_concluida:
 
     with st.expander("Clique para analisar duplicados semânticos (Acima de 90% de similaridade)"):
         try:
-            # Recupera os embeddings que salvamos no passo 5
-            embeddings = st.session_state.embeddings_docs
+            # Recupera os embeddings que salvamos no passo 4
+            embeddings = analise['embeddings_docs']
 
             if embeddings is None:
                 st.error("Erro: Embeddings não encontrados. Rode a análise novamente.")
             else:
-                # Calcula a similaridade (Matemática pesada feita na GPU/CPU)
-                cosine_scores = util.cos_sim(embeddings, embeddings)
-
-                duplicados = []
-                # Varre a matriz de similaridade
-                # Pegamos apenas índices onde i != j para não comparar o ticket com ele mesmo
-                pares_encontrados = set()
-
-                for i in range(len(cosine_scores)):
-                    # Threshold 0.90 = 90% de similaridade
-                    indices = (cosine_scores[i] > 0.90).nonzero(as_tuple=True)[0]
-
-                    for idx in indices:
-                        idx = idx.item()
-                        if idx > i: # Evita duplicatas (A com B e B com A) e auto-comparação
-                            duplicados.append({
-                                "Ticket A": st.session_state.df_resultados.iloc[i].get('DEMANDANTE', 'Ticket A'),
-                                "Texto A": st.session_state.df_resultados.iloc[i][coluna_texto][:150] + "...",
-                                "Ticket B": st.session_state.df_resultados.iloc[idx].get('DEMANDANTE', 'Ticket B'),
-                                "Texto B": st.session_state.df_resultados.iloc[idx][coluna_texto][:150] + "...",
-                                "Similaridade": f"{cosine_scores[i][idx]:.2%}"
-                            })
-
-                if duplicados:
-                    df_duplicados = pd.DataFrame(duplicados)
-                    st.warning(f"Foram encontrados {len(df_duplicados)} pares suspeitos.")
-                    st.dataframe(df_duplicados, use_container_width=True)
+                # Pares acima de 90% viram um grafo esparso; cada componente conexo é um
+                # grupo de duplicados com um ticket representante (ver duplicados.py)
+                resultado_duplicados = dependencias.obter_ou_calcular(
+                    artefatos.chave("duplicados", st.session_state.analise_ref, 0.90),
+                    partial(construir_duplicados, chave_analise=st.session_state.analise_ref, limiar=0.90), snap,
+                    fontes=(), depende_de=[st.session_state.analise_ref], descricao="Duplicados · " + analise['servico']
+                )
+                df_grupos = resultado_duplicados['grupos'] if resultado_duplicados else None
+
+                if resultado_duplicados is None or resultado_duplicados['versao_analise'] != analise['versao']:
+                    # A análise foi trocada entre as duas leituras: as posições dos grupos não valem para ela
+                    st.info("🔄 A análise acabou de ser refeita: os duplicados aparecem na próxima atualização da página.")
+                elif not df_grupos.empty:
+                    df_res = analise['df_resultados']
+                    textos = df_res[analise['coluna']].astype(str).str[:150] + "..."
+                    ids = df_res[dados.COL_ID].astype(str).to_numpy()
+                    rep = df_grupos['representante'].to_numpy()
+                    df_duplicados = pd.DataFrame({
+                        "Tamanho": df_grupos['tamanho'],
+                        "Representante": ids[rep],
+                        "Texto do Representante": textos.to_numpy()[rep],
+                        "Similaridade Média": df_grupos['similaridade_media'].map("{:.2%}".format),
+                        "Membros": [", ".join(ids[m]) for m in df_grupos['membros']],
+                    })
+                    st.warning(f"Foram encontrados {len(df_grupos)} grupos suspeitos "
+                               f"({int(df_grupos['tamanho'].sum())} tickets, {int(df_grupos['pares'].sum())} pares).")
+                    st.dataframe(df_duplicados, hide_index=True, use_container_width=True)
+
+                    grupo_sel = st.selectbox("Ver membros do grupo:", df_duplicados.index,
+                                             format_func=lambda g: f"{ids[rep[g]]} ({df_grupos['tamanho'][g]} tickets)")
+                    membros = df_res.iloc[df_grupos['membros'][grupo_sel]]
+                    st.dataframe(membros[[dados.COL_ID, 'DEMANDANTE', analise['coluna']]],
+                                 hide_index=True, use_container_width=True)
                 else:
                     st.success("Nenhum duplicado óbvio encontrado (acima de 90%).")
 
@@ -215,12 +247,12 @@ if st.session_state.analise_concluida:
     st.divider()
     st.subheader("🕵️ Auditoria de Chamados")
 
-    nomes_topicos = st.session_state.info_topicos['Name'].tolist()
+    nomes_topicos = analise['info_topicos']['Name'].tolist()
     sel_topico = st.selectbox("Selecione um tópico:", options=nomes_topicos)
     id_sel = int(sel_topico.split("_")[0])
 
-    view_df = st.session_state.df_resultados[st.session_state.df_resultados['TOPICO_ID'] == id_sel]
+    view_df = analise['df_resultados'][analise['df_resultados']['TOPICO_ID'] == id_sel]
     st.dataframe(
-        view_df[['DEMANDANTE', coluna_texto, 'TEXTO_LIMPO']].head(50),
+        view_df[['DEMANDANTE', analise['coluna'], 'TEXTO_LIMPO']].head(50),
         use_container_width=True
     )
\ No newline at end of file
@@ -1,86 +1,62 @@
 import streamlit as st
 import pandas as pd
-import conexao
-import torch
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+import aquecimento
+import busca
+import dados
+
+# torch/sentence_transformers são importados sob demanda (pré-carregados em segundo plano)
+aquecimento.iniciar()
 
 # --- CONFIGURAÇÃO ---
 st.set_page_config(page_title="Busca Semântica", layout="wide")
 st.title("🔍 Busca por Sentido (Semantic Search)")
 st.markdown("Encontre tickets pelo **significado**, mesmo que não usem as palavras exatas.")
 
-# Verifica GPU
-device = "cuda" if torch.cuda.is_available() else "cpu"
-if device == "cuda":
-    st.success(f"✅ GPU Ativada: {torch.cuda.get_device_name(0)}")
-else:
-    st.warning("⚠️ Rodando em CPU.")
+# Verifica GPU (preenchido quando o torch estiver carregado)
+aviso_hardware = st.empty()
 
 # --- 1. CARGA DE DADOS ---
-@st.cache_data(ttl=3600)
-def carregar_dados():
-    conn = conexao.conexao()
-    # Trazemos uma amostra de 2000 a 5000 linhas
-    return pd.read_sql("SELECT * FROM ODS_ITSM FETCH FIRST 3000 ROWS ONLY", conn)
-
-df = carregar_dados()
-if df.empty: st.stop()
+# Trazemos uma amostra de 3000 linhas (snapshot compartilhado, ver dados.py)
+snap = dados.obter_snapshot("amostra_3000")
+if snap is None or snap.df.empty: st.stop()
 
 # --- 2. PREPARAÇÃO NA BARRA LATERAL ---
 st.sidebar.header("Configuração")
 COLUNAS_PARA_PESQUISA = ['RESUMO_TICKET', 'DESCRICAO']
 # Filtra: Só mostra no seletor as colunas que EXISTEM no banco E estão na sua lista
-cols_disponiveis = [col for col in df.columns if col in COLUNAS_PARA_PESQUISA]
+cols_disponiveis = [col for col in snap.colunas if col in COLUNAS_PARA_PESQUISA]
 
 if not cols_disponiveis:
     st.error(f"❌ Nenhuma das colunas configuradas foi encontrada no banco.")
     st.write(f"Sua lista: {COLUNAS_PARA_PESQUISA}")
-    st.write(f"Colunas do Banco: {df.columns.tolist()}")
+    st.write(f"Colunas do Banco: {snap.colunas}")
     st.stop()
 
-# O Seletor mostra apenas as 3 (ou as que encontrar)
+# O Seletor mostra apenas as 3 (ou as que encontrar); com mais de uma, dá para pesquisar em todas
+OPCAO_TODAS = "🔀 Todas (fusão)"
 col_texto = st.sidebar.selectbox(
     "Onde você quer pesquisar?",
-    cols_disponiveis
+    cols_disponiveis + ([OPCAO_TODAS] if len(cols_disponiveis) > 1 else [])
 )
+cols_busca = cols_disponiveis if col_texto == OPCAO_TODAS else [col_texto]
+
+# Dois estágios: MiniLM ou BM25 no corpus inteiro + e5-large só nos melhores candidatos (ver busca.py)
+MODOS_BUSCA = {"⚡ Dois estágios (rápido)": "dois_estagios", "🎯 Só E5-Large (corpus inteiro)": "unico"}
+modo_busca = MODOS_BUSCA[st.sidebar.radio("Modo de busca:", list(MODOS_BUSCA))]
+if modo_busca == "dois_estagios":
+    estagio1 = st.sidebar.selectbox("1º estágio:", ["MiniLM", "BM25"])
 # Seleção de Coluna Automática
 #cols = df.columns.tolist()
 #idx_desc = next((i for i, c in enumerate(cols) if any(x in c.upper() for x in ['DESC', 'TEXT', 'RESUMO'])), 0)
 #col_texto = st.sidebar.selectbox("Coluna para analisar:", cols, index=idx_desc)
 
-# Limpeza Básica (importante remover vazios)
-df = df.dropna(subset=[col_texto])
-df = df[df[col_texto].astype(str).str.len() > 10]
-df.reset_index(drop=True, inplace=True) # Reseta index para alinhar com os vetores
-
-# --- 3. CARREGAR MODELO (NA GPU) ---
-@st.cache_resource
-def carregar_modelo_semantico():
-    # TROCAMOS O MODELO AQUI
-    # Sai o MiniLM, entra o E5-Large (Requer ~2GB de VRAM, sua placa sobra)
-    return SentenceTransformer('intfloat/multilingual-e5-large', device=device)
+# Todas as colunas de busca lado a lado, preparadas uma vez por snapshot: trocar
+# de coluna no seletor não relê nem recodifica nada (ver busca.py)
+corpus = busca.corpus_do_snapshot(snap, cols_disponiveis)
+df = corpus.df
 
-model = carregar_modelo_semantico()
-
-# --- 4. GERAR VETORES (EMBEDDINGS) ---
-# Isso transforma os textos dos tickets em números.
-# Cacheamos isso porque é a parte "pesada".
-# MUDANÇA: Adicionei o nome do modelo no argumento para o cache saber diferenciar
-@st.cache_data
-def gerar_embeddings_banco(_model, textos_lista, model_name="e5-large"):
-    return _model.encode(textos_lista, convert_to_tensor=True, show_progress_bar=True)
-
-# ...
-
-# Na chamada da função:
-with st.spinner("Gerando mapa semântico (Recalculando para E5-Large)..."):
-    lista_textos = df[col_texto].astype(str).tolist()
-    # Passamos o nome para forçar o Python a entender que é novo
-    embeddings_banco = gerar_embeddings_banco(model, lista_textos, "e5-large")
-
-st.divider()
-
-# --- 5. A BUSCA INTELIGENTE ---
+# --- A BUSCA INTELIGENTE (desenhada antes de carregar o modelo) ---
 col_search, col_btn = st.columns([0.8, 0.2])
 
 with col_search:
@@ -94,32 +70,77 @@ with col_btn:
     st.write("")
     buscar = st.button("🔎 Buscar", type="primary")
 
-if query:
-    # 1. Transforma sua busca em vetor
-    query_embedding = model.encode(query, convert_to_tensor=True)
+st.divider()
+
+# --- 3. CARREGAR MODELO (NA GPU) ---
+# TROCAMOS O MODELO AQUI
+# Sai o MiniLM, entra o E5-Large (Requer ~2GB de VRAM, sua placa sobra)
+# Compartilhado pelo processo e normalmente já carregado pelo aquecimento
+with st.spinner("Carregando modelo de linguagem (primeiro acesso)..."):
+    torch = aquecimento.importar("torch")
+    device = aquecimento.dispositivo()
+    model = aquecimento.modelo(aquecimento.MODELO_BUSCA, device)
+    if modo_busca == "dois_estagios" and estagio1 == "MiniLM":
+        modelo_leve = aquecimento.modelo(aquecimento.MODELO_TOPICOS, device)
+
+if device == "cuda":
+    aviso_hardware.success(f"✅ GPU Ativada: {torch.cuda.get_device_name(0)}")
+else:
+    aviso_hardware.warning("⚠️ Rodando em CPU.")
 
-    # 2. Calcula a similaridade (Matemática de Cosseno)
-    # Compara o vetor da sua busca contra TODOS os vetores do banco instantaneamente
-    scores = util.cos_sim(query_embedding, embeddings_banco)[0]
+# --- 4. GERAR VETORES (EMBEDDINGS) ---
+# Isso transforma os textos dos tickets em números, de TODAS as colunas de uma vez,
+# em segundo plano. A matriz é calculada uma vez por (modelo, textos) e, com vários
+# processos, compartilhada via /dev/shm (ver compartilhado.py).
+# Vetores normalizados: a similaridade de cosseno vira um produto escalar.
+def aguardar_vetores(futuro, mensagem):
+    # Sem consulta não há por que bloquear a página: os vetores ficam prontos para a próxima
+    if not futuro.done() and not query:
+        st.caption(f"⏳ {mensagem} (em segundo plano)")
+        st.stop()
+    with st.spinner(mensagem):
+        return futuro.result()
+
+if modo_busca == "unico":
+    embeddings_banco = aguardar_vetores(busca.vetores_corpus(corpus, model, "e5-large"),
+                                        "Gerando mapa semântico (E5-Large)...")
+elif estagio1 == "MiniLM":
+    # O corpus inteiro passa só pelo modelo leve; o e5-large vê apenas os candidatos
+    embeddings_leves = aguardar_vetores(busca.vetores_corpus(corpus, modelo_leve, aquecimento.MODELO_TOPICOS),
+                                        "Gerando mapa semântico (MiniLM)...")
+    primeiro_estagio = busca.estagio_vetorial(modelo_leve, aquecimento.MODELO_TOPICOS, corpus, embeddings_leves)
+else:
+    primeiro_estagio = busca.estagio_bm25(corpus)
 
-    # 3. Organiza os resultados (Top Hits)
-    # Pega os índices dos top 20 mais parecidos
-    top_results = torch.topk(scores, k=50)
+# --- 5. RESULTADOS ---
+if query:
+    # 1. Transforma sua busca em vetor e 2. calcula a similaridade (produto escalar)
+    # contra TODOS os vetores do banco, pegando os top 50. Consultas repetidas
+    # (de qualquer sessão) saem do cache, sem rodar o modelo. Com várias colunas,
+    # cada ticket fica com o score do campo mais parecido (ver busca.py)
+    if modo_busca == "unico":
+        top_idx, top_scores, top_campos = busca.buscar(model, "e5-large", query, corpus, embeddings_banco, cols_busca, k=50)
+        top_reavaliados = np.ones(len(top_idx), dtype=bool)
+    else:
+        top_idx, top_scores, top_campos, top_reavaliados = busca.buscar_dois_estagios(
+            primeiro_estagio, estagio1.lower(), model, "e5-large", query, corpus, cols_busca, k=50
+        )
 
     st.subheader("Resultados por Similaridade")
 
     resultados = []
-    for score, idx in zip(top_results[0], top_results[1]):
-        idx = idx.item() # Converte tensor para int
-        score = score.item() # Converte tensor para float
+    for idx, score, campo, reavaliado in zip(top_idx.tolist(), top_scores.tolist(), top_campos.tolist(), top_reavaliados.tolist()):
 
         # Filtra apenas o que tiver o mínimo de sentido (> 0.3 de similaridade)
-        if score > 0.3:
+        # (candidatos que o orçamento não deixou o e5-large reavaliar vêm no fim, com o score do 1º estágio,
+        # que não está na mesma escala: aparecem sem o filtro e sem a porcentagem)
+        if score > 0.3 or not reavaliado:
             row = df.iloc[idx]
             resultados.append({
-                "Similaridade (%)": f"{score*100:.1f}%",
+                "Similaridade (%)": f"{score*100:.1f}%" if reavaliado else f"— (1º estágio: {score:.2f})",
                 "Demandante": row.get('DEMANDANTE', '-'),
-                "Texto Original": row[col_texto],
+                "Campo": cols_busca[campo],
+                "Texto Original": row[cols_busca[campo]],
                 "SubTicket": row['TICKET_SUBTICKET']
             })
 
@@ -1,7 +1,10 @@
 import streamlit as st
-import pandas as pd
-import conexao
 import dashboards
+import exportacao
+import metricas
+import motor_consulta
+import resolucao
+import tabela
 import datetime
 
 # --- CONFIGURAÇÃO ---
@@ -15,60 +18,54 @@ NOME_COLUNA_CONTRATO = "NUMEROCONTRATO"
 # ========================================================
 
 # --- CARGA DE DADOS ---
-@st.cache_data(ttl=3600)
-def carregar_dados():
-    conn = conexao.conexao()
-    try:
-        return pd.read_sql("SELECT * FROM ODS_ITSM", conn)
-    except Exception as e:
-        st.error(f"Erro SQL: {e}")
-        return pd.DataFrame()
-
-df = carregar_dados()
-if df.empty: st.stop()
+# Snapshot compartilhado entre sessões; atualizado em segundo plano (ver dados.py).
+# No modo agregado (CITSM_MODO_AGREGADO) os gráficos saem do banco até o snapshot ficar pronto.
+motor, snap = motor_consulta.motor_atual("completo")
+if motor is None or (snap is not None and snap.df.empty): st.stop()
+
+# Percentis do tempo de resolução: só os tickets fechados desde a última atualização entram
+if snap is not None:
+    resolucao.atualizar(snap)
+else:
+    resolucao.atualizar_do_banco()
+
+# Colunas exibidas no detalhamento (SUMMARY fica no armazém de textos: só é lida para a página visível)
+COLS_TABELA = ['TICKET_PRINCIPAL', 'DTABERTURA', 'STATUS', 'DEMANDANTE', NOME_COLUNA_CONTRATO, 'SUMMARY']
+COLS_LONGAS = ['SUMMARY']
 
 # --- VERIFICAÇÃO DE SEGURANÇA ---
-if NOME_COLUNA_CONTRATO not in df.columns:
+if snap is not None and NOME_COLUNA_CONTRATO not in snap.df.columns:
     st.error(f"⚠️ A coluna '{NOME_COLUNA_CONTRATO}' não existe! Verifique se está escrita corretamente.")
     st.stop()
 
-# --- TRATAMENTO ---
-cols_data = ['DTABERTURA', 'DTULTIMAMODIFICACAO', 'DTFIM']
-for col in cols_data:
-    if col in df.columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
-
-# Garante strings limpas (IMPORTANTE PARA O CONTRATO)
-cols_texto = ['DEMANDANTE', 'STATUS', 'NOMESERVICO', NOME_COLUNA_CONTRATO]
-for col in cols_texto:
-    if col in df.columns:
-        # Converte para string e remove espaços (.0 se for número)
-        df[col] = df[col].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
-
 # ==========================================
 # 🔻 FILTROS EM CASCATA (LINHARES) 🔻
 # ==========================================
 st.sidebar.header("🔍 Filtros")
 
+# Motor de consulta: o do snapshot (índices por padrão; ver CITSM_MOTOR) ou MotorBanco
+
 # --- 1. DATA (Primeiro filtro) ---
-min_date = df['DTABERTURA'].min().date()
-max_date = df['DTABERTURA'].max().date()
+min_date, max_date = motor.intervalo_datas()
 
 periodo = st.sidebar.date_input("1. Período:", (min_date, max_date), min_value=min_date, max_value=max_date)
 
-if isinstance(periodo, tuple) and len(periodo) == 2:
-    inicio, fim = periodo
-    df_etapa1 = df[(df['DTABERTURA'].dt.date >= inicio) & (df['DTABERTURA'].dt.date <= fim)]
-else:
-    df_etapa1 = df.copy()
+with metricas.medir(f"dashboard.filtro_periodo.{motor.nome}") as m:
+    if isinstance(periodo, tuple) and len(periodo) == 2:
+        inicio, fim = periodo
+        filtros = motor_consulta.Filtros(inicio=inicio, fim=fim)
+    else:
+        filtros = motor_consulta.Filtros()
+    m.linhas = motor.total(filtros)
 
-if df_etapa1.empty:
+if m.linhas == 0:
     st.warning("Sem dados neste período.")
     st.stop()
 
 # --- 2. CONTRATO (Agora é Selectbox único) ---
 # Pega apenas contratos que existem na data filtrada
-opcoes_contratos = sorted(df_etapa1[NOME_COLUNA_CONTRATO].unique())
+with metricas.medir(f"dashboard.opcoes_contrato.{motor.nome}"):
+    opcoes_contratos = motor.opcoes(NOME_COLUNA_CONTRATO, filtros)
 
 contrato_sel = st.sidebar.selectbox(
     "2. Contrato:",
@@ -76,11 +73,12 @@ contrato_sel = st.sidebar.selectbox(
 )
 
 # Filtra para o próximo passo
-df_etapa2 = df_etapa1[df_etapa1[NOME_COLUNA_CONTRATO] == contrato_sel]
+filtros = filtros.com(contrato=contrato_sel)
 
 # --- 3. SERVIÇO (Depende do Contrato) ---
 # Pega apenas serviços que existem no contrato selecionado
-opcoes_servicos = sorted(df_etapa2['NOMESERVICO'].unique())
+with metricas.medir(f"dashboard.opcoes_servico.{motor.nome}"):
+    opcoes_servicos = motor.opcoes('NOMESERVICO', filtros)
 
 # Tenta deixar 'Sustenta' selecionado se existir na lista
 idx_serv = next((i for i, s in enumerate(opcoes_servicos) if "Sustenta" in str(s)), 0)
@@ -92,30 +90,61 @@ servico_sel = st.sidebar.selectbox(
 )
 
 # Filtro Final
-df_final = df_etapa2[df_etapa2['NOMESERVICO'] == servico_sel]
+with metricas.medir(f"dashboard.filtro_servico.{motor.nome}") as m:
+    filtros = filtros.com(servico=servico_sel)
+    total_final = m.linhas = motor.total(filtros)
 
 # ==========================================
 # 📊 VISUALIZAÇÃO
 # ==========================================
-st.markdown(f"**Contrato:** {contrato_sel} | **Serviço:** {servico_sel} | **Chamados:** {len(df_final)}")
+st.markdown(f"**Contrato:** {contrato_sel} | **Serviço:** {servico_sel} | **Chamados:** {total_final}")
 st.divider()
 
-if df_final.empty:
+if total_final == 0:
     st.warning("Nenhum registro encontrado.")
     st.stop()
 
 # Gráficos
-filtro_dem, filtro_stat = dashboards.renderizar_paineis_interativos(df_final)
+filtro_dem, filtro_stat = dashboards.renderizar_paineis_interativos(motor=motor, filtros=filtros)
+
+dashboards.renderizar_tempo_resolucao(filtros.com(status=(filtro_stat,) if filtro_stat else None))
+
+# Cross-filtering dos gráficos (vale para a tabela e para a exportação)
+filtros_tabela = filtros.com(demandante=filtro_dem, status=(filtro_stat,) if filtro_stat else None)
+nome_exportacao = f"chamados_{datetime.date.today():%Y%m%d}"
 
 # Tabela Detalhada
 st.subheader("📋 Detalhamento")
-df_tabela = df_final.copy()
 
-# Cross-filtering dos gráficos
-if filtro_dem: df_tabela = df_tabela[df_tabela['DEMANDANTE'] == filtro_dem]
-if filtro_stat: df_tabela = df_tabela[df_tabela['STATUS'] == filtro_stat]
+if snap is None:
+    # Sem snapshot, a exportação lê direto do banco (em blocos)
+    dashboards.renderizar_exportacao(
+        lambda: exportacao.blocos_banco(motor, filtros_tabela), motor.total(filtros_tabela), nome_exportacao
+    )
+    st.info("⏳ Carregando a base completa em segundo plano: o detalhamento aparece assim que ela estiver pronta.")
+    st.stop()
+
+# Ordem pré-calculada uma vez por snapshot para cada coluna ordenável da tabela
+ordenacoes = snap.derivado(
+    "ordenacoes_detalhamento",
+    lambda d: tabela.calcular_ordenacoes(d, [c for c in COLS_TABELA if c not in COLS_LONGAS])
+)
+
+with metricas.medir(f"dashboard.filtro_cliques.{motor.nome}") as m:
+    posicoes = motor.posicoes(filtros_tabela)
+    m.linhas = len(posicoes)
 
 # Colunas para exibir
-cols_view = [c for c in ['TICKET_PRINCIPAL', 'DTABERTURA', 'STATUS', 'DEMANDANTE', NOME_COLUNA_CONTRATO, 'SUMMARY'] if c in df_tabela.columns]
+cols_view = [c for c in COLS_TABELA if c in snap.colunas]
 
-st.dataframe(df_tabela[cols_view].sort_values('DTABERTURA', ascending=False).head(500), use_container_width=True)
\ No newline at end of file
+# Paginação no servidor: só a página visível é enviada ao navegador
+posicoes_ordenadas = tabela.renderizar_tabela_paginada(
+    snap.df, posicoes, ordenacoes, cols_view,
+    colunas_longas=COLS_LONGAS, key="detalhamento", ler_textos=snap.ler_textos
+)
+
+# Exportação do filtro inteiro (não só a página), na ordem da tabela: gerada em blocos quando o botão é clicado
+dashboards.renderizar_exportacao(
+    lambda: exportacao.blocos_snapshot(snap, posicoes_ordenadas), len(posicoes), nome_exportacao,
+    tipos=exportacao.tipos_snapshot(snap)
+)
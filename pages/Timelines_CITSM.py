@@ -1,7 +1,7 @@
 import streamlit as st
-import pandas as pd
-import conexao
-import timelines
+import anomalias
+import metricas
+import motor_consulta
 import timelines
 
 st.set_page_config(page_title="Timelines", layout="wide")
@@ -9,30 +9,26 @@ st.set_page_config(page_title="Timelines", layout="wide")
 st.title("⏳ Análise Temporal e Backlog")
 
 # --- REUTILIZAÇÃO DA CARGA DE DADOS ---
-# O cache faz com que o Python não precise ir no banco de novo
-@st.cache_data(ttl=3600)
-def carregar_dados():
-    conn = conexao.conexao()
-    try:
-        return pd.read_sql("SELECT * FROM ODS_ITSM", conn)
-    except Exception as e:
-        return pd.DataFrame()
-
-df = carregar_dados()
-if df.empty: st.stop()
+# Mesmo snapshot (já tratado) da página de Dashboard: o banco não é consultado de novo
+# (no modo agregado, até ele ficar pronto, as séries vêm de GROUP BY no banco)
+motor, snap = motor_consulta.motor_atual("completo")
+if motor is None or (snap is not None and snap.df.empty): st.stop()
 
-# --- TRATAMENTO ---
-for col in ['DTABERTURA', 'DTULTIMAMODIFICACAO', 'DTFIM']:
-    if col in df.columns: df[col] = pd.to_datetime(df[col], errors='coerce')
-if 'DEMANDANTE' in df.columns: df['DEMANDANTE'] = df['DEMANDANTE'].astype(str).str.strip()
+# Só os tickets abertos depois da última atualização alimentam o detector de picos (ver anomalias.py)
+if snap is not None:
+    anomalias.atualizar(snap)
+else:
+    anomalias.atualizar_do_banco()
 
 # --- FILTROS (Independente da outra página) ---
 st.sidebar.header("Filtros Timelines")
-lista_servicos = df['NOMESERVICO'].unique()
+lista_servicos = motor.opcoes('NOMESERVICO', motor_consulta.Filtros())
 idx = next((i for i, s in enumerate(lista_servicos) if "Sustenta" in str(s)), 0)
 servico_sel = st.sidebar.selectbox("Serviço Analisado:", lista_servicos, index=idx)
 
-df_servico = df[df['NOMESERVICO'] == servico_sel]
+with metricas.medir(f"timelines.filtro_servico.{motor.nome}") as m:
+    filtros = motor_consulta.Filtros(servico=servico_sel)
+    m.linhas = motor.total(filtros)
 
 # --- CHAMADA DO MÓDULO DE TIMELINES ---
-timelines.renderizar_timelines(df_servico)
\ No newline at end of file
+timelines.renderizar_timelines(motor=motor, filtros=filtros)
\ No newline at end of file
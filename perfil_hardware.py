@@ -0,0 +1,185 @@
+"""
+Perfil de execução dos modelos de IA ajustado ao hardware do servidor.
+
+O perfil é medido pelo calibrar_hardware.py e gravado em disco. O app lê o
+arquivo (na subida ou no primeiro modelo carregado) e o aplica se foi medido
+neste mesmo hardware: threads do torch, lote e tamanho máximo de sequência por
+modelo, precisão e quantos `encode` podem rodar ao mesmo tempo no processo.
+Sem perfil válido, o app aplica um perfil derivado do hardware (threads =
+CPUs / encodes simultâneos) e dispara a calibração num subprocesso de baixa
+prioridade; o perfil medido vale a partir da próxima subida.
+
+Uso:
+    python teste_gpu.py              # só o hardware
+    python calibrar_hardware.py      # mede e grava o perfil
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import metricas
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ PERFIL (medido pelo calibrar_hardware.py e gravado em disco)
+# ========================================================
+ARQ_PERFIL = os.environ.get("CITSM_PERFIL_HARDWARE") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "perfil_hardware.json")
+VALIDADE_PERFIL_DIAS = 30
+MAX_SEQ_CPU = 256                     # sem perfil: tickets raramente passam disso; na CPU a atenção cresce com o quadrado
+LOTE_PADRAO = 32
+CPUS_POR_ENCODE = 4                   # sem perfil (CPU): um encode simultâneo a cada 4 CPUs, até ENCODES_MAXIMO_PADRAO
+ENCODES_MAXIMO_PADRAO = 4
+VRAM_POR_ENCODE_GB = 4                # GPU: um encode simultâneo a cada 4 GB de VRAM
+CALIBRAR_SEM_PERFIL = True            # sem perfil válido: roda o calibrar_hardware.py em segundo plano (baixa prioridade)
+INTERVALO_CALIBRACAO_HORAS = 6        # não dispara de novo antes disso (vários processos, calibração que falhou)
+# ========================================================
+
+_perfil = None
+_lido = False       # o arquivo já foi lido neste processo (com ou sem perfil válido)
+_semaforo = threading.BoundedSemaphore(1)
+_trava = threading.Lock()
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def sondar(torch):
+    """O que o processo enxerga do hardware (o mesmo que o teste_gpu.py sempre mostrou)."""
+    hw = {"dispositivo": "cpu", "placa": None, "vram_gb": 0.0, "cpus": _cpus(),
+          "processador": platform.processor() or platform.machine(), "torch": torch.__version__}
+    if torch.cuda.is_available():
+        hw["dispositivo"] = "cuda"
+        hw["placa"] = torch.cuda.get_device_name(0)
+        hw["vram_gb"] = round(torch.cuda.get_device_properties(0).total_memory / 1024**3, 1)
+    return hw
+
+
+def _mesmo_hardware(a, b):
+    return all(a.get(c) == b.get(c) for c in ("dispositivo", "placa", "cpus", "processador", "torch"))
+
+
+def carregar(hw):
+    """Perfil gravado, se foi medido neste hardware e ainda está na validade; senão None."""
+    try:
+        with open(ARQ_PERFIL, encoding="utf-8") as f:
+            perfil = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not _mesmo_hardware(perfil.get("hardware", {}), hw):
+        return None
+    if time.time() - perfil.get("criado_em", 0) > VALIDADE_PERFIL_DIAS * 86400:
+        return None
+    return perfil
+
+
+def perfil_padrao(hw):
+    """Perfil derivado do hardware, sem medição: os encodes simultâneos dividem as CPUs entre si."""
+    if hw["dispositivo"] == "cpu":
+        encodes = max(1, min(ENCODES_MAXIMO_PADRAO, hw["cpus"] // CPUS_POR_ENCODE))
+    else:
+        encodes = max(1, int(hw["vram_gb"] // VRAM_POR_ENCODE_GB))
+    return {
+        "criado_em": None, "hardware": hw, "padrao": True,
+        "precisao": "float32" if hw["dispositivo"] == "cpu" else "float16",
+        "threads": max(1, hw["cpus"] // encodes), "encodes_simultaneos": encodes, "modelos": {},
+    }
+
+
+def _calibrar_em_segundo_plano():
+    """Dispara o calibrar_hardware.py com prioridade baixa (um por servidor: marca em disco com a hora)."""
+    marca = f"{ARQ_PERFIL}.calibrando"
+    try:
+        if time.time() - os.path.getmtime(marca) < INTERVALO_CALIBRACAO_HORAS * 3600:
+            return
+    except OSError:
+        pass
+    try:
+        with open(marca, "w") as f:
+            f.write(str(os.getpid()))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibrar_hardware.py")
+        if os.name == "nt":
+            opcoes = {"creationflags": subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+        else:
+            opcoes = {"preexec_fn": lambda: os.nice(19)}
+        subprocess.Popen([sys.executable, script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **opcoes)
+        log.info("Calibração do hardware disparada em segundo plano (%s)", script)
+    except OSError:
+        log.exception("Falha ao disparar a calibração do hardware")
+
+
+def aplicar(torch, perfil):
+    """Passa a usar o perfil no processo: threads do torch e limite de encodes simultâneos."""
+    global _perfil, _semaforo
+    with _trava:
+        torch.set_num_threads(perfil["threads"])
+        _semaforo = threading.BoundedSemaphore(perfil["encodes_simultaneos"])
+        _perfil = perfil
+    log.info("Perfil de hardware: %s threads, %s encode(s) simultâneo(s), %s",
+             perfil["threads"], perfil["encodes_simultaneos"], perfil["precisao"])
+
+
+def iniciar(torch):
+    """Lê e aplica o perfil gravado para este hardware (ou o derivado, sem ele), uma vez por processo."""
+    global _lido
+    with _trava:
+        if _lido:
+            return _perfil
+        _lido = True
+    hw = sondar(torch)
+    perfil = carregar(hw)
+    if perfil is None:
+        log.info("Sem perfil de hardware válido em %s; usando o derivado do hardware até a calibração", ARQ_PERFIL)
+        perfil = perfil_padrao(hw)
+        if CALIBRAR_SEM_PERFIL:
+            _calibrar_em_segundo_plano()
+    aplicar(torch, perfil)
+    return perfil
+
+
+def atual():
+    """Perfil em uso (None enquanto não houver)."""
+    return _perfil
+
+
+def ajustar_modelo(model, hw, nome=None):
+    """Tamanho máximo de sequência (o calibrado, se houver) e precisão do modelo de acordo com o hardware."""
+    calibrado = (_perfil or {}).get("modelos", {}).get(nome, {}).get("max_seq")
+    if calibrado:
+        model.max_seq_length = calibrado
+    elif hw["dispositivo"] == "cpu":
+        model.max_seq_length = min(model.max_seq_length or MAX_SEQ_CPU, MAX_SEQ_CPU)
+    if hw["dispositivo"] != "cpu" and (_perfil is None or _perfil["precisao"] == "float16"):
+        model.half()
+    return model
+
+
+def lote(nome):
+    """Tamanho de lote calibrado para o modelo (ou o padrão, antes da calibração)."""
+    perfil = _perfil
+    if perfil is None or nome not in perfil["modelos"]:
+        return LOTE_PADRAO
+    return perfil["modelos"][nome]["lote"]
+
+
+@contextmanager
+def codificando():
+    """Limita quantos `encode` rodam ao mesmo tempo (a espera vai para as métricas)."""
+    semaforo = _semaforo
+    with metricas.medir("modelo.fila_encode"):
+        semaforo.acquire()
+    try:
+        yield
+    finally:
+        semaforo.release()
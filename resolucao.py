@@ -0,0 +1,233 @@
+"""
+Tempo de resolução (DTFIM - DTABERTURA) em percentis, para qualquer combinação
+de filtros, sem ordenar o histórico a cada consulta.
+
+Cada célula (contrato, serviço, status, mês de abertura) guarda um DDSketch:
+contagens por balde logarítmico, com erro relativo de no máximo
+PRECISAO_RELATIVA em qualquer quantil. Sketches se somam, então os percentis
+de um filtro saem da soma dos baldes das células que ele cobre.
+
+Cada ticket contado guarda a sua célula e o seu balde (pelo id, COL_ID). A
+cada atualização, o estado atual dos tickets é comparado com o contado: um
+ticket que mudou de status ou de DTFIM sai da contribuição antiga e entra na
+nova, e um reaberto (sem DTFIM) sai. Com snapshot, a comparação é com o
+snapshot inteiro; no modo agregado, com os tickets modificados desde a marca
+d'água (maior DTULTIMAMODIFICACAO já vista).
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import conexao
+import dados
+import metricas
+from motor_consulta import COL_CONTRATO
+
+log = logging.getLogger(__name__)
+
+# ========================================================
+# ⚙️ PERCENTIS DO TEMPO DE RESOLUÇÃO
+# ========================================================
+PRECISAO_RELATIVA = 0.01      # erro relativo máximo de cada percentil
+QUANTIS = (0.5, 0.9, 0.99)
+MINIMO_HORAS = 1 / 60         # resoluções abaixo de 1 minuto contam como zero
+CHAVES_CELULA = [COL_CONTRATO, 'NOMESERVICO', 'STATUS']   # + mês de abertura
+INTERVALO_BANCO_SEGUNDOS = 300   # modo agregado: de quanto em quanto tempo buscar os tickets fechados
+# ========================================================
+
+GAMMA = (1 + PRECISAO_RELATIVA) / (1 - PRECISAO_RELATIVA)
+_LOG_GAMMA = np.log(GAMMA)
+BALDE_ZERO = np.iinfo(np.int32).min
+
+
+def baldes(horas):
+    """Balde de cada duração: ceil(log_gamma(h)); durações ~0 vão para BALDE_ZERO."""
+    horas = np.asarray(horas, dtype=np.float64)
+    indices = np.full(len(horas), BALDE_ZERO, dtype=np.int32)
+    positivas = horas >= MINIMO_HORAS
+    indices[positivas] = np.ceil(np.log(horas[positivas]) / _LOG_GAMMA)
+    return indices
+
+
+def quantis(contagens, qs=QUANTIS):
+    """
+    Percentis a partir de um sketch (Series balde -> contagem, já somado entre
+    células). Cada balde é representado pelo ponto de erro relativo mínimo.
+    """
+    contagens = contagens[contagens > 0].sort_index()
+    total = contagens.sum()
+    if total == 0:
+        return {q: np.nan for q in qs}
+    acumulado = contagens.cumsum().to_numpy()
+    indices = contagens.index.to_numpy()
+    resultado = {}
+    for q in qs:
+        i = indices[np.searchsorted(acumulado, q * (total - 1), side="right")]
+        resultado[q] = 0.0 if i == BALDE_ZERO else 2 * GAMMA ** i / (GAMMA + 1)
+    return resultado
+
+
+class SketchesResolucao:
+    """
+    Todas as células em uma tabela longa (chaves, mês, balde, n), compactada a
+    cada atualização, mais a célula e o balde de cada ticket já contado.
+    """
+
+    def __init__(self):
+        self.marca = None     # maior DTULTIMAMODIFICACAO (ou DTFIM) consumida
+        self.versao = None
+        self.celulas = pd.DataFrame(columns=[*CHAVES_CELULA, 'MES', 'BALDE', 'N'])
+        self.contados = pd.DataFrame(columns=[*CHAVES_CELULA, 'MES', 'BALDE'])   # índice: COL_ID
+
+    @staticmethod
+    def _fechados(df):
+        """Célula e balde de cada ticket fechado de `df` (índice: COL_ID)."""
+        fechados = df[df['DTFIM'].notna() & df['DTABERTURA'].notna()]
+        horas = (fechados['DTFIM'] - fechados['DTABERTURA']).dt.total_seconds().to_numpy() / 3600
+        fechados, horas = fechados[horas >= 0], horas[horas >= 0]  # datas invertidas ficam de fora
+        linhas = fechados[CHAVES_CELULA].assign(
+            MES=fechados['DTABERTURA'].dt.to_period('M').dt.start_time, BALDE=baldes(horas))
+        linhas.index = pd.Index(fechados[dados.COL_ID].to_numpy(), name=dados.COL_ID)
+        return linhas[~linhas.index.duplicated(keep='last')]
+
+    def consumir(self, df, completo=False):
+        """
+        Atualiza as células com o estado atual dos tickets de `df`: os fechados
+        entram (ou trocam a contribuição antiga, se a célula ou o balde mudou) e
+        os contados que não estão mais fechados saem. Com `completo` (`df` é o
+        snapshot inteiro), saem também os contados que não estão em `df`.
+        Retorna quantos tickets entraram ou saíram.
+        """
+        fechados = self._fechados(df)
+        if completo:
+            saem = self.contados.index.difference(fechados.index)
+        else:
+            saem = self.contados.index.intersection(pd.Index(df[dados.COL_ID].to_numpy())).difference(fechados.index)
+        ja_contados = fechados.index.intersection(self.contados.index)
+        iguais = (fechados.loc[ja_contados].to_numpy() == self.contados.loc[ja_contados, fechados.columns].to_numpy()).all(axis=1)
+        trocam = ja_contados[~iguais]
+        entram = fechados.index.difference(self.contados.index).append(trocam)
+        retirados = saem.append(trocam)
+        self._avancar_marca(df)
+        if not len(entram) and not len(retirados):
+            return 0
+
+        # Células são somas: juntar o delta (-1 na contribuição antiga, +1 na nova) é concatenar e somar de novo
+        partes = [self.celulas, self.contados.loc[retirados].assign(N=-1), fechados.loc[entram].assign(N=1)]
+        base = pd.concat([p for p in partes if len(p)], ignore_index=True)
+        celulas = base.groupby([*CHAVES_CELULA, 'MES', 'BALDE'], observed=True, as_index=False)['N'].sum()
+        self.celulas = celulas[celulas['N'] > 0].reset_index(drop=True)
+        contados = self.contados.drop(retirados)
+        self.contados = pd.concat([contados, fechados.loc[entram]]) if len(contados) else fechados.loc[entram]
+        return len(entram) + len(saem)
+
+    def _avancar_marca(self, df):
+        datas = [df[c].max() for c in ('DTULTIMAMODIFICACAO', 'DTFIM') if c in df.columns and df[c].notna().any()]
+        if datas:
+            self.marca = max(datas) if self.marca is None else max(self.marca, *datas)
+
+    @staticmethod
+    def _mascara(c, filtros):
+        mascara = np.ones(len(c), dtype=bool)
+        # Período em meses inteiros de abertura (granularidade das células)
+        if filtros.inicio:
+            mascara &= (c['MES'] >= pd.Timestamp(filtros.inicio).to_period('M').start_time).to_numpy()
+        if filtros.fim:
+            mascara &= (c['MES'] <= pd.Timestamp(filtros.fim)).to_numpy()
+        for col, valor in ((COL_CONTRATO, filtros.contrato), ('NOMESERVICO', filtros.servico)):
+            if valor is not None:
+                mascara &= (c[col] == valor).to_numpy()
+        if filtros.status:
+            mascara &= c['STATUS'].isin(filtros.status).to_numpy()
+        return mascara
+
+    def percentis(self, filtros, por=None):
+        """
+        {q: horas} e total de tickets fechados do filtro (demandante e 'apenas
+        abertos' não entram: não são chaves das células). Com `por`, um DataFrame
+        com os percentis de cada valor dessa coluna.
+        """
+        celulas = self.celulas  # substituída (não alterada) a cada atualização
+        selecionadas = celulas[self._mascara(celulas, filtros)]
+        if por is None:
+            sketch = selecionadas.groupby('BALDE')['N'].sum()
+            return quantis(sketch), int(sketch.sum())
+        linhas = []
+        for valor, grupo in selecionadas.groupby(por, observed=True):
+            sketch = grupo.groupby('BALDE')['N'].sum()
+            linhas.append({por: valor, "tickets": int(sketch.sum()),
+                           **{f"p{int(q * 100)}_h": h for q, h in quantis(sketch).items()}})
+        return pd.DataFrame(linhas)
+
+
+_sketches = SketchesResolucao()
+_ultima_busca_banco = 0.0
+_trava = threading.Lock()
+_trava_banco = threading.Lock()   # uma busca no banco por vez (a leitura fica fora de _trava)
+
+
+def atualizar(snap):
+    """Compara os contados com o snapshot inteiro (uma vez por versão do snapshot); ver SketchesResolucao.consumir."""
+    with _trava:
+        if _sketches.versao == snap.versao:
+            return 0
+        with metricas.medir("resolucao.atualizar") as m:
+            m.linhas = _sketches.consumir(snap.df, completo=True)
+        _sketches.versao = snap.versao
+        return m.linhas
+
+
+def _semear(conn, sql):
+    """Primeira carga: os fechados em faixas mensais de DTABERTURA (as da extração particionada)."""
+    semente = SketchesResolucao()
+    sql += "DTFIM IS NOT NULL AND DTABERTURA >= :ini AND DTABERTURA < :fim"
+    for ini, fim in dados.faixas_mensais(conn):
+        binds = {"ini": conexao.valor_data(ini), "fim": conexao.valor_data(fim)}
+        semente.consumir(dados.normalizar(pd.read_sql(sql, conn, params=binds)))
+    return semente
+
+
+def atualizar_do_banco():
+    """
+    Modo agregado (sem snapshot): na primeira vez lê o histórico mês a mês;
+    depois, os tickets modificados desde a marca (fechados, reabertos ou com
+    outro status). Lê direto do banco (não do cache de agregados: são linhas,
+    não um agregado pequeno).
+    """
+    global _sketches, _ultima_busca_banco
+    sql = (f"SELECT {dados.COL_ID}, DTABERTURA, DTULTIMAMODIFICACAO, DTFIM, {', '.join(CHAVES_CELULA)} "
+           f"FROM ODS_ITSM WHERE ")
+    with _trava_banco:
+        if time.time() - _ultima_busca_banco < INTERVALO_BANCO_SEGUNDOS:
+            return 0
+        _ultima_busca_banco = time.time()
+        marca = _sketches.marca
+        with metricas.medir("resolucao.atualizar") as m:
+            try:
+                with conexao.conexao_pool() as conn:
+                    if marca is None:
+                        semente = _semear(conn, sql)
+                    else:
+                        novos = dados.normalizar(pd.read_sql(
+                            sql + "DTULTIMAMODIFICACAO >= :marca", conn, params={"marca": conexao.valor_data(marca)}))
+            except Exception:
+                log.exception("Resolução: falha ao buscar os tickets fechados")
+                return 0
+            with _trava:
+                if marca is None:
+                    # Só entra inteira: uma carga pela metade deixaria a marca à frente dos meses não lidos
+                    if _sketches.marca is None:
+                        _sketches = semente
+                    m.linhas = len(semente.contados)
+                else:
+                    m.linhas = _sketches.consumir(novos)
+            return m.linhas
+
+
+def percentis(filtros, por=None):
+    """Percentis do tempo de resolução (horas) do filtro; ver SketchesResolucao.percentis."""
+    with metricas.medir("resolucao.percentis"):
+        return _sketches.percentis(filtros, por)
@@ -0,0 +1,86 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+import dados
+import metricas
+
+TAMANHOS_PAGINA = [50, 100, 250, 500]
+
+
+def calcular_ordenacoes(df, colunas):
+    """
+    Pré-calcula a ordem (crescente) das linhas para cada coluna ordenável.
+    Retorna: {coluna: (posicoes_ordenadas, qtd_nulos)} — os nulos ficam sempre no fim.
+    """
+    ordenacoes = {}
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        valores = df[col].reset_index(drop=True)
+        ordem = valores.sort_values(na_position="last", kind="stable").index.to_numpy()
+        ordenacoes[col] = (ordem, int(valores.isna().sum()))
+    return ordenacoes
+
+
+def ordenar_posicoes(ordenacao, posicoes, total_linhas, crescente=True):
+    """
+    Filtra a ordem pré-calculada para as linhas do filtro atual (O(n), sem sort).
+    `posicoes` são as posições das linhas filtradas dentro do DataFrame base.
+    """
+    ordem, qtd_nulos = ordenacao
+    if not crescente:
+        corte = len(ordem) - qtd_nulos
+        ordem = np.concatenate([ordem[:corte][::-1], ordem[corte:]])
+
+    mascara = np.zeros(total_linhas, dtype=bool)
+    mascara[posicoes] = True
+    return ordem[mascara[ordem]]
+
+
+def renderizar_tabela_paginada(df_base, posicoes, ordenacoes, colunas, colunas_longas=(), ordem_padrao="DTABERTURA",
+                               key="tabela", ler_textos=None):
+    """
+    Exibe uma página por vez do conjunto filtrado, usando a ordem pré-calculada.
+    Colunas longas (ex.: SUMMARY) só são lidas para as linhas da página visível,
+    via `ler_textos(coluna, posicoes)` (ex.: Snapshot.ler_textos) ou do próprio df_base.
+    Retorna as posições do filtro na ordem exibida (ex.: para a exportação).
+    """
+    if ler_textos is None:
+        def ler_textos(col, pos):
+            return dados.valores_nas_posicoes(df_base[col], pos)
+    total = len(posicoes)
+    cols_ordenaveis = [c for c in colunas if c in ordenacoes]
+
+    c_ord, c_dir, c_tam, c_pag = st.columns([0.35, 0.2, 0.2, 0.25])
+    # Sem coluna ordenável entre as exibidas, as linhas ficam na ordem recebida
+    col_ordem, decrescente = None, False
+    if cols_ordenaveis:
+        idx_ordem = cols_ordenaveis.index(ordem_padrao) if ordem_padrao in cols_ordenaveis else 0
+        col_ordem = c_ord.selectbox("Ordenar por:", cols_ordenaveis, index=idx_ordem, key=f"{key}_ordem")
+        decrescente = c_dir.radio("Ordem:", ["Decrescente", "Crescente"], horizontal=True, key=f"{key}_dir") == "Decrescente"
+    tamanho = c_tam.selectbox("Linhas por página:", TAMANHOS_PAGINA, index=1, key=f"{key}_tam")
+
+    total_paginas = max((total + tamanho - 1) // tamanho, 1)
+    # Se o filtro mudou e a página guardada não existe mais, volta para a primeira
+    if st.session_state.get(f"{key}_pag", 1) > total_paginas:
+        st.session_state[f"{key}_pag"] = 1
+    pagina = c_pag.number_input("Página:", min_value=1, max_value=total_paginas, step=1, key=f"{key}_pag")
+
+    with metricas.medir("tabela.pagina", linhas=total):
+        if col_ordem is None:
+            ordem = np.asarray(posicoes)
+        else:
+            ordem = ordenar_posicoes(ordenacoes[col_ordem], posicoes, len(df_base), crescente=not decrescente)
+        pos_pagina = ordem[(pagina - 1) * tamanho: pagina * tamanho]
+
+        # Só as colunas curtas passam pelo filtro; as longas são buscadas apenas para a página
+        cols_curtas = [c for c in colunas if c not in colunas_longas]
+        df_pagina = df_base.iloc[pos_pagina, df_base.columns.get_indexer(cols_curtas)].copy()
+        for col in colunas_longas:
+            if col in colunas:
+                df_pagina[col] = ler_textos(col, pos_pagina)
+
+    st.dataframe(df_pagina[[c for c in colunas if c in df_pagina.columns]], use_container_width=True, hide_index=True)
+    st.caption(f"Página {pagina} de {total_paginas} | {total} chamados no filtro")
+    return ordem
@@ -0,0 +1,265 @@
+"""
+Teste de carga: simula N sessões simultâneas navegando pelas páginas do CITSM.
+
+Sobe um servidor Streamlit apontando para a base local (CITSM_BANCO_LOCAL) e
+abre N conexões WebSocket, cada uma se comportando como um navegador: abre as
+páginas e troca filtros, paginação, busca etc. Ao final mostra latência
+p50/p95/p99 por interação, vazão e o crescimento de RSS do servidor por sessão.
+
+Uso:
+    python teste_carga.py --sessoes 20 --linhas 100000
+    python teste_carga.py --sessoes 5 --ia --consultas "erro no sistema" "acesso vpn"
+    python teste_carga.py --url http://localhost:8501 --pid 12345   # servidor já no ar
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+import base_sintetica
+import conexao
+import metricas
+
+CONSULTAS_PADRAO = [
+    "erro ao acessar o sistema de protocolo",
+    "solicitação de acesso à VPN",
+    "lentidão na folha de pagamento",
+    "reset de senha do e-mail",
+    "problema de impressão no setor",
+]
+TIPOS_WIDGET = ("selectbox", "radio", "number_input", "multiselect", "text_input", "button", "date_input")
+
+
+class SessaoNavegador:
+    """Uma sessão Streamlit dirigida pelo protocolo do navegador (protobuf sobre WebSocket)."""
+
+    def __init__(self, url_base):
+        self.url_ws = url_base.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.ws = None
+        self.paginas = {}   # url_pathname -> page_script_hash
+        self.widgets = {}   # rótulo -> (tipo, proto do elemento)
+        self.estado = {}    # id do widget -> WidgetState enviado nos reruns
+        self.pagina_atual = ""
+
+    async def conectar(self):
+        self.ws = await websocket_connect(self.url_ws, subprotocols=["streamlit"])
+        await self.rerun()
+
+    async def abrir(self, pagina):
+        self.pagina_atual = self.paginas[pagina]
+        self.estado.clear()
+        await self.rerun()
+
+    async def rerun(self, gatilho=None):
+        """Envia um rerun com o estado atual dos widgets e espera o script terminar."""
+        msg = BackMsg()
+        msg.rerun_script.page_script_hash = self.pagina_atual
+        msg.rerun_script.widget_states.widgets.extend(self.estado.values())
+        if gatilho is not None:
+            msg.rerun_script.widget_states.widgets.append(gatilho)
+        self.widgets.clear()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+
+        while True:
+            dados = await self.ws.read_message()
+            if dados is None:
+                raise ConnectionError("Servidor fechou a conexão")
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(dados)
+            tipo = fmsg.WhichOneof("type")
+            if tipo == "navigation":
+                self.paginas = {p.url_pathname: p.page_script_hash for p in fmsg.navigation.app_pages}
+                self.pagina_atual = fmsg.navigation.page_script_hash
+            elif tipo == "delta" and fmsg.delta.WhichOneof("type") == "new_element":
+                elemento = fmsg.delta.new_element
+                tipo_elem = elemento.WhichOneof("type")
+                if tipo_elem == "exception":
+                    raise RuntimeError(elemento.exception.message)
+                if tipo_elem in TIPOS_WIDGET:
+                    proto = getattr(elemento, tipo_elem)
+                    self.widgets[proto.label] = (tipo_elem, proto)
+            elif tipo == "script_finished":
+                if fmsg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+    def _widget(self, rotulo):
+        return self.widgets[rotulo][1]
+
+    async def escolher(self, rotulo, rng):
+        """Selectbox: escolhe outra opção qualquer."""
+        proto = self._widget(rotulo)
+        opcoes = list(proto.options)
+        atual = opcoes[proto.default] if opcoes and proto.HasField("default") else None
+        candidatas = [o for o in opcoes if o != atual] or opcoes
+        self.estado[proto.id] = WidgetState(id=proto.id, string_value=rng.choice(candidatas))
+        await self.rerun()
+
+    async def opcao_radio(self, rotulo, opcao):
+        proto = self._widget(rotulo)
+        self.estado[proto.id] = WidgetState(id=proto.id, int_value=list(proto.options).index(opcao))
+        await self.rerun()
+
+    async def numero(self, rotulo, valor):
+        proto = self._widget(rotulo)
+        valor = min(valor, proto.max) if proto.has_max else valor
+        self.estado[proto.id] = WidgetState(id=proto.id, double_value=valor)
+        await self.rerun()
+
+    async def multiselecao(self, rotulo, quantidade):
+        proto = self._widget(rotulo)
+        self.estado[proto.id] = WidgetState(id=proto.id, string_array_value={"data": list(proto.options)[:quantidade]})
+        await self.rerun()
+
+    async def digitar(self, rotulo, texto):
+        proto = self._widget(rotulo)
+        self.estado[proto.id] = WidgetState(id=proto.id, string_value=texto)
+        await self.rerun()
+
+    async def clicar(self, rotulo):
+        proto = self._widget(rotulo)
+        await self.rerun(gatilho=WidgetState(id=proto.id, trigger_value=True))
+
+    async def fechar(self):
+        self.ws.close()
+
+
+# --- ROTEIROS DE CLIQUES (um por página) ---
+# (página, prefixo das métricas, passos); cada passo é (nome, corrotina que recebe a sessão e o rng)
+
+ROTEIRO_DASHBOARD = ("Dashboard_CITSM", "dashboard", [
+    ("dashboard.trocar_contrato", lambda s, rng: s.escolher("2. Contrato:", rng)),
+    ("dashboard.trocar_servico", lambda s, rng: s.escolher("3. Serviço:", rng)),
+    ("dashboard.paginar_tabela", lambda s, rng: s.numero("Página:", 2)),
+    ("dashboard.ordenar_tabela", lambda s, rng: s.escolher("Ordenar por:", rng)),
+])
+
+ROTEIRO_TIMELINES = ("Timelines_CITSM", "timelines", [
+    ("timelines.mensal", lambda s, rng: s.opcao_radio("Agrupar por:", "Mensal")),
+    ("timelines.trocar_servico", lambda s, rng: s.escolher("Serviço Analisado:", rng)),
+    ("timelines.filtrar_status", lambda s, rng: s.multiselecao("Filtrar Status na Timeline:", 1)),
+])
+
+
+def roteiro_busca(consultas):
+    return ("Busca_semantica", "busca", [
+        ("busca.pesquisar", lambda s, rng: s.digitar("Descreva o SENTIDO que você procura:", rng.choice(consultas))),
+        ("busca.trocar_coluna", lambda s, rng: s.escolher("Onde você quer pesquisar?", rng)),
+    ])
+
+
+ROTEIRO_ANALISE = ("Analise_IA", "analise", [
+    ("analise.processar", lambda s, rng: s.clicar("🚀 Iniciar Processamento na GPU")),
+])
+
+
+async def sessao(id_sessao, url, roteiros, latencias, erros, pausa):
+    """Executa os roteiros de uma sessão, registrando a latência de cada interação."""
+    rng = random.Random(id_sessao)
+    navegador = SessaoNavegador(url)
+    await navegador.conectar()
+
+    for pagina, prefixo, passos in rng.sample(roteiros, len(roteiros)):
+        passos = [(f"{prefixo}.abrir", lambda s, rng, p=pagina: s.abrir(p))] + passos
+        for nome, passo in passos:
+            # Tempo de "leitura" do usuário entre cliques
+            await asyncio.sleep(rng.uniform(0, pausa))
+            t0 = time.perf_counter()
+            try:
+                await passo(navegador, rng)
+                latencias[nome].append(time.perf_counter() - t0)
+            except Exception as e:
+                latencias[nome + " (erro)"].append(time.perf_counter() - t0)
+                erros.setdefault(nome, repr(e))
+    # A conexão continua aberta, como um navegador parado na página, até o fim do teste
+    return navegador
+
+
+async def rodar(url, sessoes, roteiros, pid, pausa):
+    latencias = defaultdict(list)
+    erros = {}
+    rss_inicial = metricas.memoria_rss(pid)
+    t0 = time.perf_counter()
+    navegadores = await asyncio.gather(*[sessao(i, url, roteiros, latencias, erros, pausa) for i in range(sessoes)])
+    duracao = time.perf_counter() - t0
+    rss_final = metricas.memoria_rss(pid)
+    for navegador in navegadores:
+        await navegador.fechar()
+    return latencias, erros, duracao, rss_inicial, rss_final
+
+
+def subir_servidor(porta, banco):
+    env = dict(os.environ, **{conexao.VAR_BANCO_LOCAL: banco})
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "main.py", "--server.headless", "true",
+         "--server.port", str(porta), "--browser.gatherUsageStats", "false"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://localhost:{porta}"
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(url + "/_stcore/health", timeout=1)
+            return processo, url
+        except OSError:
+            time.sleep(0.5)
+    processo.kill()
+    raise RuntimeError("O servidor Streamlit não respondeu")
+
+
+def relatorio(latencias, erros, duracao, sessoes, rss_inicial, rss_final):
+    total = sum(len(v) for v in latencias.values())
+    print(f"\n{'interação':<34} {'n':>5} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9}")
+    for nome in sorted(latencias):
+        p50, p95, p99 = np.percentile(latencias[nome], [50, 95, 99])
+        print(f"{nome:<34} {len(latencias[nome]):>5} {p50:9.3f} {p95:9.3f} {p99:9.3f}")
+
+    for nome, erro in sorted(erros.items()):
+        print(f"⚠️ {nome}: {erro}")
+
+    print(f"\nSessões: {sessoes} | Interações: {total} | Tempo total: {duracao:.1f}s | Vazão: {total / duracao:.2f} interações/s")
+    if rss_inicial is not None and rss_final is not None:
+        crescimento = (rss_final - rss_inicial) / 1024**2
+        print(f"RSS do servidor: {rss_inicial / 1024**2:.0f} MB -> {rss_final / 1024**2:.0f} MB "
+              f"(+{crescimento:.0f} MB, {crescimento / sessoes:.1f} MB por sessão)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga com sessões simultâneas do CITSM.")
+    parser.add_argument("--sessoes", type=int, default=10)
+    parser.add_argument("--linhas", type=int, default=100000, help="Tamanho da base sintética")
+    parser.add_argument("--banco", default=None, help="Base SQLite já existente (ignora --linhas)")
+    parser.add_argument("--url", default=None, help="Servidor já em execução (não sobe um novo)")
+    parser.add_argument("--pid", type=int, default=None, help="PID do servidor informado em --url (para medir RSS)")
+    parser.add_argument("--porta", type=int, default=8599)
+    parser.add_argument("--pausa", type=float, default=0.5, help="Pausa máxima (s) entre cliques de uma sessão")
+    parser.add_argument("--ia", action="store_true", help="Inclui Busca Semântica e Análise IA (requer os modelos)")
+    parser.add_argument("--consultas", nargs="+", default=CONSULTAS_PADRAO)
+    args = parser.parse_args()
+
+    roteiros = [ROTEIRO_DASHBOARD, ROTEIRO_TIMELINES]
+    if args.ia:
+        roteiros += [roteiro_busca(args.consultas), ROTEIRO_ANALISE]
+
+    servidor, url, pid = None, args.url, args.pid
+    if url is None:
+        banco = args.banco or base_sintetica.garantir_base("bench_dados", args.linhas)
+        servidor, url = subir_servidor(args.porta, banco)
+        pid = servidor.pid
+
+    try:
+        latencias, erros, duracao, rss_ini, rss_fim = asyncio.run(rodar(url, args.sessoes, roteiros, pid, args.pausa))
+        relatorio(latencias, erros, duracao, args.sessoes, rss_ini, rss_fim)
+    finally:
+        if servidor is not None:
+            servidor.terminate()
@@ -1,8 +1,22 @@
+import sys
+
 import torch
 
-print("GPU Disponível?", torch.cuda.is_available())
-if torch.cuda.is_available():
-    print("Nome da Placa:", torch.cuda.get_device_name(0))
-    print("Memória VRAM:", round(torch.cuda.get_device_properties(0).total_memory / 1024**3, 1), "GB")
+import perfil_hardware
+
+hw = perfil_hardware.sondar(torch)
+print("GPU Disponível?", hw["dispositivo"] == "cuda")
+if hw["dispositivo"] == "cuda":
+    print("Nome da Placa:", hw["placa"])
+    print("Memória VRAM:", hw["vram_gb"], "GB")
 else:
-    print("❌ O Python ainda está usando a CPU.")
\ No newline at end of file
+    print("❌ O Python ainda está usando a CPU.")
+print("CPUs disponíveis:", hw["cpus"])
+
+perfil = perfil_hardware.carregar(hw)
+print("Perfil gravado:", perfil_hardware.ARQ_PERFIL if perfil else "nenhum válido para este hardware")
+
+# --calibrar: mede a vazão dos modelos e grava o perfil usado pelas páginas (ver calibrar_hardware.py)
+if "--calibrar" in sys.argv:
+    import calibrar_hardware
+    calibrar_hardware.main([])
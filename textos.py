@@ -0,0 +1,142 @@
+import atexit
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+
+# ========================================================
+# ⚙️ ARMAZÉM DE TEXTOS LONGOS (fora do DataFrame principal)
+# ========================================================
+# DESCRICAO/SUMMARY/RESUMO_TICKET ficam em disco, comprimidos em blocos e
+# mapeados em memória; só as linhas pedidas são descomprimidas.
+VAR_DIR_TEXTOS = "CITSM_DIR_TEXTOS"   # diretório pai (padrão: temp do sistema)
+TAMANHO_BLOCO = 64                    # textos por bloco comprimido
+NIVEL_ZLIB = 6
+# ========================================================
+
+_NULO = 0xFFFFFFFF  # tamanho reservado para texto nulo
+_dir_processo = None
+_trava = threading.Lock()
+
+
+def diretorio_processo():
+    """Diretório temporário deste processo (apagado ao sair)."""
+    global _dir_processo
+    with _trava:
+        if _dir_processo is None:
+            _dir_processo = tempfile.mkdtemp(prefix="citsm_textos_", dir=os.environ.get(VAR_DIR_TEXTOS))
+            atexit.register(shutil.rmtree, _dir_processo, True)
+        return _dir_processo
+
+
+def _como_texto(valor):
+    if valor is None or valor != valor:  # None / NaN
+        return None
+    return valor if isinstance(valor, str) else str(valor)
+
+
+class EscritorTextos:
+    """
+    Grava as colunas de texto em blocos de TAMANHO_BLOCO linhas:
+    `<coluna>.dat` (blocos zlib) e `<coluna>.idx.npy` (offsets dos blocos).
+    Recebe a extração em lotes, então o texto nunca fica todo em memória.
+    """
+
+    def __init__(self, diretorio, colunas):
+        os.makedirs(diretorio, exist_ok=True)
+        self.diretorio = diretorio
+        self.colunas = list(colunas)
+        self.linhas = 0
+        self.bytes_texto = 0
+        self._arquivos = {c: open(os.path.join(diretorio, f"{c}.dat"), "wb") for c in self.colunas}
+        self._offsets = {c: [0] for c in self.colunas}
+        self._pendentes = {c: [] for c in self.colunas}
+
+    def adicionar(self, df):
+        for col in self.colunas:
+            pendentes = self._pendentes[col]
+            pendentes.extend(df[col].tolist() if col in df.columns else [None] * len(df))
+            while len(pendentes) >= TAMANHO_BLOCO:
+                self._gravar_bloco(col, pendentes[:TAMANHO_BLOCO])
+                del pendentes[:TAMANHO_BLOCO]
+        self.linhas += len(df)
+
+    def _gravar_bloco(self, col, valores):
+        codificados = [None if t is None else t.encode("utf-8") for t in map(_como_texto, valores)]
+        tamanhos = np.array([_NULO if b is None else len(b) for b in codificados], dtype=np.uint32)
+        corpo = b"".join(b for b in codificados if b)
+        self.bytes_texto += len(corpo)
+        bloco = zlib.compress(tamanhos.tobytes() + corpo, NIVEL_ZLIB)
+        self._arquivos[col].write(bloco)
+        self._offsets[col].append(self._offsets[col][-1] + len(bloco))
+
+    def fechar(self):
+        for col in self.colunas:
+            if self._pendentes[col]:
+                self._gravar_bloco(col, self._pendentes[col])
+                self._pendentes[col] = []
+            self._arquivos[col].close()
+            np.save(os.path.join(self.diretorio, f"{col}.idx.npy"), np.array(self._offsets[col], dtype=np.int64))
+        return ArmazemTextos(self.diretorio, self.colunas, self.linhas)
+
+
+class ArmazemTextos:
+    """Leitura sob demanda (por posição da linha no snapshot) das colunas gravadas pelo EscritorTextos."""
+
+    def __init__(self, diretorio, colunas, linhas, descartavel=True):
+        self.diretorio = diretorio
+        self.colunas = list(colunas)
+        self.linhas = linhas
+        self.descartavel = descartavel  # False: arquivos de outro dono (ex.: snapshot compartilhado)
+        self._mapas = {}
+        self._offsets = {}
+        for col in self.colunas:
+            with open(os.path.join(diretorio, f"{col}.dat"), "rb") as f:
+                tamanho = os.fstat(f.fileno()).st_size
+                self._mapas[col] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if tamanho else b""
+            self._offsets[col] = np.load(os.path.join(diretorio, f"{col}.idx.npy"), mmap_mode="r")
+
+    def _bloco(self, col, bloco):
+        ini, fim = self._offsets[col][bloco], self._offsets[col][bloco + 1]
+        bruto = zlib.decompress(self._mapas[col][ini:fim])
+        n = min(TAMANHO_BLOCO, self.linhas - bloco * TAMANHO_BLOCO)
+        tamanhos = np.frombuffer(bruto, dtype=np.uint32, count=n)
+        nulos = tamanhos == _NULO
+        fins = n * 4 + np.cumsum(np.where(nulos, 0, tamanhos), dtype=np.int64)
+        inicios = fins - np.where(nulos, 0, tamanhos)
+        textos = np.empty(n, dtype=object)
+        textos[:] = [None if nulo else bruto[i:f].decode("utf-8")
+                     for nulo, i, f in zip(nulos.tolist(), inicios.tolist(), fins.tolist())]
+        return textos
+
+    def ler(self, col, posicoes):
+        """Textos de `col` nas posições pedidas (array de objetos, na mesma ordem)."""
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        saida = np.empty(len(posicoes), dtype=object)
+        if not len(posicoes):
+            return saida
+
+        # Cada bloco é descomprimido uma única vez, por mais linhas que se peça dele
+        blocos = posicoes // TAMANHO_BLOCO
+        ordem = np.argsort(blocos, kind="stable")
+        unicos, inicios = np.unique(blocos[ordem], return_index=True)
+        fins = np.append(inicios[1:], len(ordem))
+        for bloco, i, j in zip(unicos.tolist(), inicios.tolist(), fins.tolist()):
+            linhas = ordem[i:j]
+            saida[linhas] = self._bloco(col, bloco)[posicoes[linhas] - bloco * TAMANHO_BLOCO]
+        return saida
+
+    def tamanho_disco(self):
+        return sum(os.path.getsize(os.path.join(self.diretorio, f)) for f in os.listdir(self.diretorio))
+
+    def remover(self):
+        """
+        Apaga os arquivos. Os mapas abertos continuam válidos (o SO só libera o
+        espaço quando o último leitor do snapshot antigo soltar o objeto).
+        """
+        if self.descartavel:
+            shutil.rmtree(self.diretorio, ignore_errors=True)
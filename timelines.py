@@ -1,12 +1,104 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from datetime import datetime
 
-def renderizar_timelines(df_servico):
+import anomalias
+import graficos
+import metricas
+import topicos
+from motor_consulta import Filtros, MotorPandas
+
+TOPICOS_NO_GRAFICO = 8   # os demais tópicos viram "Outros"
+
+# --- AGREGAÇÕES (puras, sem Streamlit: usadas também pelo benchmark) ---
+def calcular_fluxo(df_servico, regra):
+    """Quantidade de tickets abertos/modificados/fechados por período ('W-MON' ou 'MS')."""
+    return MotorPandas(df_servico).fluxo(Filtros(), regra)
+
+def calcular_backlog(df_abertos, agora, limite=15):
+    """Os `limite` tickets pendentes há mais tempo, com rótulo 'DEMANDANTE (Nd)'."""
+    return MotorPandas(df_abertos).mais_antigos_abertos(Filtros(), agora, limite)
+
+def calcular_volume_topicos(volumes, limite=TOPICOS_NO_GRAFICO):
+    """Período x tópico com só os `limite` tópicos de maior volume (o resto somado em 'Outros')."""
+    if volumes.shape[1] <= limite:
+        return volumes
+    principais = volumes.sum().nlargest(limite).index
+    resultado = volumes[principais].copy()
+    resultado["Outros"] = volumes.drop(columns=principais).sum(axis=1)
+    return resultado
+
+# --- FIGURAS (construídas uma vez por conteúdo do agregado, ver graficos.py) ---
+def _fig_fluxo(dados_t):
+    # Séries longas: reduzidas no servidor e desenhadas em WebGL, sem marcadores
+    dados_t = graficos.reduzir_serie(dados_t)
+    longa = len(dados_t) > graficos.PONTOS_WEBGL
+    fig = px.line(dados_t, markers=not longa, render_mode="webgl" if longa else "auto")
+    fig.update_layout(xaxis_title="", yaxis_title="Quantidade Tickets", legend_title="Ação")
+    return fig
+
+def _fig_topicos(volumes):
+    fig = px.area(graficos.reduzir_serie(volumes))
+    fig.update_layout(xaxis_title="", yaxis_title="Quantidade Tickets", legend_title="Tópico")
+    return fig
+
+def _fig_backlog(df_top, agora, titulo):
+    fig = px.timeline(
+        df_top,
+        x_start="DTABERTURA",
+        x_end=[agora] * len(df_top),
+        y="ROTULO",
+        color="STATUS",
+        title=titulo
+    )
+    fig.update_yaxes(autorange="reversed", title="")
+    fig.update_layout(height=max(len(df_top)*35, 300))
+    return fig
+
+def renderizar_topicos(servico, regra):
+    """Volume de tickets por tópico ao longo do tempo (tabela pré-agregada da Análise IA, ver topicos.py)."""
+    st.subheader("🧩 Tópicos ao Longo do Tempo")
+    colunas = topicos.colunas_com_topicos(servico)
+    if not colunas:
+        st.caption("ℹ️ Rode a Análise IA deste serviço para acompanhar os tópicos ao longo do tempo.")
+        return
+
+    coluna = st.selectbox("Tópicos da coluna:", colunas, key="coluna_topicos") if len(colunas) > 1 else colunas[0]
+    with metricas.medir("timelines.agregado_topicos"):
+        volumes = calcular_volume_topicos(topicos.volumes(servico, coluna, regra))
+
+    if not volumes.empty:
+        graficos.exibir("topicos", _fig_topicos, volumes)
+    else:
+        st.info("Dados temporais insuficientes.")
+
+def renderizar_anomalias(servico, dias=30):
+    """Picos de entrada detectados (ver anomalias.py): do serviço e de todos os contratos."""
+    st.subheader("🚨 Picos de Entrada")
+    st.caption(f"Dias com entrada de tickets muito acima do normal para o dia da semana (últimos {dias} dias).")
+
+    colunas = {"dia": "Dia", "valor": "Série", "tickets": "Tickets", "esperado": "Esperado", "z": "Desvio (z)", "parcial": "Dia em curso"}
+    df_servico = anomalias.alertas('NOMESERVICO', servico, dias)
+    df_contratos = anomalias.alertas('NUMEROCONTRATO', dias=dias)
+
+    if not df_servico.empty:
+        st.warning(f"{len(df_servico)} pico(s) no serviço {servico}.")
+        st.dataframe(df_servico[list(colunas)].rename(columns=colunas), hide_index=True, use_container_width=True)
+    else:
+        st.success("Nenhum pico recente neste serviço.")
+
+    with st.expander(f"Contratos ({len(df_contratos)} pico(s))"):
+        st.dataframe(df_contratos[list(colunas)].rename(columns=colunas), hide_index=True, use_container_width=True)
+    st.download_button("⬇️ Feed de alertas (JSON)", anomalias.feed_json(), file_name="citsm_anomalias.json", mime="application/json")
+
+def renderizar_timelines(df_servico=None, motor=None, filtros=None):
     """
     Renderiza Timeline de Fluxo e Aging (Backlog) com filtro inteligente (Vazio = Todos).
+    Aceita o DataFrame do serviço ou um motor de consulta + filtros (ver motor_consulta.py).
     """
+    if motor is None:
+        motor, filtros = MotorPandas(df_servico), Filtros()
+
     st.divider()
 
     # --- 1. Fluxo (Linha do Tempo) ---
@@ -15,22 +107,21 @@ def renderizar_timelines(df_servico):
     freq = st.radio("Agrupar por:", ["Semanal", "Mensal"], horizontal=True, key="freq_time")
     regra = 'W-MON' if freq == "Semanal" else 'MS'
 
-    df_time = df_servico.copy()
-    cols_t = {'DTABERTURA':'Abertos', 'DTULTIMAMODIFICACAO':'Modificados', 'DTFIM':'Fechados'}
-    dados_t = pd.DataFrame()
-
-    for col_db, nome_legenda in cols_t.items():
-        if col_db in df_time.columns:
-            s = df_time.set_index(col_db).resample(regra).size()
-            dados_t[nome_legenda] = s
+    with metricas.medir(f"timelines.agregado_fluxo.{motor.nome}"):
+        dados_t = motor.fluxo(filtros, regra)
 
     if not dados_t.empty:
-        fig_t = px.line(dados_t, markers=True)
-        fig_t.update_layout(xaxis_title="", yaxis_title="Quantidade Tickets", legend_title="Ação")
-        st.plotly_chart(fig_t, use_container_width=True)
+        graficos.exibir("fluxo", _fig_fluxo, dados_t)
     else:
         st.info("Dados temporais insuficientes.")
 
+    # --- 1b. Tópicos e picos de entrada (só com um serviço selecionado) ---
+    if filtros.servico is not None:
+        st.divider()
+        renderizar_topicos(filtros.servico, regra)
+        st.divider()
+        renderizar_anomalias(filtros.servico)
+
     st.divider()
 
     # --- 2. Backlog Aging (Gantt) ---
@@ -38,11 +129,10 @@ def renderizar_timelines(df_servico):
     st.caption("Visualização de chamados abertos há mais tempo.")
 
     # 1. Filtra apenas o que está aberto (sem data fim)
-    df_abertos = df_servico[df_servico['DTFIM'].isna()].copy()
-
-    if not df_abertos.empty:
-        lista_status = df_abertos['STATUS'].unique()
+    filtros_abertos = filtros.com(apenas_abertos=True)
+    lista_status = motor.opcoes('STATUS', filtros_abertos)
 
+    if lista_status:
         # Filtro Multiselect
         status_selecionados = st.multiselect(
             "Filtrar Status na Timeline:",
@@ -55,7 +145,7 @@ def renderizar_timelines(df_servico):
         # --- LÓGICA INTELIGENTE (AQUI MUDOU) ---
         if status_selecionados:
             # Se tem algo selecionado, filtra
-            df_abertos = df_abertos[df_abertos['STATUS'].isin(status_selecionados)]
+            filtros_abertos = filtros_abertos.com(status=tuple(status_selecionados))
             titulo_grafico = f"Top 15 mais antigos ({len(status_selecionados)} status selecionados)"
         else:
             # Se NÃO tem nada selecionado, NÃO faz nada (mantém todos)
@@ -63,29 +153,13 @@ def renderizar_timelines(df_servico):
             st.caption("ℹ️ Nenhum filtro específico selecionado. Exibindo **todos** os status pendentes.")
             titulo_grafico = "Top 15 mais antigos (Geral)"
 
-        # 2. Processamento do Gráfico
-        if not df_abertos.empty:
-            agora = datetime.now()
-            df_abertos['DIAS_ABERTO'] = (agora - df_abertos['DTABERTURA']).dt.days
-
-            # Pega os 15 piores DO CONJUNTO ATUAL
-            df_top = df_abertos.sort_values('DIAS_ABERTO', ascending=False).head(15)
-
-            # Cria rótulo
-            df_top['ROTULO'] = df_top['DEMANDANTE'] + " (" + df_top['DIAS_ABERTO'].astype(str) + "d)"
-
-            fig_gantt = px.timeline(
-                df_top,
-                x_start="DTABERTURA",
-                x_end=[agora] * len(df_top),
-                y="ROTULO",
-                color="STATUS",
-                title=titulo_grafico
-            )
-            fig_gantt.update_yaxes(autorange="reversed", title="")
-            fig_gantt.update_layout(height=max(len(df_top)*35, 300))
-
-            st.plotly_chart(fig_gantt, use_container_width=True)
+        # 2. Processamento do Gráfico (fim das barras no minuto: a figura em cache vale até ele virar)
+        agora = datetime.now().replace(second=0, microsecond=0)
+        with metricas.medir(f"timelines.agregado_backlog.{motor.nome}"):
+            df_top = motor.mais_antigos_abertos(filtros_abertos, agora, 15)
+
+        if not df_top.empty:
+            graficos.exibir("backlog", _fig_backlog, df_top, {"agora": agora, "titulo": titulo_grafico})
         else:
             st.info("Nenhum ticket encontrado com os status selecionados.")
     else:
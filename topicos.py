@@ -0,0 +1,110 @@
+"""
+Tópicos ao longo do tempo: as atribuições de tópico de cada ticket (geradas pela
+Análise IA) ficam gravadas num SQLite local, junto com uma tabela pequena de
+volumes por período (semana/mês), serviço e tópico; a página de timelines lê
+apenas a tabela agregada.
+
+Cada ajuste do BERTopic numera e nomeia os tópicos de novo, então uma análise
+substitui por inteiro as atribuições e os volumes do serviço/coluna (inclusive
+os tickets que saíram da análise): os volumes nunca misturam rótulos de
+modelos diferentes.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+
+import dados
+import metricas
+
+# ========================================================
+# ⚙️ TÓPICOS AO LONGO DO TEMPO
+# ========================================================
+ARQ_TOPICOS = os.environ.get("CITSM_BANCO_TOPICOS") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "topicos.sqlite")
+REGRAS = ['W-MON', 'MS']   # as mesmas do "Agrupar por" da timeline
+NOME_RUIDO = "-1_outros_ruido"
+# ========================================================
+
+_trava = threading.Lock()
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS atribuicoes (
+    servico TEXT NOT NULL, coluna TEXT NOT NULL, ticket TEXT NOT NULL,
+    topico TEXT NOT NULL, dtabertura TEXT NOT NULL,
+    PRIMARY KEY (servico, coluna, ticket)
+);
+CREATE TABLE IF NOT EXISTS volumes (
+    regra TEXT NOT NULL, servico TEXT NOT NULL, coluna TEXT NOT NULL,
+    periodo TEXT NOT NULL, topico TEXT NOT NULL, quantidade INTEGER NOT NULL,
+    PRIMARY KEY (regra, servico, coluna, periodo, topico)
+);
+"""
+
+
+def _conectar():
+    conn = sqlite3.connect(ARQ_TOPICOS, timeout=30)
+    conn.executescript(_ESQUEMA)
+    return conn
+
+
+def periodos(datas, regra):
+    """Rótulo do período de cada data, como no resample da timeline ('W-MON' = segunda que fecha a semana)."""
+    if regra == 'MS':
+        return datas.dt.to_period('M').dt.start_time
+    return datas.dt.to_period('W-MON').dt.end_time.dt.normalize()
+
+
+def registrar(df_analise, servico, coluna, info_topicos):
+    """
+    Grava o tópico de cada ticket de uma análise (colunas COL_ID, DTABERTURA e
+    TOPICO_ID) no lugar da análise anterior do serviço/coluna e refaz os volumes
+    deles numa única transação. Retorna quantos tickets foram gravados.
+    """
+    nomes = dict(zip(info_topicos['Topic'], info_topicos['Name']))
+    nomes[-1] = NOME_RUIDO
+    novos = pd.DataFrame({
+        "ticket": df_analise[dados.COL_ID].astype(str).to_numpy(),
+        "topico": [nomes.get(t, str(t)) for t in df_analise['TOPICO_ID']],
+        "dtabertura": pd.to_datetime(df_analise['DTABERTURA']).to_numpy(),
+    }).dropna(subset=["dtabertura"]).drop_duplicates("ticket", keep="last")
+
+    with _trava, metricas.medir("topicos.registrar", linhas=len(novos)), closing(_conectar()) as conn, conn:
+        conn.execute("DELETE FROM atribuicoes WHERE servico = ? AND coluna = ?", (servico, coluna))
+        conn.execute("DELETE FROM volumes WHERE servico = ? AND coluna = ?", (servico, coluna))
+        conn.executemany(
+            "INSERT INTO atribuicoes (servico, coluna, ticket, topico, dtabertura) VALUES (?, ?, ?, ?, ?)",
+            zip([servico] * len(novos), [coluna] * len(novos), novos["ticket"], novos["topico"],
+                novos["dtabertura"].dt.strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        for regra in REGRAS:
+            contagem = novos.groupby([periodos(novos["dtabertura"], regra).dt.strftime("%Y-%m-%d"), "topico"]).size()
+            conn.executemany(
+                "INSERT INTO volumes (regra, servico, coluna, periodo, topico, quantidade) VALUES (?, ?, ?, ?, ?, ?)",
+                [(regra, servico, coluna, p, t, int(n)) for (p, t), n in contagem.items()]
+            )
+    return len(novos)
+
+
+def colunas_com_topicos(servico):
+    """Colunas de texto já analisadas para o serviço."""
+    if not os.path.exists(ARQ_TOPICOS):
+        return []
+    with closing(_conectar()) as conn:
+        return [c for (c,) in conn.execute(
+            "SELECT DISTINCT coluna FROM volumes WHERE servico = ? ORDER BY coluna", (servico,))]
+
+
+def volumes(servico, coluna, regra):
+    """Tabela período x tópico (quantidade de tickets), pronta para o gráfico."""
+    if not os.path.exists(ARQ_TOPICOS):
+        return pd.DataFrame()
+    with closing(_conectar()) as conn:
+        df = pd.read_sql("SELECT periodo, topico, quantidade FROM volumes "
+                         "WHERE regra = ? AND servico = ? AND coluna = ?",
+                         conn, params=(regra, servico, coluna), parse_dates=["periodo"])
+    if df.empty:
+        return df
+    return df.pivot_table(index="periodo", columns="topico", values="quantidade", aggfunc="sum", fill_value=0)